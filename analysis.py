@@ -1,122 +1,312 @@
-import psycopg2
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 
-from config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD
+from storage import DatabaseError, cursor
+from candle_cache import CLOSE, candles_since
+from signal_outcomes import register_new_signals, load_pending_outcomes, save_outcomes, load_performance
+from archive import archive_available, archive_boundaries, load_archived_closes
+from timeframes import datetime_to_ms, ms_to_datetime
+from config import TIMEFRAME
 
-def get_db_connection():
+OUTCOME_COLUMNS = ["signal_id", "asset", "outcome", "exit_time", "exit_price", "pnl"]
+
+def load_signals(cur) -> pd.DataFrame:
     """
-    Stellt eine Verbindung zur PostgreSQL-Datenbank her.
+    Lädt alle generierten Signale in zeitlicher Reihenfolge.
     """
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
+    cur.execute(
+        """
+        SELECT signal_id, timestamp_utc, asset, timeframe, entry_price, take_profit_target, stop_loss_target
+        FROM generated_signals
+        ORDER BY timestamp_utc ASC;
+        """
     )
+    signal_columns = [desc[0] for desc in cur.description]
+    return pd.DataFrame(cur.fetchall(), columns=signal_columns)
+
+def load_candles(cur, assets: list, since: datetime, timeframe: str = TIMEFRAME) -> dict:
+    """
+    Liefert die Schlusskurse aller Assets ab 'since' aus dem Kerzen-Cache. Für Assets, deren Cache-Reihe
+    nicht so weit zurückreicht, kommen abgeschlossene Monate aus dem Arrow-Archiv (falls vorhanden, siehe
+    archive.py) und nur der Rest (gemeinsam in einer Abfrage) aus der Datenbank.
+    Liefert pro Asset ein Tupel (Zeitstempel als datetime64[ns, UTC]-Array, Schlusskurse als float-Array).
+    """
+    since_ms = datetime_to_ms(pd.Timestamp(since).to_pydatetime())
+    cached, uncovered = candles_since(cur, assets, timeframe, since_ms)
+    candles = {
+        asset: (timestamps_ms.astype("datetime64[ms]").astype("datetime64[ns]"), values[CLOSE])
+        for asset, (timestamps_ms, values) in cached.items()
+    }
+    if not uncovered:
+        return candles
+
+    # Pro Asset: archivierte Kerzen bis zur Archivgrenze, danach die Datenbank
+    database_since_ms = {asset: since_ms for asset in uncovered}
+    archived = {}
+    if archive_available():
+        boundaries = archive_boundaries(uncovered, timeframe)
+        in_archive = [asset for asset in uncovered if boundaries[asset] and boundaries[asset] > since_ms]
+        for asset, (timestamps_ms, closes) in load_archived_closes(in_archive, timeframe, since=ms_to_datetime(since_ms)).items():
+            after = timestamps_ms > since_ms
+            archived[asset] = (timestamps_ms[after], closes[after])
+            database_since_ms[asset] = boundaries[asset] - 1
+
+    cur.execute(
+        """
+        SELECT asset, timestamp, close FROM market_data
+        WHERE asset = ANY(%s) AND timeframe = %s AND timestamp > %s
+        ORDER BY asset, timestamp ASC;
+        """,
+        (list(uncovered), timeframe, ms_to_datetime(min(database_since_ms.values())))
+    )
+    candles_df = pd.DataFrame(cur.fetchall(), columns=["asset", "timestamp", "close"])
+    groups = dict(tuple(candles_df.groupby("asset", sort=False)))
+    for asset in uncovered:
+        timestamps_ms, closes = archived.get(asset, (np.array([], dtype=np.int64), np.array([], dtype=float)))
+        group = groups.get(asset)
+        if group is not None:
+            database_ms = pd.to_datetime(group["timestamp"], utc=True).to_numpy(dtype="datetime64[ms]").astype(np.int64)
+            after = database_ms > database_since_ms[asset]
+            timestamps_ms = np.concatenate((timestamps_ms, database_ms[after]))
+            closes = np.concatenate((closes, group["close"].to_numpy(dtype=float)[after]))
+        if len(timestamps_ms):
+            candles[asset] = (timestamps_ms.astype("datetime64[ms]").astype("datetime64[ns]"), closes)
+    return candles
+
+def first_touch_indices(closes: np.ndarray, start: np.ndarray, targets: np.ndarray, above: bool) -> np.ndarray:
+    """
+    Index der ersten Kerze ab 'start', deren Schlusskurs das Ziel erreicht (>= bei above, sonst <=).
+    Kein Treffer ergibt len(closes).
+    Alle Signale werden gemeinsam per Binary Lifting über eine Sparse Table von Bereichsmaxima gesucht:
+    O((Kerzen + Signale) * log Kerzen) statt einer (Signale x Kerzen)-Matrix.
+    """
+    n_candles = len(closes)
+    start = np.minimum(np.asarray(start, dtype=np.int64), n_candles)
+    if n_candles == 0 or len(start) == 0:
+        return np.full(len(start), n_candles, dtype=np.int64)
+
+    # Für "<= Ziel" wird auf "-close >= -Ziel" gespiegelt
+    values = np.asarray(closes, dtype=float) if above else -np.asarray(closes, dtype=float)
+    targets = np.asarray(targets, dtype=float) if above else -np.asarray(targets, dtype=float)
+
+    # levels[k][i] = max(values[i:i + 2**k]), am Ende abgeschnitten
+    levels = [values]
+    while (1 << len(levels)) <= n_candles:
+        previous = levels[-1]
+        half = 1 << (len(levels) - 1)
+        level = previous.copy()
+        level[:n_candles - half] = np.maximum(previous[:n_candles - half], previous[half:])
+        levels.append(level)
+
+    # Von der größten Blockgröße abwärts jeden Block überspringen, der das Ziel komplett verfehlt
+    position = start.copy()
+    for k in range(len(levels) - 1, -1, -1):
+        inside = position < n_candles
+        block_max = levels[k][np.minimum(position, n_candles - 1)]
+        skip = inside & (block_max < targets)
+        position = np.where(skip, position + (1 << k), position)
+    return np.minimum(position, n_candles)
+
+def resolve_exits(closes: np.ndarray, start: np.ndarray, take_profit: np.ndarray, stop_loss: np.ndarray) -> tuple:
+    """
+    Bestimmt für Signale, deren erste relevante Kerze 'start' ist, ob zuerst Take Profit ('tp') oder
+    Stop Loss ('sl') erreicht wurde. Ohne Treffer gilt das Signal als 'open' und wird zum letzten
+    Schlusskurs bewertet, ohne nachfolgende Kerzen als 'no_data'. Trifft eine Kerze beide Ziele, zählt Take Profit.
+    Gibt (Outcome, Exit-Index oder -1, Exit-Preis) als Arrays zurück.
+    """
+    n_candles = len(closes)
+    first_tp = first_touch_indices(closes, start, take_profit, above=True)
+    first_sl = first_touch_indices(closes, start, stop_loss, above=False)
+
+    no_data = start >= n_candles
+    tp_hit = ~no_data & (first_tp < n_candles) & (first_tp <= first_sl)
+    sl_hit = ~no_data & ~tp_hit & (first_sl < n_candles)
+    still_open = ~no_data & ~tp_hit & ~sl_hit
+
+    conditions = [tp_hit, sl_hit, still_open]
+    outcome = np.select(conditions, ["tp", "sl", "open"], default="no_data")
+    exit_index = np.select(conditions, [first_tp, first_sl, n_candles - 1], default=-1)
+    exit_price = np.select(conditions, [take_profit, stop_loss, closes[-1] if n_candles else np.nan], default=np.nan)
+    return outcome, exit_index, exit_price
+
+def evaluate_signal_outcomes(signals_df: pd.DataFrame, candles: dict) -> pd.DataFrame:
+    """
+    Bewertet die Signale gegen die Kerzen strikt nach dem jeweiligen Signalzeitpunkt (siehe resolve_exits).
+    Liefert ein DataFrame mit Outcome, Exit-Zeit, Exit-Preis und PnL pro Signal.
+    """
+    outcomes = []
+    for asset, group in signals_df.groupby("asset", sort=False):
+        timestamps, closes = candles.get(asset, (np.array([], dtype="datetime64[ns]"), np.array([], dtype=float)))
+        n_candles = len(closes)
+        signal_times = pd.to_datetime(group["timestamp_utc"], utc=True).to_numpy(dtype="datetime64[ns]")
+        entry = group["entry_price"].to_numpy(dtype=float)
+
+        # Erste Kerze strikt nach dem Signal
+        start = np.searchsorted(timestamps, signal_times, side="right")
+        outcome, exit_index, exit_price = resolve_exits(
+            closes, start,
+            group["take_profit_target"].to_numpy(dtype=float),
+            group["stop_loss_target"].to_numpy(dtype=float)
+        )
+        exit_time = np.full(len(group), np.datetime64("NaT"), dtype="datetime64[ns]")
+        if n_candles:
+            exit_time = np.where(exit_index >= 0, timestamps[np.clip(exit_index, 0, n_candles - 1)], exit_time)
+
+        outcomes.append(pd.DataFrame({
+            "signal_id": group["signal_id"].to_numpy(),
+            "asset": asset,
+            "outcome": outcome,
+            "exit_time": pd.to_datetime(exit_time, utc=True),
+            "exit_price": exit_price,
+            "pnl": exit_price - entry,
+        }))
+
+    if not outcomes:
+        return pd.DataFrame(columns=OUTCOME_COLUMNS)
+    return pd.concat(outcomes, ignore_index=True)
+
+def evaluate_all_signals(cur, signals_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bewertet Signale gegen die Kerzen ihres jeweiligen Timeframes (ein load_candles pro Timeframe).
+    """
+    outcomes = []
+    for timeframe, group in signals_df.groupby(signals_df["timeframe"].fillna(TIMEFRAME), sort=False):
+        candles = load_candles(cur, group["asset"].unique(), group["timestamp_utc"].min(), timeframe)
+        outcomes.append(evaluate_signal_outcomes(group, candles))
+    if not outcomes:
+        return pd.DataFrame(columns=OUTCOME_COLUMNS)
+    return pd.concat(outcomes, ignore_index=True)
+
+def compute_performance_metrics(outcomes: pd.DataFrame) -> dict:
+    """
+    Aggregierte Kennzahlen über alle Signale. Signale ohne nachfolgende Marktdaten zählen
+    als Trade, aber weder als Gewinn noch als Verlust.
+    """
+    evaluated = outcomes[outcomes["outcome"] != "no_data"]
+    pnl = evaluated["pnl"].to_numpy(dtype=float)
+    total_trades = len(outcomes)
+    winning_trades = int((pnl > 0).sum())
+    total_profit = float(pnl[pnl > 0].sum())
+    total_loss = abs(float(pnl[pnl <= 0].sum()))
+
+    return {
+        "total_trades": total_trades,
+        "winning_trades": winning_trades,
+        "win_rate": (winning_trades / total_trades) * 100 if total_trades > 0 else 0,
+        "total_profit": total_profit,
+        "total_loss": total_loss,
+        "profit_factor": total_profit / total_loss if total_loss > 0 else float("inf"),
+    }
+
+def advance_signal_outcomes(cur) -> pd.DataFrame:
+    """
+    Übernimmt neue Signale nach 'signal_outcomes' und schreibt alle noch nicht abgeschlossenen Signale fort.
+    Jedes Signal wird nur gegen Kerzen nach seiner zuletzt bewerteten Kerze geprüft; Signale mit TP oder SL
+    werden nie wieder gelesen. Gibt die danach noch offenen Signale zurück ('no_data' und 'open').
+    """
+    register_new_signals(cur)
+    pending = load_pending_outcomes(cur)
+    if pending.empty:
+        return pending
+
+    updated = []
+    for timeframe, group in pending.groupby("timeframe", sort=False):
+        # Erste zu prüfende Kerze: strikt nach der zuletzt bewerteten Kerze, sonst nach dem Signal
+        resume = group["evaluated_until"].fillna(group["signal_time"])
+        signals = pd.DataFrame({
+            "signal_id": group["signal_id"],
+            "timestamp_utc": resume,
+            "asset": group["asset"],
+            "entry_price": group["entry_price"],
+            "take_profit_target": group["take_profit_target"],
+            "stop_loss_target": group["stop_loss_target"],
+        })
+        candles = load_candles(cur, group["asset"].unique(), resume.min(), timeframe)
+        outcomes = evaluate_signal_outcomes(signals, candles).set_index("signal_id")
+
+        # 'no_data' heißt hier: keine neue Kerze seit der letzten Bewertung, das Signal bleibt unverändert
+        advanced = group.set_index("signal_id", drop=False)
+        changed = outcomes.index[outcomes["outcome"] != "no_data"]
+        if len(changed) == 0:
+            continue
+        advanced = advanced.loc[changed].copy()
+        advanced["status"] = outcomes.loc[changed, "outcome"]
+        advanced["exit_time"] = outcomes.loc[changed, "exit_time"]
+        advanced["exit_price"] = outcomes.loc[changed, "exit_price"]
+        advanced["pnl"] = outcomes.loc[changed, "pnl"]
+        advanced["evaluated_until"] = advanced["exit_time"]
+        updated.append(advanced.reset_index(drop=True))
+
+    if updated:
+        updated = pd.concat(updated, ignore_index=True)
+        save_outcomes(cur, updated)
+        pending = pending.set_index("signal_id", drop=False)
+        pending.update(updated.set_index("signal_id", drop=False)[["status", "evaluated_until", "exit_time", "exit_price", "pnl"]])
+        pending = pending.reset_index(drop=True)
+    return pending[pending["status"].isin(["no_data", "open"])]
+
+def overall_performance(cur, pending: pd.DataFrame) -> dict:
+    """
+    Gesamtkennzahlen wie compute_performance_metrics: abgeschlossene Signale aus 'signal_performance',
+    offene zum letzten Schlusskurs bewertet, Signale ohne nachfolgende Kerzen nur als Trade gezählt.
+    """
+    closed = load_performance(cur, group_by=[])
+    open_pnl = pending.loc[pending["status"] == "open", "pnl"].to_numpy(dtype=float)
+    closed_trades = int(closed["closed_trades"].sum())
+    total_trades = closed_trades + len(pending)
+    winning_trades = int(closed["winning_trades"].sum()) + int((open_pnl > 0).sum())
+    total_profit = float(closed["total_profit"].sum()) + float(open_pnl[open_pnl > 0].sum())
+    total_loss = float(closed["total_loss"].sum()) + abs(float(open_pnl[open_pnl <= 0].sum()))
+    return {
+        "total_trades": total_trades,
+        "closed_trades": closed_trades,
+        "open_trades": len(open_pnl),
+        "winning_trades": winning_trades,
+        "win_rate": (winning_trades / total_trades) * 100 if total_trades > 0 else 0,
+        "total_profit": total_profit,
+        "total_loss": total_loss,
+        "profit_factor": total_profit / total_loss if total_loss > 0 else float("inf"),
+    }
 
 def analyze_signals():
     """
     Bewertet die generierten Handelssignale basierend auf nachfolgenden Marktdaten.
+    Nur neue und noch offene Signale werden gegen die neuen Kerzen (aus dem Kerzen-Cache) geprüft, die
+    Kennzahlen abgeschlossener Signale kommen aus den fortgeschriebenen Aggregaten in 'signal_performance'.
+    Der Aufwand hängt damit von der Zahl offener Signale ab, nicht von der gesamten Signalhistorie.
+    Gibt (noch offene Signale, Kennzahlen, Kennzahlen pro Asset) zurück.
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Lade alle Signale
-        cur.execute("SELECT * FROM generated_signals ORDER BY timestamp_utc ASC;")
-        signals = cur.fetchall()
-        signal_columns = [desc[0] for desc in cur.description]
-        signals_df = pd.DataFrame(signals, columns=signal_columns)
+        with cursor() as cur:
+            pending = advance_signal_outcomes(cur)
+            metrics = overall_performance(cur, pending)
+            per_asset = load_performance(cur, group_by=["asset"])
 
-        if signals_df.empty:
+        if metrics["total_trades"] == 0:
             print("Keine Signale zur Analyse gefunden.")
-            return
-
-        total_trades = len(signals_df)
-        winning_trades = 0
-        total_profit = 0.0
-        total_loss = 0.0
-
-        print(f"Analysiere {total_trades} Signale...")
-
-        for index, signal in signals_df.iterrows():
-            signal_id = signal["signal_id"]
-            asset = signal["asset"]
-            entry_price = signal["entry_price"]
-            signal_timestamp = signal["timestamp_utc"]
-            take_profit_target = signal["take_profit_target"]
-            stop_loss_target = signal["stop_loss_target"]
-
-            # Lade nachfolgende Marktdaten
-            cur.execute(
-                """
-                SELECT timestamp, close FROM market_data
-                WHERE asset = %s AND timestamp > %s
-                ORDER BY timestamp ASC;
-                """,
-                (asset, signal_timestamp)
-            )
-            market_data = cur.fetchall()
-            market_data_df = pd.DataFrame(market_data, columns=["timestamp", "close"])
-
-            if market_data_df.empty:
-                print(f"Keine nachfolgenden Marktdaten für Signal {signal_id} ({asset}) gefunden. Überspringe.")
-                continue
-
-            # Prüfe, ob Take Profit oder Stop Loss erreicht wurde
-            target_reached = False
-            for _, row in market_data_df.iterrows():
-                current_price = row["close"]
-                if current_price >= take_profit_target:
-                    profit = take_profit_target - entry_price
-                    total_profit += profit
-                    winning_trades += 1
-                    target_reached = True
-                    # print(f"Signal {signal_id}: Take Profit erreicht! Profit: {profit:.2f}")
-                    break
-                elif current_price <= stop_loss_target:
-                    loss = entry_price - stop_loss_target
-                    total_loss += loss
-                    target_reached = True
-                    # print(f"Signal {signal_id}: Stop Loss erreicht! Verlust: {loss:.2f}")
-                    break
-            
-            if not target_reached:
-                # If neither target was reached, consider the last available price
-                final_price = market_data_df["close"].iloc[-1]
-                if final_price > entry_price:
-                    profit = final_price - entry_price
-                    total_profit += profit
-                    winning_trades += 1
-                    # print(f"Signal {signal_id}: Offener Gewinn: {profit:.2f}")
-                else:
-                    loss = entry_price - final_price
-                    total_loss += loss
-                    # print(f"Signal {signal_id}: Offener Verlust: {loss:.2f}")
-
-        # Berechne Performance-Metriken
-        win_rate = (winning_trades / total_trades) * 100 if total_trades > 0 else 0
-        profit_factor = total_profit / total_loss if total_loss > 0 else float("inf")
+            return None
+
+        skipped = int((pending["status"] == "no_data").sum())
+        if skipped:
+            print(f"Keine nachfolgenden Marktdaten für {skipped} Signale gefunden. Übersprungen.")
 
         print("\n--- Analyse-Ergebnisse ---")
-        print(f"Anzahl der Trades: {total_trades}")
-        print(f"Trefferquote (Win Rate): {win_rate:.2f}%")
-        print(f"Profit-Faktor: {profit_factor:.2f}")
+        print(f"Anzahl der Trades: {metrics['total_trades']} ({metrics['closed_trades']} abgeschlossen, {metrics['open_trades']} offen)")
+        print(f"Trefferquote (Win Rate): {metrics['win_rate']:.2f}%")
+        print(f"Profit-Faktor: {metrics['profit_factor']:.2f}")
+        for row in per_asset.itertuples(index=False):
+            print(f"  {row.asset}: {row.closed_trades} abgeschlossen, Win Rate {row.win_rate:.2f}%, Profit-Faktor {row.profit_factor:.2f}")
         print("-------------------------")
+        return pending, metrics, per_asset
 
-    except psycopg2.Error as e:
+    except DatabaseError as e:
         print(f"Datenbankfehler bei der Signalanalyse: {e}")
     except Exception as e:
         print(f"Fehler bei der Signalanalyse: {e}")
-    finally:
-        if conn:
-            conn.close()
+    return None
 
 if __name__ == "__main__":
     # Example usage (will require valid DB setup and some data in generated_signals and market_data)
     # analyze_signals()
     print("Analysis script executed. No analysis performed by default when run directly. Use main.py for orchestration.")
-
-
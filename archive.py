@@ -0,0 +1,293 @@
+import json
+import os
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from storage import cursor
+from timeframes import datetime_to_ms
+from config import ARCHIVE_DIR, ARCHIVE_PARQUET_COMPRESSION
+
+# Archivierte Tabellen: Zeitspalte (Monatspartition), weitere Partitionsspalten und die Spalten der Dateien.
+# Partitionsspalten stehen wie bei Hive nur im Pfad (z.B. asset=BTC%2FUSDT/timeframe=1h/month=2024-05).
+ARCHIVE_TABLES = {
+    "market_data": {
+        "time_column": "timestamp",
+        "partition_columns": ["asset", "timeframe"],
+        "columns": [("timestamp", "timestamp"), ("open", "float"), ("high", "float"), ("low", "float"), ("close", "float"), ("volume", "float")],
+    },
+    "onchain_transactions": {
+        "time_column": "timestamp_utc",
+        "partition_columns": [],
+        "columns": [
+            ("tx_hash", "string"), ("timestamp_utc", "timestamp"), ("wallet_monitored", "string"),
+            ("from_address", "string"), ("to_address", "string"), ("value_eth", "float"),
+        ],
+    },
+    "sentiment_data": {
+        "time_column": "timestamp_utc",
+        "partition_columns": [],
+        "columns": [("id", "int"), ("timestamp_utc", "timestamp"), ("source", "string"), ("headline", "string"), ("sentiment_score", "float")],
+    },
+}
+
+MANIFEST_FILE = "manifest.json"
+
+def _pyarrow():
+    """
+    pyarrow ist optional und wird nur für Archiv und Archiv-Leser benötigt.
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Für das Archiv wird pyarrow benötigt (pip install pyarrow).") from e
+    return pyarrow
+
+def _arrow_type(pa, kind: str):
+    return {
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "float": pa.float64(),
+        "int": pa.int64(),
+        "string": pa.string(),
+    }[kind]
+
+def _month_start(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+def _partition_path(key_values: dict, month: datetime) -> str:
+    parts = [f"{column}={quote(str(value), safe='')}" for column, value in key_values.items()]
+    return "/".join(parts + [f"month={month:%Y-%m}"])
+
+def _watermark_key(key_values: dict) -> str:
+    return "|".join(str(value) for value in key_values.values())
+
+def load_manifest(archive_dir: str = ARCHIVE_DIR) -> dict:
+    """
+    Verzeichnis der archivierten Partitionen und der Stand (Ende des letzten vollständigen Monats) pro Partitionsschlüssel.
+    """
+    path = os.path.join(archive_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"tables": {}}
+    with open(path) as handle:
+        return json.load(handle)
+
+def _save_manifest(manifest: dict, archive_dir: str):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def _write_files(pa, table, table_name: str, partition: str, archive_dir: str) -> dict:
+    """
+    Schreibt eine Partition als Parquet (komprimiert, für externe Werkzeuge) und als Arrow-IPC-Datei
+    (unkomprimiert, für memory-mapped Lesen). Beide Dateien werden erst vollständig geschrieben und dann umbenannt.
+    """
+    files = {
+        "parquet": os.path.join("parquet", table_name, partition, "part-0.parquet"),
+        "arrow": os.path.join("arrow", table_name, partition, "part-0.arrow"),
+    }
+    for kind, relative in files.items():
+        path = os.path.join(archive_dir, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if kind == "parquet":
+            pa.parquet.write_table(table, path + ".tmp", compression=ARCHIVE_PARQUET_COMPRESSION)
+        else:
+            with pa.OSFile(path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(path + ".tmp", path)
+    return files
+
+def _fetch_month(cur, table_name: str, spec: dict, key_values: dict, month: datetime) -> list:
+    time_column = spec["time_column"]
+    conditions = [f"{column} = %s" for column in key_values] + [f"{time_column} >= %s", f"{time_column} < %s"]
+    cur.execute(
+        f"""
+        SELECT {', '.join(column for column, _ in spec['columns'])} FROM {table_name}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {time_column} ASC;
+        """,
+        (*key_values.values(), month, _next_month(month))
+    )
+    return cur.fetchall()
+
+def _to_arrow(pa, spec: dict, rows: list):
+    columns = list(zip(*rows)) if rows else [[] for _ in spec["columns"]]
+    arrays = []
+    for (column, kind), values in zip(spec["columns"], columns):
+        if kind == "float":
+            values = [None if value is None else float(value) for value in values]
+        arrays.append(pa.array(values, type=_arrow_type(pa, kind)))
+    return pa.Table.from_arrays(arrays, names=[column for column, _ in spec["columns"]])
+
+def archive_table(table_name: str, archive_dir: str = ARCHIVE_DIR, now: datetime = None) -> int:
+    """
+    Archiviert alle abgeschlossenen Monate einer Tabelle, die seit dem letzten Lauf hinzugekommen sind.
+    Der laufende Monat bleibt in Postgres, bis er vorbei ist. Gibt die Anzahl neuer Partitionen zurück.
+    Zeilen, die nachträglich in bereits archivierte Monate geschrieben werden (Backfill), erfasst erst
+    rebuild_archive().
+    """
+    pa = _pyarrow()
+    spec = ARCHIVE_TABLES[table_name]
+    time_column = spec["time_column"]
+    partition_columns = spec["partition_columns"]
+    current_month = _month_start(now or datetime.now(timezone.utc))
+
+    manifest = load_manifest(archive_dir)
+    state = manifest["tables"].setdefault(table_name, {"partitions": {}, "watermarks": {}})
+    written = 0
+    with cursor() as cur:
+        group_by = f" GROUP BY {', '.join(partition_columns)}" if partition_columns else ""
+        cur.execute(
+            f"SELECT {''.join(column + ', ' for column in partition_columns)}MIN({time_column}) FROM {table_name}{group_by};"
+        )
+        for row in cur.fetchall():
+            key_values = dict(zip(partition_columns, row[:-1]))
+            first = row[-1]
+            if first is None:
+                continue
+            watermark = state["watermarks"].get(_watermark_key(key_values))
+            month = datetime.fromisoformat(watermark) if watermark else _month_start(first)
+            while month < current_month:
+                rows = _fetch_month(cur, table_name, spec, key_values, month)
+                if rows:
+                    partition = _partition_path(key_values, month)
+                    files = _write_files(pa, _to_arrow(pa, spec, rows), table_name, partition, archive_dir)
+                    state["partitions"][partition] = {
+                        "keys": {column: str(value) for column, value in key_values.items()},
+                        "month": f"{month:%Y-%m}",
+                        "rows": len(rows),
+                        "files": files,
+                    }
+                    written += 1
+                month = _next_month(month)
+                state["watermarks"][_watermark_key(key_values)] = month.isoformat()
+            # Nach jedem Schlüssel speichern, ein Abbruch verliert so höchstens dessen neue Partitionen
+            _save_manifest(manifest, archive_dir)
+    return written
+
+def archive_all(archive_dir: str = ARCHIVE_DIR) -> dict:
+    """
+    Archiviert 'market_data', 'onchain_transactions' und 'sentiment_data' inkrementell.
+    """
+    written = {}
+    for table_name in ARCHIVE_TABLES:
+        written[table_name] = archive_table(table_name, archive_dir)
+        print(f"Archiv {table_name}: {written[table_name]} neue Monatspartitionen.")
+    return written
+
+def rebuild_archive(table_name: str = None, archive_dir: str = ARCHIVE_DIR) -> dict:
+    """
+    Schreibt das Archiv (oder eine Tabelle davon) komplett neu, z.B. nach einem Backfill älterer Monate.
+    """
+    manifest = load_manifest(archive_dir)
+    for name in [table_name] if table_name else list(ARCHIVE_TABLES):
+        manifest["tables"].pop(name, None)
+    _save_manifest(manifest, archive_dir)
+    if table_name:
+        return {table_name: archive_table(table_name, archive_dir)}
+    return archive_all(archive_dir)
+
+def archive_available(archive_dir: str = ARCHIVE_DIR) -> bool:
+    """
+    True, wenn ein Archiv existiert und pyarrow importierbar ist.
+    """
+    if not os.path.exists(os.path.join(archive_dir, MANIFEST_FILE)):
+        return False
+    try:
+        _pyarrow()
+    except RuntimeError:
+        return False
+    return True
+
+def archived_until(table_name: str, archive_dir: str = ARCHIVE_DIR, manifest: dict = None, **key_values):
+    """
+    Ende des archivierten Zeitraums (exklusiv) für einen Partitionsschlüssel, z.B.
+    archived_until("market_data", asset="BTC/USDT", timeframe="1h"). None, wenn nichts archiviert ist.
+    """
+    manifest = manifest or load_manifest(archive_dir)
+    spec = ARCHIVE_TABLES[table_name]
+    key = _watermark_key({column: key_values[column] for column in spec["partition_columns"]})
+    watermark = manifest["tables"].get(table_name, {}).get("watermarks", {}).get(key)
+    return datetime.fromisoformat(watermark) if watermark else None
+
+def read_archive(table_name: str, since: datetime = None, until: datetime = None, columns: list = None,
+                 archive_dir: str = ARCHIVE_DIR, manifest: dict = None, **key_values):
+    """
+    Liest archivierte Zeilen mit since <= Zeit < until als pyarrow.Table. Die Arrow-Dateien werden
+    memory-mapped gelesen: die Spalten verweisen direkt auf die Dateien, statt kopiert zu werden.
+    key_values filtert nach Partitionsspalten (z.B. asset="BTC/USDT"); gefilterte Partitionsspalten
+    sind nicht im Ergebnis enthalten, ungefilterte werden als Dictionary-Spalte angehängt.
+    """
+    pa = _pyarrow()
+    import pyarrow.compute as pc
+    manifest = manifest or load_manifest(archive_dir)
+    spec = ARCHIVE_TABLES[table_name]
+    time_column = spec["time_column"]
+    first_month = f"{_month_start(since):%Y-%m}" if since else None
+    last_month = f"{_month_start(until):%Y-%m}" if until else None
+    extra_columns = [column for column in spec["partition_columns"] if column not in key_values]
+
+    tables = []
+    partitions = manifest["tables"].get(table_name, {}).get("partitions", {})
+    for partition, entry in sorted(partitions.items(), key=lambda item: (tuple(item[1]["keys"].values()), item[1]["month"])):
+        if any(entry["keys"][column] != str(value) for column, value in key_values.items()):
+            continue
+        if (first_month and entry["month"] < first_month) or (last_month and entry["month"] > last_month):
+            continue
+        source = pa.memory_map(os.path.join(archive_dir, entry["files"]["arrow"]), "r")
+        table = pa.ipc.open_file(source).read_all()
+        if columns:
+            table = table.select(list(dict.fromkeys([time_column, *columns])))
+        for column in extra_columns:
+            indices = pa.array([0] * table.num_rows, type=pa.int32())
+            table = table.append_column(column, pa.DictionaryArray.from_arrays(indices, pa.array([entry["keys"][column]])))
+        tables.append(table)
+
+    if not tables:
+        schema = pa.schema([(column, _arrow_type(pa, kind)) for column, kind in spec["columns"]])
+        empty = schema.empty_table()
+        return empty.select(list(dict.fromkeys([time_column, *columns]))) if columns else empty
+    table = pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+    if since is not None:
+        table = table.filter(pc.greater_equal(table[time_column], pa.scalar(since, type=table.schema.field(time_column).type)))
+    if until is not None:
+        table = table.filter(pc.less(table[time_column], pa.scalar(until, type=table.schema.field(time_column).type)))
+    return table
+
+def load_archived_closes(assets: list, timeframe: str, since: datetime = None, until: datetime = None,
+                         archive_dir: str = ARCHIVE_DIR) -> dict:
+    """
+    Archivierte Schlusskurse pro Asset als {asset: (Zeitstempel in ms als int64-Array, Schlusskurse)}.
+    """
+    manifest = load_manifest(archive_dir)
+    candles = {}
+    for asset in assets:
+        table = read_archive(
+            "market_data", since=since, until=until, columns=["close"],
+            archive_dir=archive_dir, manifest=manifest, asset=asset, timeframe=timeframe
+        )
+        timestamps_us = table["timestamp"].to_numpy().astype("datetime64[us]").astype("int64")
+        candles[asset] = (timestamps_us // 1000, table["close"].to_numpy())
+    return candles
+
+def archive_boundaries(assets: list, timeframe: str, archive_dir: str = ARCHIVE_DIR) -> dict:
+    """
+    {asset: Ende des archivierten Zeitraums in ms oder None} für die Kerzen eines Timeframes.
+    """
+    manifest = load_manifest(archive_dir)
+    boundaries = {}
+    for asset in assets:
+        until = archived_until("market_data", manifest=manifest, asset=asset, timeframe=timeframe)
+        boundaries[asset] = datetime_to_ms(until) if until else None
+    return boundaries
+
+if __name__ == "__main__":
+    archive_all()
@@ -0,0 +1,316 @@
+import itertools
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from storage import DatabaseError, cursor
+from archive import load_manifest, read_archive
+from analysis import resolve_exits, compute_performance_metrics
+from candle_cache import OHLCV_COLUMNS
+from indicators import wilder_rsi, compute_indicators
+from signal_engine import (
+    CONFIDENCE_INPUTS, tech_confidence_from_rsi, indicator_confidences, technical_confidence, onchain_confidence_from_activity, combine_confidence
+)
+from onchain_activity import ACTIVITY_BUCKET
+from timeframes import timeframe_to_ms
+from config import (
+    ARCHIVE_DIR, ASSETS_TO_TRACK, TIMEFRAME, RSI_PERIOD, RSI_OVERSOLD, RSI_OVERBOUGHT, SCORING_CANDLE_WINDOW, INDICATOR_WEIGHTS,
+    CONFIDENCE_WEIGHTS, SIGNAL_THRESHOLD, TAKE_PROFIT_PCT, STOP_LOSS_PCT
+)
+
+# Zeitfenster wie in signal_engine.calculate_confidence_scores_batch
+SENTIMENT_WINDOW_NS = 3 * 60 * 60 * 10**9
+ONCHAIN_WINDOW_NS = 24 * 60 * 60 * 10**9
+ONCHAIN_BUCKET_NS = timeframe_to_ms(ACTIVITY_BUCKET) * 10**6
+# Kerzenfenster pro Block in _window_confidences (begrenzt den Speicher der (Kerzen x Fenster)-Matrizen)
+INDICATOR_CHUNK_SIZE = 2000
+
+StrategyParams = namedtuple("StrategyParams", [
+    "rsi_period", "rsi_oversold", "rsi_overbought",
+    "weight_tech", "weight_sentiment", "weight_onchain",
+    "threshold", "take_profit_pct", "stop_loss_pct"
+])
+
+DEFAULT_PARAMS = StrategyParams(
+    RSI_PERIOD, RSI_OVERSOLD, RSI_OVERBOUGHT,
+    CONFIDENCE_WEIGHTS["tech"], CONFIDENCE_WEIGHTS["sentiment"], CONFIDENCE_WEIGHTS["onchain"],
+    SIGNAL_THRESHOLD, TAKE_PROFIT_PCT, STOP_LOSS_PCT
+)
+
+def _to_ns(values) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values, dtype=object), utc=True).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+def load_history(assets: list = None, timeframe: str = TIMEFRAME) -> dict:
+    """
+    Lädt die gespeicherte Historie (Kerzen, Sentiment, stündliche On-Chain-Zuflüsse) einmalig als NumPy-Arrays.
+    Zeitstempel sind ns seit Epoch (UTC). 'ohlcv' enthält pro Asset ein (OHLCV x Zeit)-Array für die Indikatoren.
+    """
+    assets = assets or ASSETS_TO_TRACK
+    with cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT asset, timestamp, {', '.join(OHLCV_COLUMNS)} FROM market_data
+            WHERE asset = ANY(%s) AND timeframe = %s
+            ORDER BY asset, timestamp ASC;
+            """,
+            (list(assets), timeframe)
+        )
+        candles_df = pd.DataFrame(cur.fetchall(), columns=["asset", "timestamp", *OHLCV_COLUMNS])
+
+        cur.execute("SELECT timestamp_utc, sentiment_score FROM sentiment_data ORDER BY timestamp_utc ASC;")
+        sentiment_rows = cur.fetchall()
+
+        cur.execute(
+            """
+            SELECT bucket, inflow_count, inflow_eth FROM onchain_wallet_activity_hourly
+            ORDER BY bucket ASC;
+            """
+        )
+        onchain_rows = cur.fetchall()
+
+    candles = {}
+    ohlcv = {}
+    for asset, group in candles_df.groupby("asset", sort=False):
+        candles[asset] = (_to_ns(group["timestamp"]), group["close"].to_numpy(dtype=float))
+        ohlcv[asset] = group[OHLCV_COLUMNS].to_numpy(dtype=float).T
+
+    return {
+        "timeframe": timeframe,
+        "candles": candles,
+        "ohlcv": ohlcv,
+        "sentiment": (
+            _to_ns([row[0] for row in sentiment_rows]),
+            np.array([float(row[1]) for row in sentiment_rows], dtype=float)
+        ),
+        "onchain": (
+            _to_ns([row[0] for row in onchain_rows]),
+            np.array([int(row[1]) for row in onchain_rows], dtype=np.int64),
+            np.array([float(row[2]) for row in onchain_rows], dtype=float)
+        ),
+    }
+
+def load_history_from_archive(assets: list = None, timeframe: str = TIMEFRAME, archive_dir: str = ARCHIVE_DIR) -> dict:
+    """
+    Wie load_history, liest aber ohne Postgres aus dem memory-mapped Arrow-Archiv (archive.py), also nur
+    abgeschlossene Monate. Die stündlichen On-Chain-Zuflüsse werden wie in onchain_activity aus den archivierten
+    Transaktionen gebildet: Wert > 0 an eine der Wallets, für die Transaktionen archiviert sind.
+    """
+    assets = assets or ASSETS_TO_TRACK
+    manifest = load_manifest(archive_dir)
+    candles = {}
+    ohlcv = {}
+    for asset in assets:
+        table = read_archive(
+            "market_data", columns=OHLCV_COLUMNS, archive_dir=archive_dir, manifest=manifest, asset=asset, timeframe=timeframe
+        )
+        if table.num_rows:
+            ohlcv[asset] = np.vstack([table[column].to_numpy(zero_copy_only=False) for column in OHLCV_COLUMNS]).astype(float)
+            candles[asset] = (_arrow_ns(table["timestamp"]), ohlcv[asset][OHLCV_COLUMNS.index("close")])
+
+    sentiment = read_archive("sentiment_data", columns=["sentiment_score"], archive_dir=archive_dir, manifest=manifest)
+    transactions = read_archive(
+        "onchain_transactions", columns=["wallet_monitored", "to_address", "value_eth"], archive_dir=archive_dir, manifest=manifest
+    )
+
+    wallets = {wallet.lower() for wallet in transactions["wallet_monitored"].to_pylist() if wallet}
+    to_address = np.array([(address or "").lower() for address in transactions["to_address"].to_pylist()], dtype=object)
+    values = transactions["value_eth"].to_numpy(zero_copy_only=False)
+    inflow = np.isin(to_address, list(wallets)) & (values > 0) if len(values) else np.zeros(0, dtype=bool)
+    inflow_times = _arrow_ns(transactions["timestamp_utc"])[inflow]
+    buckets, bucket_index = np.unique(inflow_times - inflow_times % ONCHAIN_BUCKET_NS, return_inverse=True)
+
+    return {
+        "timeframe": timeframe,
+        "candles": candles,
+        "ohlcv": ohlcv,
+        "sentiment": (_arrow_ns(sentiment["timestamp_utc"]), sentiment["sentiment_score"].to_numpy(zero_copy_only=False)),
+        "onchain": (
+            buckets,
+            np.bincount(bucket_index, minlength=len(buckets)).astype(np.int64),
+            np.bincount(bucket_index, weights=values[inflow], minlength=len(buckets)),
+        ),
+    }
+
+def _arrow_ns(column) -> np.ndarray:
+    return column.to_numpy().astype("datetime64[ns]").astype(np.int64)
+
+def _window_counts(event_times: np.ndarray, decision_times: np.ndarray, window_ns: int) -> tuple:
+    """
+    Für jeden Entscheidungszeitpunkt t die Ereignis-Indizes [lo, hi) im Fenster [t - window, t].
+    """
+    lo = np.searchsorted(event_times, decision_times - window_ns, side="left")
+    hi = np.searchsorted(event_times, decision_times, side="right")
+    return lo, hi
+
+def _window_confidences(ohlcv: np.ndarray, window: int = SCORING_CANDLE_WINDOW, weights: dict = INDICATOR_WEIGHTS) -> dict:
+    """
+    Konfidenzen der übrigen Indikatoren (MACD, Bollinger, Volumen) für jede Kerze wie live über die letzten
+    window Kerzen. Berechnet werden nur Indikatoren mit Gewicht in weights, die übrigen sind 0.
+    Bollinger und Volumen hängen nur von ihren letzten BOLLINGER_PERIOD bzw. VOLUME_ZSCORE_PERIOD Kerzen ab und
+    werden in einem Durchlauf über die ganze Reihe berechnet. Die EMAs von MACD und ATR beginnen live am Anfang
+    des Kerzenfensters; dafür werden die Fenster aller Kerzen wie Assets als Zeilen einer Matrix berechnet.
+    """
+    count = ohlcv.shape[1]
+    confidences = {name: np.zeros(count) for name in CONFIDENCE_INPUTS}
+    names = [name for name in CONFIDENCE_INPUTS if weights.get(name)]
+    if not count:
+        return confidences
+
+    rolling = [name for name in names if name != "macd"]
+    if rolling:
+        matrix = dict(zip(OHLCV_COLUMNS, ohlcv[:, None, :]), length=np.array([count]))
+        inputs = [indicator for name in rolling for indicator in CONFIDENCE_INPUTS[name]]
+        series = {name: values[0] for name, values in compute_indicators(matrix, names=inputs).items()}
+        confidences.update(indicator_confidences(series, None, names=rolling))
+
+    if "macd" in names:
+        positions = np.arange(count)
+        blocks = []
+        for start in range(0, count, INDICATOR_CHUNK_SIZE):
+            ends = positions[start:start + INDICATOR_CHUNK_SIZE]
+            # Wie candle_matrix: kürzere Reihen (Beginn der Historie) links mit der ersten Kerze aufgefüllt
+            index = np.maximum(ends[:, None] - window + 1 + np.arange(window)[None, :], 0)
+            matrix = dict(zip(OHLCV_COLUMNS, ohlcv[:, index]), length=np.minimum(ends + 1, window))
+            latest = {name: values[:, -1] for name, values in compute_indicators(matrix, names=CONFIDENCE_INPUTS["macd"]).items()}
+            blocks.append(indicator_confidences(latest, None, names=["macd"])["macd"])
+        confidences["macd"] = np.concatenate(blocks)
+    return confidences
+
+def prepare_features(history: dict, rsi_periods=(RSI_PERIOD,)) -> dict:
+    """
+    Berechnet die parameterunabhängigen Eingaben pro Asset und Kerze einmalig vorab:
+    RSI je Periode, die Konfidenzen der übrigen Indikatoren (siehe _window_confidences),
+    3h-Sentiment-Durchschnitt sowie 24h-Anzahl und -Volumen der On-Chain-Käufe zum Kerzenschluss.
+    Von den Stunden-Buckets zählen nur bereits abgeschlossene, damit keine späteren Käufe einfließen.
+    """
+    timeframe_ns = timeframe_to_ms(history["timeframe"]) * 10**6
+    sentiment_times, sentiment_scores = history["sentiment"]
+    sentiment_cumsum = np.concatenate(([0.0], np.cumsum(sentiment_scores)))
+    onchain_buckets, onchain_counts, onchain_volumes = history["onchain"]
+    onchain_count_cumsum = np.concatenate(([0], np.cumsum(onchain_counts)))
+    onchain_volume_cumsum = np.concatenate(([0.0], np.cumsum(onchain_volumes)))
+
+    features = {}
+    for asset, (timestamps, closes) in history["candles"].items():
+        # Live wird direkt nach dem Kerzenschluss bewertet
+        decision_times = timestamps + timeframe_ns
+
+        lo, hi = _window_counts(sentiment_times, decision_times, SENTIMENT_WINDOW_NS)
+        count = hi - lo
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sentiment = np.where(count > 0, (sentiment_cumsum[hi] - sentiment_cumsum[lo]) / count, 0.0)
+
+        # Wie live ab dem Bucket, der den Fensteranfang enthält, aber nur abgeschlossene Buckets
+        window_start = decision_times - ONCHAIN_WINDOW_NS
+        lo = np.searchsorted(onchain_buckets, window_start - window_start % ONCHAIN_BUCKET_NS, side="left")
+        hi = np.maximum(np.searchsorted(onchain_buckets, decision_times - ONCHAIN_BUCKET_NS, side="right"), lo)
+
+        features[asset] = {
+            "closes": closes,
+            "rsi": {period: np.concatenate(([np.nan], wilder_rsi(closes, period)[0])) for period in set(rsi_periods)},
+            "indicator_confidences": _window_confidences(history["ohlcv"][asset]),
+            "confidence_sentiment": np.round(sentiment, 2),
+            "onchain_count": onchain_count_cumsum[hi] - onchain_count_cumsum[lo],
+            "onchain_volume": onchain_volume_cumsum[hi] - onchain_volume_cumsum[lo],
+        }
+    return features
+
+def candle_confidences(asset_features: dict, params: StrategyParams = DEFAULT_PARAMS) -> tuple:
+    """
+    Technische und Gesamtkonfidenz eines Assets zu jedem Kerzenschluss nach denselben Regeln wie
+    signal_engine.calculate_confidence_scores_batch (Indikatoren nach INDICATOR_WEIGHTS).
+    """
+    rsi = asset_features["rsi"][params.rsi_period]
+    # Ohne RSI (NaN) zählt der RSI wie live nicht mit, ohne jeden Indikator ist die technische Konfidenz 0
+    confidences = dict(
+        asset_features["indicator_confidences"],
+        rsi=tech_confidence_from_rsi(rsi, params.rsi_oversold, params.rsi_overbought)
+    )
+    confidence_tech = np.round(technical_confidence(confidences), 2)
+    confidence_onchain = np.round(onchain_confidence_from_activity(asset_features["onchain_count"], asset_features["onchain_volume"]), 2)
+    weights = {"tech": params.weight_tech, "sentiment": params.weight_sentiment, "onchain": params.weight_onchain}
+    return confidence_tech, combine_confidence(confidence_tech, asset_features["confidence_sentiment"], confidence_onchain, weights)
+
+def run_backtest(features: dict, params: StrategyParams = DEFAULT_PARAMS) -> dict:
+    """
+    Spielt die Strategie vektorisiert über die komplette Historie ab: an jedem Kerzenschluss mit
+    Gesamtkonfidenz über dem Schwellwert entsteht ein BUY-Signal zum Schlusskurs, das gegen die
+    folgenden Kerzen mit TP/SL bewertet wird. Liefert die Kennzahlen wie analysis.compute_performance_metrics.
+    """
+    outcomes = []
+    pnls = []
+    for asset_features in features.values():
+        closes = asset_features["closes"]
+        _, confidence_total = candle_confidences(asset_features, params)
+
+        signal_index = np.flatnonzero(confidence_total > params.threshold)
+        if len(signal_index) == 0:
+            continue
+        entry = closes[signal_index]
+        outcome, _, exit_price = resolve_exits(
+            closes, signal_index + 1,
+            entry * (1 + params.take_profit_pct),
+            entry * (1 - params.stop_loss_pct)
+        )
+        outcomes.append(outcome)
+        pnls.append(exit_price - entry)
+
+    if not outcomes:
+        return compute_performance_metrics(pd.DataFrame({"outcome": [], "pnl": []}))
+    return compute_performance_metrics(pd.DataFrame({
+        "outcome": np.concatenate(outcomes),
+        "pnl": np.concatenate(pnls),
+    }))
+
+def parameter_grid(**ranges) -> list:
+    """
+    Kartesisches Produkt der angegebenen Wertelisten, z.B.
+    parameter_grid(threshold=[0.6, 0.7, 0.75], take_profit_pct=[0.03, 0.05]).
+    Nicht angegebene Parameter behalten ihren Wert aus DEFAULT_PARAMS.
+    """
+    unknown = set(ranges) - set(StrategyParams._fields)
+    if unknown:
+        raise ValueError(f"Unbekannte Parameter: {sorted(unknown)}")
+    values = [ranges.get(field, [getattr(DEFAULT_PARAMS, field)]) for field in StrategyParams._fields]
+    return [StrategyParams(*combination) for combination in itertools.product(*values)]
+
+# Vorberechnete Features im Worker-Prozess (einmal pro Prozess übertragen, nicht pro Aufgabe)
+_worker_features = None
+
+def _init_worker(features: dict):
+    global _worker_features
+    _worker_features = features
+
+def _run_in_worker(params: StrategyParams) -> dict:
+    return {**params._asdict(), **run_backtest(_worker_features, params)}
+
+def run_parameter_sweep(grid: list, history: dict = None, processes: int = None) -> pd.DataFrame:
+    """
+    Bewertet alle Parameterkombinationen parallel in einem Prozess-Pool. Die Historie wird einmal
+    geladen und vorberechnet und jedem Worker beim Start übergeben.
+    Liefert ein DataFrame mit einer Zeile pro Kombination, sortiert nach Profit-Faktor.
+    """
+    history = history or load_history()
+    features = prepare_features(history, {params.rsi_period for params in grid})
+    processes = processes or os.cpu_count() or 1
+    chunksize = max(1, len(grid) // (processes * 4))
+
+    print(f"Starte Parameter-Sweep über {len(grid)} Kombinationen mit {processes} Prozessen...")
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(features,)) as executor:
+        rows = list(executor.map(_run_in_worker, grid, chunksize=chunksize))
+
+    results = pd.DataFrame(rows)
+    return results.sort_values(["profit_factor", "total_trades"], ascending=False, ignore_index=True)
+
+if __name__ == "__main__":
+    # Beispiel: Backtest mit den Live-Parametern und ein kleiner Sweep (benötigt Daten in der DB)
+    try:
+        history = load_history()
+        print(run_backtest(prepare_features(history), DEFAULT_PARAMS))
+        grid = parameter_grid(threshold=[0.5, 0.6, 0.75], take_profit_pct=[0.03, 0.05], stop_loss_pct=[0.015, 0.025])
+        print(run_parameter_sweep(grid, history).head(10))
+    except DatabaseError as e:
+        print(f"Datenbankfehler beim Backtest: {e}")
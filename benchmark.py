@@ -0,0 +1,435 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import types
+import zlib
+from datetime import datetime, timezone
+from unittest import mock
+
+import numpy as np
+
+import config
+import metrics
+
+# Vorgaben für die Datenmenge; "large" erzeugt mehrere Millionen Basiskerzen
+SCALES = {
+    "small": {"assets": 5, "base_candles": 20000, "wallets": 20, "transactions_per_wallet": 500, "signals": 2000, "headlines": 200},
+    "medium": {"assets": 20, "base_candles": 50000, "wallets": 200, "transactions_per_wallet": 1000, "signals": 20000, "headlines": 1000},
+    "large": {"assets": 50, "base_candles": 100000, "wallets": 1000, "transactions_per_wallet": 2000, "signals": 100000, "headlines": 5000},
+}
+
+BENCH_TABLES = [
+    "market_data", "rsi_state", "sentiment_data", "sentiment_cache", "onchain_transactions",
+    "onchain_sync_state", "onchain_wallet_activity_hourly", "generated_signals", "signal_outcomes", "signal_performance",
+]
+
+# Import-Budget der Stufen-Module (Sekunden in einem frischen Interpreter) und schwere Abhängigkeiten,
+# die sie beim Import nicht laden dürfen; schützt den Kaltstart einzelner Stufen-Jobs (python main.py <befehl>)
+IMPORT_BUDGETS = {
+    "main": (0.05, ["numpy", "pandas", "ccxt", "requests", "psycopg2"]),
+    "db_setup": (0.25, ["numpy", "pandas", "ccxt", "requests"]),
+    "collectors": (0.6, ["pandas", "ccxt", "openai"]),
+    "signal_engine": (0.4, ["pandas", "ccxt", "requests"]),
+    "analysis": (1.0, ["ccxt", "requests"]),
+}
+HEAVY_MODULES = ["numpy", "pandas", "ccxt", "requests", "psycopg2", "openai", "pyarrow"]
+
+# --- Synthetische Daten ---
+
+def synthetic_prices(symbol: str, timestamps_ms: np.ndarray) -> np.ndarray:
+    """
+    Deterministischer Kursverlauf pro Symbol (überlagerte Schwingungen), damit Seed-Daten und
+    der Fake-Exchange lückenlos zusammenpassen.
+    """
+    phase = zlib.crc32(symbol.encode()) % 1000
+    hours = timestamps_ms / 3.6e6
+    return (50 + phase) * (1 + 0.04 * np.sin((hours + phase) / 9) + 0.01 * np.sin((hours * 60 + phase) / 17))
+
+def synthetic_candles(symbol: str, start_ms: int, count: int, timeframe_ms: int) -> list:
+    """
+    OHLCV-Kerzen im ccxt-Format [timestamp, open, high, low, close, volume].
+    """
+    timestamps = start_ms + np.arange(count, dtype=np.int64) * timeframe_ms
+    opens = synthetic_prices(symbol, timestamps - timeframe_ms)
+    closes = synthetic_prices(symbol, timestamps)
+    highs = np.maximum(opens, closes) * 1.001
+    lows = np.minimum(opens, closes) * 0.999
+    volumes = 1.0 + (timestamps // timeframe_ms) % 7
+    return [
+        [int(timestamp), float(open_), float(high), float(low), float(close), float(volume)]
+        for timestamp, open_, high, low, close, volume in zip(timestamps, opens, highs, lows, closes, volumes)
+    ]
+
+def synthetic_wallet_transactions(wallet: str, count: int, end_s: int, rng: np.random.Generator) -> list:
+    """
+    Transaktionen im Etherscan-Format, aufsteigend nach Block, verteilt über die letzten 48 Stunden.
+    Etwa die Hälfte sind Zuflüsse an die Wallet.
+    """
+    timestamps = np.sort(rng.integers(end_s - 48 * 3600, end_s, count))
+    transactions = []
+    for i, timestamp in enumerate(timestamps):
+        inflow = rng.random() < 0.5
+        transactions.append({
+            "hash": f"0x{zlib.crc32(wallet.encode()):08x}{i:056x}",
+            "timeStamp": str(int(timestamp)),
+            "blockNumber": str(1000000 + int(timestamp) // 12),
+            "from": f"0x{rng.integers(0, 2**63):040x}" if inflow else wallet.lower(),
+            "to": wallet.lower() if inflow else f"0x{rng.integers(0, 2**63):040x}",
+            "value": str(int(rng.integers(0, 5 * 10**18))),
+        })
+    return transactions
+
+# --- Offline-Ersatz für Binance, Etherscan und OpenAI ---
+
+class FakeExchange:
+    """
+    Minimaler ccxt-Ersatz: fetch_ohlcv liefert synthetische Kerzen bis zur aktuellen Zeit.
+    """
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.calls = 0
+
+    def milliseconds(self) -> int:
+        return int(time.time() * 1000)
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        from timeframes import timeframe_to_ms
+        self.calls += 1
+        time.sleep(self.latency_s)
+        timeframe_ms = timeframe_to_ms(timeframe)
+        start_ms = -(-since // timeframe_ms) * timeframe_ms
+        count = max(0, min(limit, (self.milliseconds() - start_ms) // timeframe_ms + 1))
+        return synthetic_candles(symbol, start_ms, count, timeframe_ms)
+
+class FakeEtherscan:
+    """
+    Ersatz für die Session aus transport.py gegen die Etherscan-API (txlist mit startblock/page/offset).
+    """
+
+    def __init__(self, transactions_by_wallet: dict, latency_s: float = 0.0):
+        self.transactions_by_wallet = {wallet.lower(): txs for wallet, txs in transactions_by_wallet.items()}
+        self.latency_s = latency_s
+        self.calls = 0
+
+    def get(self, url, params=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency_s)
+        transactions = [
+            tx for tx in self.transactions_by_wallet.get(params["address"].lower(), [])
+            if int(tx["blockNumber"]) >= int(params["startblock"])
+        ]
+        offset = int(params["offset"])
+        start = (int(params["page"]) - 1) * offset
+        page = transactions[start:start + offset]
+        payload = {"status": "1", "message": "OK", "result": page} if page else {"status": "0", "message": "No transactions found", "result": []}
+        content = json.dumps(payload).encode()
+        return types.SimpleNamespace(
+            status_code=200, headers={}, url=url, content=content, raise_for_status=lambda: None, json=lambda: payload
+        )
+
+class FakeOpenAIClient:
+    """
+    Ersatz für openai.OpenAI: beantwortet jede Anfrage mit einem JSON-Score pro nummerierter Headline.
+    """
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.calls = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def _create(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency_s)
+        headlines = [line for line in messages[-1]["content"].splitlines()[1:] if line.strip()]
+        scores = [round(((zlib.crc32(line.encode()) % 200) - 100) / 100, 2) for line in headlines]
+        content = json.dumps({"scores": scores})
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+# --- Datenbank ---
+
+def ensure_database(db_name: str):
+    """
+    Legt die Benchmark-Datenbank an, falls sie fehlt (Verbindung über die Datenbank aus config.py).
+    """
+    import psycopg2
+    conn = psycopg2.connect(host=config.DB_HOST, database=config.DB_NAME, user=config.DB_USER, password=config.DB_PASSWORD)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (db_name,))
+            if cur.fetchone() is None:
+                cur.execute(f'CREATE DATABASE "{db_name}";')
+    finally:
+        conn.close()
+
+def reset_tables():
+    from storage import BACKEND, cursor
+    with cursor() as cur:
+        if BACKEND == "postgres":
+            cur.execute(f"TRUNCATE {', '.join(BENCH_TABLES)} RESTART IDENTITY;")
+        else:
+            # Ohne TRUNCATE; INTEGER PRIMARY KEY beginnt in leeren Tabellen wieder bei 1
+            for table in BENCH_TABLES:
+                cur.execute(f"DELETE FROM {table};")
+
+def seed_market_data(assets: list, base_candles: int, end_ms: int) -> int:
+    from storage import bulk_insert, cursor
+    from timeframes import timeframe_to_ms, ms_to_datetime
+    from config import BASE_TIMEFRAME
+    base_ms = timeframe_to_ms(BASE_TIMEFRAME)
+    start_ms = end_ms - end_ms % base_ms - base_candles * base_ms
+    inserted = 0
+    for asset in assets:
+        symbol = asset.replace('/', '')
+        for chunk_start in range(0, base_candles, 100000):
+            count = min(100000, base_candles - chunk_start)
+            candles = synthetic_candles(symbol, start_ms + chunk_start * base_ms, count, base_ms)
+            rows = [(ms_to_datetime(c[0]), asset, BASE_TIMEFRAME, c[1], c[2], c[3], c[4], c[5]) for c in candles]
+            with cursor() as cur:
+                inserted += bulk_insert(cur, "market_data", ["timestamp", "asset", "timeframe", "open", "high", "low", "close", "volume"], rows).inserted
+    return inserted
+
+def seed_resampled(assets: list) -> int:
+    from storage import cursor
+    from collectors import resample_market_asset
+    written = 0
+    for asset in assets:
+        with cursor() as cur:
+            written += sum(resample_market_asset(cur, asset)[0].values())
+    return written
+
+def seed_signals(assets: list, count: int, end_ms: int, rng: np.random.Generator) -> int:
+    from storage import bulk_insert, cursor
+    from timeframes import ms_to_datetime
+    from config import TIMEFRAME
+    timestamps = np.sort(rng.integers(end_ms - 20 * 24 * 3600 * 1000, end_ms, count))
+    rows = []
+    for timestamp in timestamps:
+        asset = assets[int(rng.integers(len(assets)))]
+        entry = float(synthetic_prices(asset.replace('/', ''), np.array([timestamp]))[0])
+        rows.append((
+            ms_to_datetime(int(timestamp)), asset, TIMEFRAME, "BUY", entry, 0.8, 0.5, 0.3, 0.8,
+            json.dumps({"synthetic": True}), entry * 1.05, entry * 0.975
+        ))
+    with cursor() as cur:
+        return bulk_insert(cur, "generated_signals", [
+            "timestamp_utc", "asset", "timeframe", "signal_type", "entry_price", "confidence_total",
+            "confidence_tech", "confidence_sentiment", "confidence_onchain",
+            "triggering_factors", "take_profit_target", "stop_loss_target"
+        ], rows).inserted
+
+# --- Ablauf ---
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure_import(module: str, repeats: int = 3) -> tuple:
+    """
+    Importzeit eines Moduls in einem frischen Interpreter (Minimum aus repeats Läufen) und die dabei
+    geladenen HEAVY_MODULES.
+    """
+    code = (
+        f"import sys, time; started = time.perf_counter(); import {module}; "
+        f"print(time.perf_counter() - started); print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    timings = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.splitlines()
+        timings.append(float(output[0]))
+    return min(timings), [name for name in output[1].split(",") if name]
+
+def check_import_budgets(budgets: dict = IMPORT_BUDGETS) -> dict:
+    """
+    Prüft Importzeit und geladene Abhängigkeiten der Stufen-Module gegen IMPORT_BUDGETS.
+    """
+    results = {}
+    for module, (budget_s, forbidden) in budgets.items():
+        seconds, loaded = measure_import(module)
+        violations = [name for name in loaded if name in forbidden]
+        results[module] = {
+            "import_s": round(seconds, 4), "budget_s": budget_s, "loaded": loaded,
+            "forbidden_loaded": violations, "ok": seconds <= budget_s and not violations,
+        }
+        print(
+            f"import {module}: {seconds:.3f}s (Budget {budget_s}s)"
+            + (f", lädt unerlaubt {violations}" if violations else "")
+            + ("" if results[module]["ok"] else " -> ÜBERSCHRITTEN"),
+            file=sys.stderr
+        )
+    return results
+
+class StageTimer:
+    """
+    Misst Stufen mit perf_counter. Die Konsolenausgabe der Stufen wird abgefangen (mit verbose
+    durchgereicht) und nach Fehlermeldungen durchsucht, da die Stufen Fehler nur ausgeben.
+    """
+
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
+        self.results = {}
+        self.errors = {}
+
+    def run(self, name: str, func, *args, **kwargs):
+        captured = io.StringIO()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(captured):
+            result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        output = captured.getvalue()
+        if self.verbose:
+            sys.stdout.write(output)
+        errors = [line for line in output.splitlines() if "Fehler" in line]
+        self.results.setdefault(name, []).append(round(elapsed, 6))
+        self.errors[name] = self.errors.get(name, 0) + len(errors)
+        print(f"{name}: {elapsed:.3f}s" + (f" ({len(errors)} Fehler, z.B. {errors[0]})" if errors else ""), file=sys.stderr)
+        return result
+
+    def summary(self) -> dict:
+        return {
+            name: {"runs_s": runs, "median_s": float(np.median(runs)), "min_s": min(runs), "errors": self.errors[name]}
+            for name, runs in self.results.items()
+        }
+
+def run_benchmark(scale: dict, cycles: int = 2, latency: dict = None, verbose: bool = False, seed: int = 42) -> dict:
+    """
+    Befüllt die Benchmark-Datenbank mit synthetischen Daten und misst danach 'cycles' vollständige
+    Zyklen gegen die Fake-Clients. Zyklus 1 holt den Rückstand seit dem Seed auf, die weiteren
+    entsprechen dem eingeschwungenen Zustand.
+    """
+    latency = latency or {}
+    import collectors
+    import onchain_activity
+    import signal_engine
+    import sentiment
+    import transport
+    from analysis import analyze_signals
+    from db_setup import setup_database
+    from storage import close_pool
+
+    rng = np.random.default_rng(seed)
+    timer = StageTimer(verbose)
+    assets = [f"BENCH{i}/USDT" for i in range(scale["assets"])]
+    wallets = [f"0x{zlib.crc32(f'wallet{i}'.encode()):040x}" for i in range(scale["wallets"])]
+    now_ms = int(time.time() * 1000)
+
+    exchange = FakeExchange(latency.get("exchange", 0.0))
+    etherscan = FakeEtherscan(
+        {wallet: synthetic_wallet_transactions(wallet, scale["transactions_per_wallet"], now_ms // 1000, rng) for wallet in wallets},
+        latency.get("etherscan", 0.0)
+    )
+    openai_client = FakeOpenAIClient(latency.get("openai", 0.0))
+    scorer = sentiment.OpenAISentimentScorer()
+    scorer._client = openai_client
+
+    with contextlib.ExitStack() as stack:
+        for module in (collectors, signal_engine):
+            stack.enter_context(mock.patch.object(module, "ASSETS_TO_TRACK", assets))
+        for module in (collectors, onchain_activity):
+            stack.enter_context(mock.patch.object(module, "WALLETS_TO_MONITOR", wallets))
+        stack.enter_context(mock.patch.object(collectors, "get_exchange", lambda: exchange))
+        stack.enter_context(mock.patch.object(transport, "get_session", lambda: etherscan))
+        sentiment.set_scorer(scorer)
+
+        timer.run("setup_database", setup_database)
+        timer.run("reset_tables", reset_tables)
+        # Seed endet zwei Stunden in der Vergangenheit, Zyklus 1 holt diese Kerzen über den Fake-Exchange nach
+        seed_end_ms = now_ms - 2 * 3600 * 1000
+        timer.run("seed_market_data", seed_market_data, assets, scale["base_candles"], seed_end_ms)
+        timer.run("seed_resample", seed_resampled, assets)
+        timer.run("seed_signals", seed_signals, assets, scale["signals"], seed_end_ms, rng)
+        # Kennzahlen nur für die gemessenen Zyklen, nicht für Setup und Seed
+        metrics.reset()
+
+        for cycle in range(cycles):
+            headlines = [f"Synthetic headline {cycle}-{i} about {assets[i % len(assets)]}" for i in range(scale["headlines"])]
+            timer.run("collect_market_data", collectors.collect_market_data)
+            timer.run("collect_sentiment_data", collectors.collect_sentiment_data)
+            timer.run("collect_onchain_data", collectors.collect_onchain_data)
+            timer.run("score_headlines_uncached", sentiment.score_headlines, headlines)
+            timer.run("calculate_confidence_scores", signal_engine.calculate_confidence_scores, assets[0])
+            timer.run("calculate_confidence_scores_batch", signal_engine.calculate_confidence_scores_batch, assets)
+            timer.run("generate_signals", signal_engine.generate_signals)
+            timer.run("analyze_signals", analyze_signals)
+        cycle_metrics = metrics.snapshot()
+        close_pool()
+
+    return {
+        "git_commit": _git_commit(),
+        "started_at": datetime.fromtimestamp(now_ms / 1000, tz=timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "scale": scale,
+        "cycles": cycles,
+        "latency_s": latency,
+        "api_calls": {"exchange": exchange.calls, "etherscan": etherscan.calls, "openai": openai_client.calls},
+        "stages": timer.summary(),
+        "metrics": dict(cycle_metrics, cache_hit_rates=metrics.cache_hit_rates(cycle_metrics)),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-End-Benchmark mit synthetischen Daten und Offline-Clients.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--cycles", type=int, default=2, help="Anzahl gemessener Zyklen nach dem Seed")
+    parser.add_argument("--backend", choices=["postgres", "sqlite"], default=config.DB_BACKEND, help="Datenbank-Backend (siehe storage.py)")
+    parser.add_argument("--db-name", default=f"{config.DB_NAME}_bench", help="Eigene Datenbank, wird bei jedem Lauf geleert")
+    parser.add_argument("--sqlite-path", default=":memory:", help="Datenbank für --backend sqlite (Standard: nur im Speicher)")
+    parser.add_argument("--exchange-latency-ms", type=float, default=20)
+    parser.add_argument("--etherscan-latency-ms", type=float, default=50)
+    parser.add_argument("--openai-latency-ms", type=float, default=200)
+    parser.add_argument("--output", help="JSON zusätzlich in diese Datei schreiben")
+    parser.add_argument("--verbose", action="store_true", help="Ausgaben der Stufen nicht unterdrücken")
+    parser.add_argument("--imports-only", action="store_true", help="Nur die Import-Budgets prüfen (ohne Datenbank)")
+    args = parser.parse_args(argv)
+
+    import_times = check_import_budgets()
+    imports_ok = all(result["ok"] for result in import_times.values())
+    if args.imports_only:
+        print(json.dumps(import_times, indent=2))
+        return 0 if imports_ok else 1
+
+    # Muss vor dem ersten Import von storage gesetzt sein, dort werden Backend und Zugangsdaten gelesen
+    config.DB_BACKEND = args.backend
+    if args.backend == "sqlite":
+        if args.sqlite_path == config.SQLITE_PATH:
+            parser.error("Der Benchmark leert alle Tabellen und darf nicht auf der Produktionsdatenbank laufen.")
+        config.SQLITE_PATH = args.sqlite_path
+    else:
+        if args.db_name == config.DB_NAME:
+            parser.error("Der Benchmark leert alle Tabellen und darf nicht auf der Produktionsdatenbank laufen.")
+        ensure_database(args.db_name)
+        config.DB_NAME = args.db_name
+
+    results = run_benchmark(
+        SCALES[args.scale], args.cycles,
+        latency={
+            "exchange": args.exchange_latency_ms / 1000,
+            "etherscan": args.etherscan_latency_ms / 1000,
+            "openai": args.openai_latency_ms / 1000,
+        },
+        verbose=args.verbose
+    )
+    results["backend"] = args.backend
+    results["db_name"] = args.db_name if args.backend == "postgres" else args.sqlite_path
+    results["scale_name"] = args.scale
+    results["import_times"] = import_times
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output)
+    print(output)
+    return 0 if imports_ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from storage import cursor
+from timeframes import datetime_to_ms, ms_to_datetime
+from config import ASSETS_TO_TRACK, SIGNAL_TIMEFRAMES, CANDLE_CACHE_CAPACITY, CANDLE_CACHE_MAX_SERIES
+
+# Zeilen von CandleSeries.values: je eine zusammenhängende Zeile pro Spalte
+OHLCV_COLUMNS = ["open", "high", "low", "close", "volume"]
+CLOSE = OHLCV_COLUMNS.index("close")
+
+class CandleSeries:
+    """
+    Ringpuffer der letzten 'capacity' Kerzen eines (Asset, Timeframe): Zeitstempel (ms) als int64-Array,
+    OHLCV als (5, n)-Array mit einer zusammenhängenden Zeile pro Spalte.
+    Der Puffer ist doppelt so groß wie die Kapazität; erst wenn er voll ist, werden die jüngsten Kerzen
+    an den Anfang verschoben. Lesezugriffe sind damit immer einfache Slices, Anhängen bleibt amortisiert O(1).
+    complete bedeutet, dass die Reihe die gesamte Historie der Datenbank enthält.
+    """
+
+    def __init__(self, capacity: int, complete: bool = False):
+        self.capacity = capacity
+        self.complete = complete
+        self._timestamps = np.empty(2 * capacity, dtype=np.int64)
+        self._values = np.empty((len(OHLCV_COLUMNS), 2 * capacity), dtype=float)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def first_timestamp_ms(self):
+        return int(self._timestamps[self._start]) if len(self) else None
+
+    @property
+    def last_timestamp_ms(self):
+        return int(self._timestamps[self._end - 1]) if len(self) else None
+
+    def append(self, timestamps_ms, values) -> int:
+        """
+        Hängt chronologisch sortierte Kerzen an; Kerzen, die nicht neuer als die letzte sind, werden ignoriert.
+        values hat die Form (5, n) in der Reihenfolge OHLCV_COLUMNS. Gibt die Anzahl angehängter Kerzen zurück.
+        """
+        timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+        values = np.asarray(values, dtype=float).reshape(len(OHLCV_COLUMNS), -1)
+        if len(self):
+            newer = timestamps_ms > self._timestamps[self._end - 1]
+            timestamps_ms, values = timestamps_ms[newer], values[:, newer]
+        count = len(timestamps_ms)
+        if count == 0:
+            return 0
+        if count > self.capacity:
+            timestamps_ms, values = timestamps_ms[-self.capacity:], values[:, -self.capacity:]
+            self.complete = False
+        added = len(timestamps_ms)
+
+        if self._end + added > len(self._timestamps):
+            keep = min(len(self), self.capacity - added)
+            self._timestamps[:keep] = self._timestamps[self._end - keep:self._end]
+            self._values[:, :keep] = self._values[:, self._end - keep:self._end]
+            if keep < len(self):
+                self.complete = False
+            self._start, self._end = 0, keep
+
+        self._timestamps[self._end:self._end + added] = timestamps_ms
+        self._values[:, self._end:self._end + added] = values
+        self._end += added
+        if len(self) > self.capacity:
+            self._start = self._end - self.capacity
+            self.complete = False
+        return count
+
+    def covers(self, since_ms: int) -> bool:
+        """
+        True, wenn alle gespeicherten Kerzen nach since_ms in der Reihe liegen.
+        """
+        return self.complete or (len(self) > 0 and self.first_timestamp_ms <= since_ms)
+
+    def tail(self, count: int) -> tuple:
+        """
+        Kopie der letzten count Kerzen als (Zeitstempel in ms, OHLCV-Array).
+        """
+        start = max(self._start, self._end - count)
+        return self._timestamps[start:self._end].copy(), self._values[:, start:self._end].copy()
+
+    def since(self, since_ms: int) -> tuple:
+        """
+        Kopie aller Kerzen strikt nach since_ms als (Zeitstempel in ms, OHLCV-Array).
+        """
+        start = self._start + int(np.searchsorted(self._timestamps[self._start:self._end], since_ms, side="right"))
+        return self._timestamps[start:self._end].copy(), self._values[:, start:self._end].copy()
+
+def _rows_to_arrays(rows: list) -> tuple:
+    timestamps_ms = np.array([datetime_to_ms(row[0]) for row in rows], dtype=np.int64)
+    values = np.array([row[1:] for row in rows], dtype=float).reshape(-1, len(OHLCV_COLUMNS)).T
+    return timestamps_ms, values
+
+class CandleCache:
+    """
+    Prozessweiter Cache der jüngsten Kerzen pro (Asset, Timeframe), gemeinsam genutzt von
+    Signal-Engine und Analyse. Höchstens max_series Reihen mit je capacity Kerzen; die am längsten
+    nicht gelesene Reihe wird verdrängt und bei Bedarf neu aus 'market_data' geladen.
+    Collectors und Streaming hängen neu geschriebene Kerzen direkt an. sync() holt zusätzlich mit einer
+    Abfrage nach, was andere Prozesse seit der letzten Kerze einer Reihe geschrieben haben.
+    """
+
+    def __init__(self, capacity: int = CANDLE_CACHE_CAPACITY, max_series: int = CANDLE_CACHE_MAX_SERIES):
+        self.capacity = capacity
+        self.max_series = max_series
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _store(self, key: tuple, series: CandleSeries):
+        self._series[key] = series
+        self._series.move_to_end(key)
+        while len(self._series) > self.max_series:
+            self._series.popitem(last=False)
+
+    def _load(self, cur, assets: list, timeframe: str) -> dict:
+        """
+        Lädt die letzten capacity Kerzen der Assets in einer Abfrage (ROW_NUMBER pro Asset).
+        """
+        cur.execute(
+            """
+            SELECT asset, timestamp, open, high, low, close, volume FROM (
+                SELECT asset, timestamp, open, high, low, close, volume,
+                       ROW_NUMBER() OVER (PARTITION BY asset ORDER BY timestamp DESC) AS row_number
+                FROM market_data
+                WHERE asset = ANY(%s) AND timeframe = %s
+            ) recent
+            WHERE row_number <= %s
+            ORDER BY asset, timestamp ASC;
+            """,
+            (list(assets), timeframe, self.capacity)
+        )
+        rows_by_asset = {asset: [] for asset in assets}
+        for row in cur.fetchall():
+            rows_by_asset[row[0]].append(row[1:])
+        loaded = {}
+        for asset, rows in rows_by_asset.items():
+            series = CandleSeries(self.capacity, complete=len(rows) < self.capacity)
+            if rows:
+                series.append(*_rows_to_arrays(rows))
+            loaded[asset] = series
+        return loaded
+
+    def _refresh(self, cur, series_by_asset: dict, timeframe: str):
+        """
+        Hängt Kerzen an, die nach der jeweils letzten Kerze der Reihen gespeichert wurden (eine Abfrage ab der ältesten).
+        """
+        since_ms = min(series.last_timestamp_ms for series in series_by_asset.values())
+        cur.execute(
+            """
+            SELECT asset, timestamp, open, high, low, close, volume FROM market_data
+            WHERE asset = ANY(%s) AND timeframe = %s AND timestamp > %s
+            ORDER BY asset, timestamp ASC;
+            """,
+            (list(series_by_asset), timeframe, ms_to_datetime(since_ms))
+        )
+        rows_by_asset = {}
+        for row in cur.fetchall():
+            rows_by_asset.setdefault(row[0], []).append(row[1:])
+        with self._lock:
+            for asset, rows in rows_by_asset.items():
+                series_by_asset[asset].append(*_rows_to_arrays(rows))
+
+    def sync(self, cur, assets: list, timeframe: str) -> dict:
+        """
+        Liefert {asset: CandleSeries} auf dem Stand der Datenbank. Fehlende Reihen werden geladen,
+        vorhandene um neuere Kerzen ergänzt.
+        """
+        assets = list(dict.fromkeys(assets))
+        with self._lock:
+            cached = {}
+            for asset in assets:
+                series = self._series.get((asset, timeframe))
+                if series is not None and len(series):
+                    self._series.move_to_end((asset, timeframe))
+                    cached[asset] = series
+        missing = [asset for asset in assets if asset not in cached]
+        metrics.inc("cache_lookups_total", len(cached), cache="candles", result="hit")
+        metrics.inc("cache_lookups_total", len(missing), cache="candles", result="miss")
+
+        if cached:
+            self._refresh(cur, cached, timeframe)
+        result = dict(cached)
+        if missing:
+            loaded = self._load(cur, missing, timeframe)
+            with self._lock:
+                for asset, series in loaded.items():
+                    self._store((asset, timeframe), series)
+            result.update(loaded)
+        return {asset: result[asset] for asset in assets}
+
+    def append(self, asset: str, timeframe: str, timestamps_ms, values) -> int:
+        """
+        Hängt frisch geschriebene Kerzen an eine bereits gecachte Reihe an. Nicht gecachte Reihen
+        werden erst beim nächsten Lesen geladen, damit z.B. Basiskerzen keinen Platz belegen.
+        """
+        with self._lock:
+            series = self._series.get((asset, timeframe))
+            if series is None:
+                return 0
+            return series.append(timestamps_ms, values)
+
+    def recent(self, cur, assets: list, timeframe: str, count: int) -> dict:
+        """
+        Die letzten count Kerzen pro Asset als {asset: (Zeitstempel in ms, OHLCV-Array)}.
+        """
+        series_by_asset = self.sync(cur, assets, timeframe)
+        with self._lock:
+            return {asset: series.tail(count) for asset, series in series_by_asset.items()}
+
+    def since(self, cur, assets: list, timeframe: str, since_ms: int) -> tuple:
+        """
+        Alle Kerzen strikt nach since_ms pro Asset, soweit der Cache so weit zurückreicht.
+        Gibt ({asset: (Zeitstempel in ms, OHLCV-Array)}, Assets ohne ausreichende Historie im Cache) zurück.
+        """
+        series_by_asset = self.sync(cur, assets, timeframe)
+        candles = {}
+        uncovered = []
+        with self._lock:
+            for asset, series in series_by_asset.items():
+                if series.covers(since_ms):
+                    candles[asset] = series.since(since_ms)
+                else:
+                    uncovered.append(asset)
+        return candles, uncovered
+
+    def invalidate(self, asset: str = None):
+        """
+        Verwirft die Reihen eines Assets (oder alle), z.B. nach einer abgebrochenen Transaktion oder einem Backfill.
+        """
+        with self._lock:
+            for key in [key for key in self._series if asset is None or key[0] == asset]:
+                del self._series[key]
+
+_cache = CandleCache()
+
+def get_cache() -> CandleCache:
+    return _cache
+
+def recent_candles(cur, assets: list, timeframe: str, count: int) -> dict:
+    return _cache.recent(cur, assets, timeframe, count)
+
+def candles_since(cur, assets: list, timeframe: str, since_ms: int) -> tuple:
+    return _cache.since(cur, assets, timeframe, since_ms)
+
+def append_candles(asset: str, timeframe: str, timestamps_ms, values) -> int:
+    return _cache.append(asset, timeframe, timestamps_ms, values)
+
+def invalidate(asset: str = None):
+    _cache.invalidate(asset)
+
+def warm(assets: list = None, timeframes: list = None):
+    """
+    Lädt die Reihen aller Assets und Timeframes beim Start, eine Abfrage pro Timeframe.
+    """
+    assets = list(assets or ASSETS_TO_TRACK)
+    with cursor() as cur:
+        for timeframe in timeframes or SIGNAL_TIMEFRAMES:
+            _cache.sync(cur, assets, timeframe)
+    print(f"Kerzen-Cache geladen: {len(assets)} Assets in {list(timeframes or SIGNAL_TIMEFRAMES)}.")
+
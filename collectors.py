@@ -1,74 +1,314 @@
-import ccxt
-import psycopg2
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import datetime, timedelta, timezone
 import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from openai import OpenAI
 
-from config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, ASSETS_TO_TRACK, TIMEFRAME, OPENAI_API_KEY, ETHERSCAN_API_KEY, WALLETS_TO_MONITOR
+import metrics
+import candle_cache
+import transport
+from storage import DatabaseError, bulk_insert, connection, cursor, transaction
+from sentiment import score_headlines
+from onchain_activity import monitored_wallets, record_wallet_inflows
+from resampling import resample_ohlcv
+from timeframes import timeframe_to_ms, ms_to_datetime, datetime_to_ms
+from config import ASSETS_TO_TRACK, BASE_TIMEFRAME, RESAMPLED_TIMEFRAMES, ETHERSCAN_API_KEY, WALLETS_TO_MONITOR, ETHERSCAN_API_URL, ETHERSCAN_PAGE_SIZE, ETHERSCAN_MAX_PAGES_PER_CYCLE, OHLCV_PAGE_LIMIT, OHLCV_INITIAL_LOOKBACK_DAYS, COLLECTION_MAX_WORKERS, HTTP_TIMEOUT_SECONDS, EXCHANGE_HOST
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# ccxt-Instanzen sind nicht für parallelen Zugriff gedacht, daher ein Client pro Thread.
+# Die Clients teilen sich Session und Rate-Limit aus transport.py (ccxts eigenes Limit gilt nur pro Instanz).
+_thread_local = threading.local()
+# Langlebige Worker-Pools für _fan_out, einer pro Quelle: die Threads (und damit ihre ccxt-Clients samt
+# geladenen Märkten) bleiben über Zyklen hinweg erhalten, z.B. im Daemon-Modus. Getrennte Pools, damit
+# eine langsame Quelle (z.B. ein Backfill der Marktdaten) die Aufgaben der anderen nicht in der Warteschlange aufhält.
+_executors = {}
+_executors_lock = threading.Lock()
 
-def get_db_connection():
+def get_exchange():
     """
-    Stellt eine Verbindung zur PostgreSQL-Datenbank her.
+    Liefert den ccxt-Binance-Client des aktuellen Threads.
     """
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
+    exchange = getattr(_thread_local, "exchange", None)
+    if exchange is None:
+        import ccxt # erst beim ersten Börsenabruf, collect sentiment/onchain brauchen ccxt nicht
+        exchange = ccxt.binance({
+            "enableRateLimit": False,
+            "timeout": int(HTTP_TIMEOUT_SECONDS[1] * 1000),
+            "session": transport.get_session(),
+        })
+        _thread_local.exchange = exchange
+    return exchange
+
+def exchange_call(func, *args, **kwargs):
+    """
+    Ruft eine Methode des ccxt-Clients über den Token-Bucket von EXCHANGE_HOST auf, mit Backoff
+    bei Netzwerkfehlern und Drosselung durch die Börse.
+    """
+    import ccxt
+    return transport.call(
+        EXCHANGE_HOST, func, *args,
+        retry_exceptions=(ccxt.NetworkError,), rate_limit_exceptions=(ccxt.DDoSProtection,), **kwargs
     )
 
-def collect_market_data():
+def _get_executor(source: str) -> ThreadPoolExecutor:
+    with _executors_lock:
+        executor = _executors.get(source)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=COLLECTION_MAX_WORKERS, thread_name_prefix=f"fan-out-{source}")
+            _executors[source] = executor
+        return executor
+
+def _fan_out(source: str, func, items) -> list:
     """
-    Sammelt OHLCV-Daten von Binance für die in config.py definierten Assets
-    und speichert sie in der 'market_data'-Tabelle.
+    Führt func für alle Items im begrenzten Thread-Pool der Quelle source ("market", "onchain") aus und
+    liefert die Ergebnisse in Eingabereihenfolge. func fängt seine Fehler selbst ab, damit ein Item die
+    anderen nicht abbricht. func darf selbst kein _fan_out derselben Quelle aufrufen (deren Pool könnte
+    sich sonst selbst blockieren).
     """
-    exchange = ccxt.binance()
-    print(f"Sammle Marktdaten für Assets: {ASSETS_TO_TRACK} im Timeframe: {TIMEFRAME}")
+    items = list(items)
+    if not items:
+        return []
+    return list(_get_executor(source).map(func, items))
+
+MARKET_DATA_COLUMNS = ["timestamp", "asset", "timeframe", "open", "high", "low", "close", "volume"]
 
-    conn = None
+def get_market_watermark(cur, asset: str, timeframe: str):
+    """
+    Liefert den Zeitstempel der letzten gespeicherten Kerze für (asset, timeframe) oder None.
+    """
+    cur.execute(
+        """
+        SELECT MAX(timestamp) FROM market_data
+        WHERE asset = %s AND timeframe = %s;
+        """,
+        (asset, timeframe)
+    )
+    return cur.fetchone()[0]
+
+def resample_market_asset(cur, asset: str, timeframes: list = None, base_timeframe: str = BASE_TIMEFRAME, since_ms: int = None) -> dict:
+    """
+    Leitet die Kerzen der Ziel-Timeframes inkrementell aus den Basiskerzen eines Assets ab.
+    Pro Ziel-Timeframe wird ab dessen letzter gespeicherter Kerze fortgesetzt; die Basiskerzen werden
+    dafür nur einmal ab dem ältesten benötigten Zeitpunkt geladen. Ohne gespeicherte Zielkerzen (oder mit
+    since_ms, z.B. nach einem Backfill) beginnt die Ableitung beim ersten vollständigen Bucket ab diesem Punkt.
+    Gibt ({timeframe: neu geschriebene Kerzen}, {timeframe: (Zeitstempel in ms, OHLCV-Array)}) zurück. Die abgeleiteten
+    Kerzen kommen erst nach dem Commit des Aufrufers per cache_resampled in den Kerzen-Cache, damit nach einem
+    Rollback keine nie gespeicherten Kerzen bewertet werden.
+    """
+    base_ms = timeframe_to_ms(base_timeframe)
+    targets = [timeframe for timeframe in (timeframes or RESAMPLED_TIMEFRAMES) if timeframe != base_timeframe]
+    for timeframe in targets:
+        if timeframe_to_ms(timeframe) % base_ms:
+            raise ValueError(f"Timeframe {timeframe} ist kein Vielfaches von {base_timeframe}.")
+
+    since = {}
+    for timeframe in targets:
+        watermark = None if since_ms is not None else get_market_watermark(cur, asset, timeframe)
+        since[timeframe] = datetime_to_ms(watermark) + timeframe_to_ms(timeframe) if watermark else since_ms
+
+    load_since = None if None in since.values() else min(since.values(), default=None)
+    if load_since is None:
+        cur.execute(
+            """
+            SELECT timestamp, open, high, low, close, volume FROM market_data
+            WHERE asset = %s AND timeframe = %s
+            ORDER BY timestamp ASC;
+            """,
+            (asset, base_timeframe)
+        )
+    else:
+        cur.execute(
+            """
+            SELECT timestamp, open, high, low, close, volume FROM market_data
+            WHERE asset = %s AND timeframe = %s AND timestamp >= %s
+            ORDER BY timestamp ASC;
+            """,
+            (asset, base_timeframe, ms_to_datetime(load_since))
+        )
+    rows = cur.fetchall()
+    if not rows:
+        return {timeframe: 0 for timeframe in targets}, {}
+
+    timestamps_ms = np.array([datetime_to_ms(row[0]) for row in rows], dtype=np.int64)
+    values = np.array([row[1:] for row in rows], dtype=float)
+    horizon_ms = int(timestamps_ms[-1]) + base_ms
+
+    written = {}
+    derived = {}
+    for timeframe in targets:
+        target_ms = timeframe_to_ms(timeframe)
+        # Erst ab dem ersten Bucket, der vollständig in den geladenen Basiskerzen liegt
+        start_ms = since[timeframe] if since[timeframe] is not None else int(timestamps_ms[0])
+        start_ms = -(-start_ms // target_ms) * target_ms
+        first = np.searchsorted(timestamps_ms, start_ms, side="left")
+        buckets, opens, highs, lows, closes, volumes = resample_ohlcv(
+            timestamps_ms[first:], values[first:, 0], values[first:, 1], values[first:, 2],
+            values[first:, 3], values[first:, 4], target_ms, horizon_ms
+        )
+        candle_rows = [
+            (ms_to_datetime(int(bucket)), asset, timeframe, float(open_), float(high), float(low), float(close), float(volume))
+            for bucket, open_, high, low, close, volume in zip(buckets, opens, highs, lows, closes, volumes)
+        ]
+        written[timeframe] = bulk_insert(
+            cur, "market_data", MARKET_DATA_COLUMNS, candle_rows, conflict_columns=["timestamp", "asset", "timeframe"]
+        ).inserted
+        derived[timeframe] = (buckets, np.vstack((opens, highs, lows, closes, volumes)))
+    return written, derived
+
+def cache_resampled(asset: str, derived: dict):
+    """
+    Hängt die abgeleiteten Kerzen aus resample_market_asset nach dem Commit an den Kerzen-Cache an.
+    """
+    for timeframe, (timestamps_ms, values) in derived.items():
+        candle_cache.append_candles(asset, timeframe, timestamps_ms, values)
+
+def fetch_ohlcv_pages(exchange, symbol: str, timeframe: str, since_ms: int, until_ms: int = None):
+    """
+    Blättert ab since_ms seitenweise durch fetch_ohlcv, bis die Gegenwart (oder until_ms) erreicht ist.
+    Liefert pro Seite nur abgeschlossene Kerzen, damit keine halbfertige Kerze als Watermark gespeichert wird.
+    """
+    timeframe_ms = timeframe_to_ms(timeframe)
+    if since_ms + timeframe_ms > exchange.milliseconds():
+        return # Seit der letzten Kerze ist noch keine neue abgeschlossen
+    while True:
+        with metrics.timer("external_api_seconds", api="exchange"):
+            page = transport.coalesce(
+                ("fetch_ohlcv", symbol, timeframe, since_ms),
+                exchange_call, exchange.fetch_ohlcv, symbol, timeframe, since=since_ms, limit=OHLCV_PAGE_LIMIT
+            )
+        now_ms = exchange.milliseconds()
+        closed = [
+            candle for candle in page
+            if candle[0] + timeframe_ms <= now_ms and (until_ms is None or candle[0] < until_ms)
+        ]
+        if closed:
+            yield closed
+
+        if not page or page[-1][0] < since_ms:
+            break
+        next_since_ms = page[-1][0] + timeframe_ms
+        if next_since_ms + timeframe_ms > now_ms or (until_ms is not None and next_since_ms >= until_ms):
+            break
+        since_ms = next_since_ms
+
+def _store_ohlcv_pages(conn, exchange, asset: str, since_ms: int, until_ms: int = None) -> tuple:
+    """
+    Schreibt die Basiskerzen (BASE_TIMEFRAME) ab since_ms Seite für Seite in 'market_data'.
+    Jede Seite ist eine eigene Transaktion, der Speicherbedarf bleibt daher auf eine Seite begrenzt.
+    """
+    symbol = asset.replace('/', '') # ccxt uses 'BTCUSDT' instead of 'BTC/USDT'
+    inserted = 0
+    skipped = 0
+    for page in fetch_ohlcv_pages(exchange, symbol, BASE_TIMEFRAME, since_ms, until_ms):
+        rows = [
+            (
+                ms_to_datetime(candle[0]),
+                asset, BASE_TIMEFRAME,
+                candle[1], candle[2], candle[3], candle[4], candle[5]
+            )
+            for candle in page
+        ]
+        with transaction(conn) as cur:
+            result = bulk_insert(cur, "market_data", MARKET_DATA_COLUMNS, rows, conflict_columns=["timestamp", "asset", "timeframe"])
+        candle_cache.append_candles(
+            asset, BASE_TIMEFRAME, [candle[0] for candle in page], np.array([candle[1:6] for candle in page], dtype=float).T
+        )
+        inserted += result.inserted
+        skipped += result.skipped
+    return inserted, skipped
+
+def sync_market_asset(asset: str, until_ms: int = None) -> tuple:
+    """
+    Lädt die Basiskerzen eines Assets ab der letzten gespeicherten Kerze bis zur Gegenwart (oder until_ms,
+    exklusive) nach und leitet daraus die Kerzen der RESAMPLED_TIMEFRAMES ab. Fehler gehen an den Aufrufer.
+    Gibt (neu, übersprungen, {timeframe: abgeleitete Kerzen}) zurück.
+    """
+    exchange = get_exchange()
+    with connection() as conn:
+        with transaction(conn) as cur:
+            watermark = get_market_watermark(cur, asset, BASE_TIMEFRAME)
+        if watermark:
+            since_ms = datetime_to_ms(watermark) + timeframe_to_ms(BASE_TIMEFRAME)
+        else:
+            since_ms = exchange.milliseconds() - OHLCV_INITIAL_LOOKBACK_DAYS * 24 * 60 * 60 * 1000
+
+        inserted, skipped = 0, 0
+        if until_ms is None or since_ms < until_ms:
+            inserted, skipped = _store_ohlcv_pages(conn, exchange, asset, since_ms, until_ms)
+        with transaction(conn) as cur:
+            resampled, derived = resample_market_asset(cur, asset)
+        cache_resampled(asset, derived)
+    return inserted, skipped, resampled
+
+def _collect_market_asset(asset: str) -> int:
+    """
+    Sammelt die neuen Basiskerzen eines einzelnen Assets (eine Aufgabe im Thread-Pool)
+    und leitet daraus die Kerzen der RESAMPLED_TIMEFRAMES ab.
+    """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        inserted, skipped, resampled = sync_market_asset(asset)
+        print(f"Marktdaten für {asset} erfolgreich gesammelt und gespeichert: {inserted} neu, {skipped} übersprungen, abgeleitet: {resampled}.")
+        return inserted
+    except DatabaseError as e:
+        metrics.inc("errors_total", source="market")
+        print(f"Datenbankfehler beim Sammeln der Marktdaten für {asset}: {e}")
+    except Exception as e:
+        metrics.inc("errors_total", source="market")
+        print(f"Fehler beim Sammeln der Marktdaten für {asset}: {e}")
+    # Angehängte Kerzen einer zurückgerollten Transaktion dürfen nicht im Cache bleiben
+    candle_cache.invalidate(asset)
+    return 0
 
-        for asset in ASSETS_TO_TRACK:
-            symbol = asset.replace('/', '') # ccxt uses 'BTCUSDT' instead of 'BTC/USDT'
-            try:
-                ohlcv = exchange.fetch_ohlcv(symbol, TIMEFRAME)
-                for candle in ohlcv:
-                    timestamp = datetime.fromtimestamp(candle[0] / 1000) # Convert ms to s
-                    open_price = candle[1]
-                    high_price = candle[2]
-                    low_price = candle[3]
-                    close_price = candle[4]
-                    volume = candle[5]
-
-                    cur.execute(
-                        """
-                        INSERT INTO market_data (timestamp, asset, timeframe, open, high, low, close, volume)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (timestamp, asset, timeframe) DO NOTHING;
-                        """,
-                        (timestamp, asset, TIMEFRAME, open_price, high_price, low_price, close_price, volume)
-                    )
-                conn.commit()
-                print(f"Marktdaten für {asset} erfolgreich gesammelt und gespeichert.")
-            except Exception as e:
-                print(f"Fehler beim Sammeln der Marktdaten für {asset}: {e}")
-    except psycopg2.Error as e:
-        print(f"Datenbankfehler beim Sammeln der Marktdaten: {e}")
-    finally:
-        if conn:
-            conn.close()
+@metrics.timed("stage_seconds", stage="collect_market")
+def collect_market_data(assets: list = None):
+    """
+    Sammelt OHLCV-Daten von Binance für die angegebenen Assets (ohne Angabe ASSETS_TO_TRACK)
+    und speichert sie in der 'market_data'-Tabelle.
+    Von der Börse wird nur BASE_TIMEFRAME geladen, die übrigen Timeframes werden daraus abgeleitet.
+    Setzt pro Asset an der letzten gespeicherten Kerze an und blättert bis zur Gegenwart vor.
+    Die Assets werden parallel abgerufen (max. COLLECTION_MAX_WORKERS gleichzeitig).
+    """
+    assets = list(assets or ASSETS_TO_TRACK)
+    print(f"Sammle Marktdaten für {len(assets)} Assets im Timeframe: {BASE_TIMEFRAME} (abgeleitet: {RESAMPLED_TIMEFRAMES})")
+    return sum(_fan_out("market", _collect_market_asset, assets))
 
+def backfill_market_data(start: datetime, end: datetime = None, assets: list = None):
+    """
+    Lädt historische Kerzen im Zeitraum [start, end) nach, z.B. mehrere Monate für ein neues Asset.
+    Bereits gespeicherte Kerzen werden übersprungen, Lücken dazwischen werden aufgefüllt.
+    """
+    assets = assets or ASSETS_TO_TRACK
+    since_ms = datetime_to_ms(start)
+    until_ms = datetime_to_ms(end) if end else None
+    print(f"Starte Backfill der Marktdaten für {assets} ab {start} im Timeframe: {BASE_TIMEFRAME}")
+
+    def backfill_asset(asset):
+        try:
+            with connection() as conn:
+                inserted, skipped = _store_ohlcv_pages(conn, get_exchange(), asset, since_ms, until_ms)
+                with transaction(conn) as cur:
+                    resample_market_asset(cur, asset, since_ms=since_ms)
+            # Nachgeladene ältere Kerzen fehlen im Cache, er lädt die Reihen beim nächsten Lesen neu
+            candle_cache.invalidate(asset)
+            print(f"Backfill für {asset} abgeschlossen: {inserted} neu, {skipped} übersprungen.")
+            return inserted
+        except DatabaseError as e:
+            metrics.inc("errors_total", source="market")
+            print(f"Datenbankfehler beim Backfill der Marktdaten für {asset}: {e}")
+        except Exception as e:
+            metrics.inc("errors_total", source="market")
+            print(f"Fehler beim Backfill der Marktdaten für {asset}: {e}")
+        return 0
+
+    return sum(_fan_out("market", backfill_asset, assets))
+
+@metrics.timed("stage_seconds", stage="collect_sentiment")
 def collect_sentiment_data():
     """
-    Sammelt Sentiment-Daten aus Nachrichten (simuliert) und analysiert diese mit OpenAI.
+    Sammelt Sentiment-Daten aus Nachrichten (simuliert) und bewertet sie über sentiment.score_headlines.
     Speichert die Ergebnisse in der 'sentiment_data'-Tabelle.
+    Bereits bewertete Headlines kommen aus dem Cache, neue werden gebündelt bewertet.
     """
     # Simulierte Nachrichten-Headlines
     news_headlines = [
@@ -79,92 +319,197 @@ def collect_sentiment_data():
         "Großinvestoren zeigen Interesse an DeFi-Projekten"
     ]
 
-    conn = None
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+    scores = score_headlines(news_headlines)
+    now = datetime.utcnow()
+    rows = [
+        (now, "Simulated News API", headline, score)
+        for headline, score in zip(news_headlines, scores)
+        if score is not None
+    ]
 
-        for headline in news_headlines:
-            try:
-                # Use OpenAI to get sentiment score
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a sentiment analysis bot. Analyze the sentiment of the given headline and return a score between -1 (very negative) and 1 (very positive). Only return the score as a float."},
-                        {"role": "user", "content": f"Analyze the sentiment of this headline: '{headline}'"}
-                    ],
-                    temperature=0.0
-                )
-                sentiment_score_str = response.choices[0].message.content.strip()
-                sentiment_score = float(sentiment_score_str)
-
-                cur.execute(
-                    """
-                    INSERT INTO sentiment_data (timestamp_utc, source, headline, sentiment_score)
-                    VALUES (%s, %s, %s, %s);
-                    """,
-                    (datetime.utcnow(), "Simulated News API", headline, sentiment_score)
-                )
-                conn.commit()
-                print(f"Sentiment für '{headline}' erfolgreich gesammelt und gespeichert: {sentiment_score}")
-            except Exception as e:
-                print(f"Fehler beim Sammeln der Sentiment-Daten für '{headline}': {e}")
-    except psycopg2.Error as e:
+    try:
+        with cursor() as cur:
+            result = bulk_insert(cur, "sentiment_data", ["timestamp_utc", "source", "headline", "sentiment_score"], rows)
+        print(f"Sentiment-Daten gespeichert: {result.inserted} Headlines.")
+        return result.inserted
+    except DatabaseError as e:
+        metrics.inc("errors_total", source="sentiment")
         print(f"Datenbankfehler beim Sammeln der Sentiment-Daten: {e}")
-    finally:
-        if conn:
-            conn.close()
+        return 0
+
+ONCHAIN_COLUMNS = ["tx_hash", "timestamp_utc", "wallet_monitored", "from_address", "to_address", "value_eth"]
+
+def get_wallet_checkpoint(cur, wallet_address: str):
+    """
+    Liefert den zuletzt synchronisierten Block einer Wallet oder None, falls sie noch nie synchronisiert wurde.
+    """
+    cur.execute(
+        "SELECT last_block FROM onchain_sync_state WHERE wallet_address = %s;",
+        (wallet_address,)
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def save_wallet_checkpoint(cur, wallet_address: str, last_block: int):
+    """
+    Speichert den Sync-Stand einer Wallet. Ein Backfill setzt den Stand nie zurück.
+    """
+    cur.execute(
+        """
+        INSERT INTO onchain_sync_state (wallet_address, last_block, updated_at)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (wallet_address) DO UPDATE
+        SET last_block = EXCLUDED.last_block, updated_at = EXCLUDED.updated_at
+        WHERE onchain_sync_state.last_block < EXCLUDED.last_block;
+        """,
+        (wallet_address, last_block, datetime.now(timezone.utc))
+    )
+
+def _etherscan_rate_limited(response) -> bool:
+    """
+    Etherscan meldet Drosselung mit HTTP 200 und {"status": "0", "result": "Max rate limit reached"}.
+    Nur kurze Antworten werden geprüft, volle Seiten also nicht doppelt geparst.
+    """
+    if response.status_code != 200 or len(response.content) > 1024:
+        return False
+    try:
+        payload = response.json()
+    except ValueError:
+        return False
+    return payload.get("status") == "0" and "rate limit" in str(payload.get("result", "")).lower()
+
+def fetch_wallet_transaction_pages(wallet_address: str, start_block: int, max_pages: int = None):
+    """
+    Blättert ab start_block (inklusive) aufsteigend durch die Transaktionen einer Wallet.
+    Etherscan liefert pro Abfragefenster höchstens 10.000 Ergebnisse, daher wird das Fenster
+    nach jeder vollen Seite an den letzten Block verschoben, statt die Seitennummer zu erhöhen.
+    """
+    page_number = 1
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        with metrics.timer("external_api_seconds", api="etherscan"):
+            response = transport.get(ETHERSCAN_API_URL, retry_on=_etherscan_rate_limited, params={
+                "module": "account",
+                "action": "txlist",
+                "address": wallet_address,
+                "startblock": start_block,
+                "endblock": 99999999,
+                "page": page_number,
+                "offset": ETHERSCAN_PAGE_SIZE,
+                "sort": "asc",
+                "apikey": ETHERSCAN_API_KEY,
+            })
+        response.raise_for_status() # Raise an exception for HTTP errors
+        payload = response.json()
+        transactions = payload["result"]
+        if payload.get("status") != "1":
+            if isinstance(transactions, list): # "No transactions found"
+                return
+            raise RuntimeError(f"Etherscan-Fehler: {payload.get('message')} ({transactions})")
+
+        pages += 1
+        yield transactions
+        if len(transactions) < ETHERSCAN_PAGE_SIZE:
+            return
+
+        last_block = int(transactions[-1]["blockNumber"])
+        if last_block > start_block:
+            # Der letzte Block kann auf der nächsten Seite weitergehen; Duplikate überspringt ON CONFLICT
+            start_block = last_block
+            page_number = 1
+        else:
+            # Eine volle Seite innerhalb eines einzigen Blocks: im selben Fenster weiterblättern
+            page_number += 1
+
+def _sync_wallet(wallet_address: str, start_block: int = None, max_pages: int = ETHERSCAN_MAX_PAGES_PER_CYCLE) -> int:
+    """
+    Synchronisiert die Transaktionen einer einzelnen Wallet ab ihrem Checkpoint (eine Aufgabe im Thread-Pool).
+    Jede Seite wird zusammen mit dem neuen Checkpoint und den Zuflüssen im Stunden-Aggregat
+    (onchain_wallet_activity_hourly) in einer Transaktion geschrieben.
+    """
+    inserted = 0
+    skipped = 0
+    wallets = monitored_wallets(wallet_address)
+    try:
+        with connection() as conn:
+            if start_block is None:
+                with transaction(conn) as cur:
+                    start_block = get_wallet_checkpoint(cur, wallet_address) or 0
 
+            for transactions in fetch_wallet_transaction_pages(wallet_address, start_block, max_pages):
+                rows = [
+                    (
+                        tx["hash"],
+                        datetime.fromtimestamp(int(tx["timeStamp"]), tz=timezone.utc),
+                        wallet_address,
+                        tx["from"],
+                        tx["to"],
+                        float(int(tx["value"]) / (10**18)) # Convert Wei to Eth
+                    )
+                    for tx in transactions
+                ]
+                with transaction(conn) as cur:
+                    result = bulk_insert(
+                        cur, "onchain_transactions", ONCHAIN_COLUMNS, rows, conflict_columns=["tx_hash"],
+                        returning=["to_address", "timestamp_utc", "value_eth"]
+                    )
+                    # Nur tatsächlich neue Transaktionen fließen ins Stunden-Aggregat
+                    record_wallet_inflows(cur, result.returned, wallets)
+                    save_wallet_checkpoint(cur, wallet_address, max(int(tx["blockNumber"]) for tx in transactions))
+                inserted += result.inserted
+                skipped += result.skipped
+        print(f"On-Chain-Daten für Wallet {wallet_address} erfolgreich gesammelt und gespeichert: {inserted} neu, {skipped} übersprungen.")
+    except requests.exceptions.RequestException as e:
+        metrics.inc("errors_total", source="onchain")
+        print(f"Fehler bei der Etherscan-API-Anfrage für Wallet {wallet_address}: {e}")
+    except json.JSONDecodeError:
+        metrics.inc("errors_total", source="onchain")
+        print(f"Fehler beim Parsen der JSON-Antwort von Etherscan für Wallet {wallet_address}.")
+    except DatabaseError as e:
+        metrics.inc("errors_total", source="onchain")
+        print(f"Datenbankfehler beim Sammeln der On-Chain-Daten für Wallet {wallet_address}: {e}")
+    except Exception as e:
+        metrics.inc("errors_total", source="onchain")
+        print(f"Allgemeiner Fehler beim Sammeln der On-Chain-Daten für Wallet {wallet_address}: {e}")
+    return inserted
+
+@metrics.timed("stage_seconds", stage="collect_onchain")
 def collect_onchain_data():
     """
     Sammelt On-Chain-Transaktionen von Etherscan für die in config.py definierten Wallets
     und speichert sie in der 'onchain_transactions'-Tabelle.
+    Pro Wallet werden nur Blöcke ab dem letzten Checkpoint abgefragt, höchstens
+    ETHERSCAN_MAX_PAGES_PER_CYCLE Seiten pro Zyklus. Die Wallets werden parallel abgerufen.
     """
     print(f"Sammle On-Chain-Daten für Wallets: {WALLETS_TO_MONITOR}")
+    wallets = [wallet for wallet in WALLETS_TO_MONITOR if wallet != "0x..."] # Skip placeholder wallets
+    return sum(_fan_out("onchain", _sync_wallet, wallets))
 
-    conn = None
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        for wallet_address in WALLETS_TO_MONITOR:
-            if wallet_address == "0x...": # Skip placeholder wallets
-                continue
+def backfill_onchain_data(from_block: int = None, wallets: list = None) -> int:
+    """
+    Holt On-Chain-Transaktionen ohne Seitenlimit nach, bis die Wallets aktuell sind.
+    Ohne from_block wird ab dem jeweiligen Checkpoint aufgeholt, mit from_block=0 die gesamte Historie neu geladen.
+    """
+    wallets = [wallet for wallet in (wallets or WALLETS_TO_MONITOR) if wallet != "0x..."]
+    print(f"Starte Backfill der On-Chain-Daten für Wallets: {wallets}")
+    return sum(_fan_out("onchain", lambda wallet: _sync_wallet(wallet, from_block, max_pages=None), wallets))
 
-            etherscan_url = f"https://api.etherscan.io/api?module=account&action=txlist&address={wallet_address}&startblock=0&endblock=99999999&sort=asc&apikey={ETHERSCAN_API_KEY}"
+def collect_all(assets: list = None, market_collector=None):
+    """
+    Startet Markt-, Sentiment- und On-Chain-Sammlung gleichzeitig, damit eine langsame Quelle
+    die anderen nicht aufhält. Die Zykluszeit entspricht der langsamsten Quelle statt der Summe.
+    market_collector ersetzt collect_market_data, z.B. durch die Sammlung in Shards (siehe sharding.py).
+    """
+    market_collector = market_collector or collect_market_data
+    sources = [market_collector, collect_sentiment_data, collect_onchain_data]
+    with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="collect") as executor:
+        futures = [executor.submit(market_collector, assets), executor.submit(collect_sentiment_data), executor.submit(collect_onchain_data)]
+        for source, future in zip(sources, futures):
             try:
-                response = requests.get(etherscan_url)
-                response.raise_for_status() # Raise an exception for HTTP errors
-                transactions = response.json()["result"]
-
-                for tx in transactions:
-                    tx_hash = tx["hash"]
-                    timestamp_utc = datetime.fromtimestamp(int(tx["timeStamp"]))
-                    from_address = tx["from"]
-                    to_address = tx["to"]
-                    value_eth = float(int(tx["value"]) / (10**18)) # Convert Wei to Eth
-
-                    cur.execute(
-                        """
-                        INSERT INTO onchain_transactions (tx_hash, timestamp_utc, wallet_monitored, from_address, to_address, value_eth)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (tx_hash) DO NOTHING;
-                        """,
-                        (tx_hash, timestamp_utc, wallet_address, from_address, to_address, value_eth)
-                    )
-                conn.commit()
-                print(f"On-Chain-Daten für Wallet {wallet_address} erfolgreich gesammelt und gespeichert.")
-            except requests.exceptions.RequestException as e:
-                print(f"Fehler bei der Etherscan-API-Anfrage für Wallet {wallet_address}: {e}")
-            except json.JSONDecodeError:
-                print(f"Fehler beim Parsen der JSON-Antwort von Etherscan für Wallet {wallet_address}.")
+                future.result()
             except Exception as e:
-                print(f"Allgemeiner Fehler beim Sammeln der On-Chain-Daten für Wallet {wallet_address}: {e}")
-    except psycopg2.Error as e:
-        print(f"Datenbankfehler beim Sammeln der On-Chain-Daten: {e}")
-    finally:
-        if conn:
-            conn.close()
+                metrics.inc("errors_total", source=source.__name__)
+                print(f"Fehler in {source.__name__}: {e}")
 
 if __name__ == "__main__":
     # Example usage (will require valid API keys and DB setup)
@@ -1,6 +1,10 @@
 # config.py
 
-# Datenbank-Zugangsdaten
+# Datenbank (siehe storage.py): "postgres" (Server, Zugangsdaten unten) oder "sqlite" (eingebettet, ohne Server)
+DB_BACKEND = "postgres"
+SQLITE_PATH = "signalengine.db" # Datei für DB_BACKEND = "sqlite"; ":memory:" = nur im Speicher (nicht mit SHARD_COUNT > 1)
+
+# Datenbank-Zugangsdaten (PostgreSQL)
 DB_HOST = "localhost"
 DB_NAME = "dein_db_name"
 DB_USER = "dein_user"
@@ -12,10 +16,112 @@ ETHERSCAN_API_KEY = "YOUR_ETHERSCAN_API_KEY_HERE"
 
 # Strategie-Parameter
 ASSETS_TO_TRACK = ['BTC/USDT', 'ETH/USDT']
-TIMEFRAME = '1h'
+TIMEFRAME = '1h' # Primärer Timeframe (Daemon-Takt, Backtest)
+BASE_TIMEFRAME = '1m' # Feinste Auflösung, die von der Börse geladen wird
+RESAMPLED_TIMEFRAMES = ['5m', '15m', '1h', '4h', '1d'] # Werden lokal aus BASE_TIMEFRAME abgeleitet
+SIGNAL_TIMEFRAMES = [TIMEFRAME] # Timeframes, für die Signale bewertet werden, z.B. ['1h', '4h']
+RSI_PERIOD = 14
+RSI_OVERSOLD = 30 # Unterhalb: starkes Kaufsignal
+RSI_OVERBOUGHT = 70 # Oberhalb: starkes Verkaufssignal
+CONFIDENCE_WEIGHTS = {"tech": 0.4, "sentiment": 0.3, "onchain": 0.3}
+# Gewichte der Indikatoren in der technischen Konfidenz (siehe signal_engine.technical_confidence):
+# "rsi", "macd" (Histogramm relativ zur ATR), "bollinger" (Lage im Band), "volume" (Volumen-z-Score in Kursrichtung)
+INDICATOR_WEIGHTS = {"rsi": 1.0, "macd": 0.0, "bollinger": 0.0, "volume": 0.0}
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+BOLLINGER_PERIOD = 20
+BOLLINGER_STD = 2.0
+ATR_PERIOD = 14
+VOLUME_ZSCORE_PERIOD = 20
+SIGNAL_THRESHOLD = 0.75 # BUY, wenn die Gesamtkonfidenz darüber liegt
+TAKE_PROFIT_PCT = 0.05
+STOP_LOSS_PCT = 0.025
+SCORING_CANDLE_WINDOW = 100 # Letzte Kerzen pro Asset, die die Score-Berechnung aus dem Kerzen-Cache liest
 WALLETS_TO_MONITOR = [
     "0x...", # Placeholder Wallet 1
     "0x..."  # Placeholder Wallet 2
 ]
 
+# Asset-Universum (siehe universe.py)
+UNIVERSE_MODE = "static" # "static" = nur ASSETS_TO_TRACK, "discover" = alle passenden Spot-Märkte der Börse (ASSETS_TO_TRACK bleiben enthalten)
+UNIVERSE_QUOTE = "USDT" # Nur Märkte mit dieser Quote-Währung
+UNIVERSE_MIN_QUOTE_VOLUME = 5_000_000 # Mindestvolumen der letzten 24h in der Quote-Währung
+UNIVERSE_MAX_SPREAD_PCT = 0.5 # Max. Abstand zwischen Bid und Ask in Prozent (None = nicht prüfen)
+UNIVERSE_MAX_ASSETS = 300 # Die volumenstärksten Märkte bis zu dieser Anzahl
+UNIVERSE_EXCLUDED_BASES = ["USDC", "FDUSD", "TUSD", "BUSD", "USDP", "DAI", "EUR", "AEUR"] # Stablecoins u.ä. ohne eigene Kursbewegung
+UNIVERSE_CACHE_FILE = "universe.json" # Zuletzt ermitteltes Universum, wird auch bei Fehlern der Börse weiterverwendet
+UNIVERSE_CACHE_TTL_HOURS = 24
+
+# Sharding (siehe sharding.py): Marktdaten-Sammlung und Signal-Bewertung in SHARD_COUNT Worker-Prozessen.
+# Jeder Worker hat eigene Datenbankverbindungen (bis DB_POOL_MAX_CONNECTIONS) und einen eigenen Kerzen-Cache,
+# ein Asset bleibt über Zyklen hinweg im selben Worker. 1 = alles im Hauptprozess.
+SHARD_COUNT = 1
+
+# Marktdaten-Sammlung
+OHLCV_PAGE_LIMIT = 1000 # Max. Kerzen pro fetch_ohlcv-Aufruf (Binance-Limit)
+OHLCV_INITIAL_LOOKBACK_DAYS = 30 # Startpunkt, wenn für ein Asset noch keine Kerzen gespeichert sind
+
+# On-Chain-Sammlung (Etherscan)
+ETHERSCAN_API_URL = "https://api.etherscan.io/api"
+ETHERSCAN_PAGE_SIZE = 1000 # Transaktionen pro Seite (Etherscan liefert max. 10.000 pro Abfragefenster)
+ETHERSCAN_MAX_PAGES_PER_CYCLE = 10 # Begrenzt das Nachholen pro Zyklus, der Rest folgt im nächsten Zyklus
+
+# Sentiment-Scoring (siehe sentiment.py)
+SENTIMENT_SCORER = "openai" # "openai", "lexicon" (lokal, offline) oder "static" (Tests)
+SENTIMENT_MODEL = "gpt-3.5-turbo"
+SENTIMENT_BATCH_SIZE = 20 # Headlines pro OpenAI-Anfrage
+SENTIMENT_LRU_SIZE = 10000 # Einträge im In-Process-Cache vor der Tabelle 'sentiment_cache'
+
+# Parallele Datensammlung: max. gleichzeitige Abrufe pro Quelle (Assets, Wallets, Headlines)
+COLLECTION_MAX_WORKERS = 8
+
+# HTTP-Transport für Etherscan und Börse (siehe transport.py)
+HTTP_TIMEOUT_SECONDS = (5, 30) # (Verbindungsaufbau, Antwort)
+HTTP_MAX_RETRIES = 4 # Wiederholungen bei 429, 5xx und Netzwerkfehlern
+HTTP_BACKOFF_BASE_SECONDS = 0.5 # Wartezeit vor der n-ten Wiederholung: zufällig zwischen 0 und base * 2^n
+HTTP_BACKOFF_MAX_SECONDS = 30
+# Token-Bucket pro Host: (Anfragen pro Sekunde, Burst). Gilt pro Prozess, mit Sharding also pro Worker.
+HTTP_RATE_LIMITS = {
+    "api.etherscan.io": (5, 5), # Etherscan: 5 Aufrufe/s mit kostenlosem API-Key
+    "api.binance.com": (20, 40), # Binance: 6000 Gewicht/min, fetch_ohlcv kostet 2
+}
+EXCHANGE_HOST = "api.binance.com" # Host, über dessen Token-Bucket die ccxt-Aufrufe laufen
+
+# Connection-Pool (prozessweit, siehe storage.py; mit Sharding pro Worker-Prozess)
+DB_POOL_MIN_CONNECTIONS = 1
+DB_POOL_MAX_CONNECTIONS = 10
+
+# TimescaleDB (siehe db_setup.py): "auto" = aktivieren, falls die Extension verfügbar ist, "on" = erforderlich, "off" = nie
+TIMESCALEDB_MODE = "auto"
+TIMESCALEDB_CHUNK_INTERVAL = "7 days"
+TIMESCALEDB_COMPRESS_AFTER = "7 days" # Chunks älter als das werden komprimiert (None = keine Kompression)
+TIMESCALEDB_RETENTION = None # z.B. "2 years"; None = Kerzen unbegrenzt aufbewahren
+
+# On-Chain-Konfidenz (siehe signal_engine.onchain_confidence_from_activity)
+ONCHAIN_MAX_CONFIDENCE = 0.8 # Konfidenz bei starken Zuflüssen
+ONCHAIN_FULL_CONFIDENCE_ETH = 100.0 # 24h-Zuflussvolumen in ETH, ab dem die volle Konfidenz gilt (None = feste Stufe ab einem Kauf)
+
+# Daemon-Modus (python main.py daemon, siehe scheduler.py)
+SCHEDULER_CLOSE_DELAY_SECONDS = 10 # Wartezeit nach Kerzenschluss, bis die Börse die Kerze sicher abgeschlossen hat
+
+# Streaming-Modus (python streaming.py, siehe streaming.py)
+STREAM_FEED = "ccxtpro" # "ccxtpro" (Live-Trades per WebSocket) oder "replay" (Trades aus STREAM_REPLAY_FILE)
+STREAM_REPLAY_FILE = "trades.csv" # CSV mit den Spalten asset,timestamp,price,amount (timestamp in ms)
+STREAM_CLOSE_GRACE_MS = 250 # Live: so lange nach Kerzenende noch auf verspätete Trades warten
+STREAM_TICK_SECONDS = 0.1 # Prüfintervall für Kerzenschlüsse ohne neue Trades
+
+# Metriken (siehe metrics.py)
+METRICS_JSON_PATH = None # z.B. "metrics.json": Kennzahlen jedes Zyklus dorthin schreiben (None = aus)
+METRICS_HTTP_PORT = None # z.B. 9108: /metrics im Prometheus-Textformat bereitstellen (None = aus)
+
+# Kerzen-Cache im Speicher (siehe candle_cache.py), gemeinsam für Signal-Engine und Analyse
+CANDLE_CACHE_CAPACITY = 5000 # Kerzen pro (Asset, Timeframe); ältere Kerzen liest die Analyse direkt aus der Datenbank
+CANDLE_CACHE_MAX_SERIES = 64 # Höchstzahl gecachter (Asset, Timeframe)-Reihen pro Prozess, die am längsten ungenutzte wird verdrängt (Assets pro Shard x SIGNAL_TIMEFRAMES)
+
+# Spaltenarchiv (siehe archive.py, benötigt pyarrow): abgeschlossene Monate als Parquet und Arrow-IPC
+ARCHIVE_DIR = "archive"
+ARCHIVE_PARQUET_COMPRESSION = "zstd"
 
+# Signal-Outcomes (siehe signal_outcomes.py): Periode der fortgeschriebenen Performance-Aggregate (nach Exit-Zeit)
+PERFORMANCE_PERIOD = "1d"
@@ -1,5 +1,9 @@
-import psycopg2
-from config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD
+from datetime import datetime, timezone
+
+from storage import BACKEND, DatabaseError, connection, transaction
+from onchain_activity import SQL_ACTIVITY_TABLE, rebuild_wallet_activity
+from signal_outcomes import SQL_OUTCOME_TABLES
+from config import TIMEFRAME, TIMESCALEDB_MODE, TIMESCALEDB_CHUNK_INTERVAL, TIMESCALEDB_COMPRESS_AFTER, TIMESCALEDB_RETENTION
 
 SQL_SCHEMA = """
 -- Tabelle für Kerzen-Daten (OHLCV)
@@ -14,7 +18,20 @@ CREATE TABLE IF NOT EXISTS market_data (
     volume      DOUBLE PRECISION  NOT NULL,
     PRIMARY KEY (timestamp, asset, timeframe)
 );
--- SELECT create_hypertable('market_data', 'timestamp'); -- This requires TimescaleDB extension, which might not be available by default. User needs to enable it.
+
+-- Persistierter Zustand des inkrementellen RSI (Wilder-Glättung) pro Asset und Timeframe
+CREATE TABLE IF NOT EXISTS rsi_state (
+    asset           TEXT              NOT NULL,
+    timeframe       TEXT              NOT NULL,
+    period          INTEGER           NOT NULL,
+    last_timestamp  TIMESTAMPTZ,
+    last_close      DOUBLE PRECISION,
+    avg_gain        DOUBLE PRECISION  NOT NULL,
+    avg_loss        DOUBLE PRECISION  NOT NULL,
+    samples         BIGINT            NOT NULL, -- Anzahl verarbeiteter Kursänderungen
+    updated_at      TIMESTAMPTZ       NOT NULL,
+    PRIMARY KEY (asset, timeframe, period)
+);
 
 -- Tabelle für Sentiment-Daten
 CREATE TABLE IF NOT EXISTS sentiment_data (
@@ -25,6 +42,16 @@ CREATE TABLE IF NOT EXISTS sentiment_data (
     sentiment_score NUMERIC(3, 2)     NOT NULL
 );
 
+-- Cache für bereits bewertete Headlines (Schlüssel: Inhalts-Hash und Scorer)
+CREATE TABLE IF NOT EXISTS sentiment_cache (
+    content_hash    TEXT              NOT NULL,
+    scorer          TEXT              NOT NULL,
+    headline        TEXT              NOT NULL,
+    sentiment_score NUMERIC(3, 2)     NOT NULL,
+    created_at      TIMESTAMPTZ       NOT NULL,
+    PRIMARY KEY (content_hash, scorer)
+);
+
 -- Tabelle für On-Chain-Transaktionen
 CREATE TABLE IF NOT EXISTS onchain_transactions (
     tx_hash         TEXT              PRIMARY KEY,
@@ -35,6 +62,13 @@ CREATE TABLE IF NOT EXISTS onchain_transactions (
     value_eth       NUMERIC           NOT NULL
 );
 
+-- Sync-Stand pro überwachter Wallet: letzter bereits synchronisierter Block
+CREATE TABLE IF NOT EXISTS onchain_sync_state (
+    wallet_address  TEXT              PRIMARY KEY,
+    last_block      BIGINT            NOT NULL,
+    updated_at      TIMESTAMPTZ       NOT NULL
+);
+
 -- NEU: Tabelle für generierte Handelssignale
 CREATE TABLE IF NOT EXISTS generated_signals (
     signal_id           BIGSERIAL         PRIMARY KEY,
@@ -52,32 +86,167 @@ CREATE TABLE IF NOT EXISTS generated_signals (
 );
 """
 
+# Indizes für die häufigen Abfragen (Zeitfenster, Wallet-Filter, letzte Kerzen pro Asset)
+SQL_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_market_data_asset_timeframe_ts ON market_data (asset, timeframe, timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_sentiment_data_ts ON sentiment_data (timestamp_utc);
+CREATE INDEX IF NOT EXISTS idx_onchain_tx_ts ON onchain_transactions (timestamp_utc);
+CREATE INDEX IF NOT EXISTS idx_onchain_tx_to_address_ts ON onchain_transactions (to_address, timestamp_utc);
+CREATE INDEX IF NOT EXISTS idx_onchain_tx_wallet ON onchain_transactions (wallet_monitored);
+CREATE INDEX IF NOT EXISTS idx_generated_signals_ts ON generated_signals (timestamp_utc);
+CREATE INDEX IF NOT EXISTS idx_generated_signals_asset_ts ON generated_signals (asset, timestamp_utc);
+"""
+
+def _create_wallet_activity(cur):
+    cur.execute(SQL_ACTIVITY_TABLE)
+    rebuild_wallet_activity(cur)
+
+def _add_signal_timeframe(cur):
+    # Bisherige Signale wurden alle auf dem damals einzigen Timeframe erzeugt
+    cur.execute("ALTER TABLE generated_signals ADD COLUMN timeframe TEXT;")
+    cur.execute("UPDATE generated_signals SET timeframe = %s WHERE timeframe IS NULL;", (TIMEFRAME,))
+
+# Versionierte Migrationen: (Version, Beschreibung, SQL oder Funktion(cur)). Neue Schemaänderungen werden
+# nur angehängt, bestehende Einträge nie verändert. Jede Migration läuft genau einmal und in einer Transaktion.
+MIGRATIONS = [
+    (1, "Basisschema", SQL_SCHEMA),
+    (2, "Indizes für Zeitfenster-, Wallet- und Asset-Abfragen", SQL_INDEXES),
+    (3, "Stündliches On-Chain-Aggregat pro Wallet (aus vorhandenen Transaktionen befüllt)", _create_wallet_activity),
+    (4, "Timeframe pro generiertem Signal", _add_signal_timeframe),
+    (5, "Persistierte Signal-Outcomes und Performance-Aggregate", SQL_OUTCOME_TABLES),
+]
+
+SQL_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version         INTEGER           PRIMARY KEY,
+    description     TEXT              NOT NULL,
+    applied_at      TIMESTAMPTZ       NOT NULL
+);
+"""
+
+# Beliebige, aber feste Kennung für pg_advisory_xact_lock, damit parallel startende Prozesse
+# die Migrationen nicht gleichzeitig ausführen
+MIGRATION_LOCK_ID = 4711001
+
+def lock_migrations(cur):
+    """
+    Sperrt die Migrationen bis zum Ende der Transaktion. SQLite kennt keine Advisory Locks,
+    dort übernimmt die Schreibsperre der Datenbank (BEGIN IMMEDIATE) diese Aufgabe.
+    """
+    if BACKEND == "postgres":
+        cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_ID,))
+    else:
+        cur.execute("BEGIN IMMEDIATE;")
+
+def get_applied_migrations(cur) -> set:
+    cur.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cur.fetchall()}
+
+def apply_migrations(conn) -> list:
+    """
+    Führt alle noch nicht angewendeten Migrationen in Versionsreihenfolge aus.
+    Gibt die Liste der neu angewendeten Versionen zurück.
+    """
+    with transaction(conn) as cur:
+        cur.execute(SQL_MIGRATIONS_TABLE)
+
+    applied_now = []
+    for version, description, sql in sorted(MIGRATIONS):
+        with transaction(conn) as cur:
+            lock_migrations(cur)
+            if version in get_applied_migrations(cur):
+                continue
+            if callable(sql):
+                sql(cur)
+            else:
+                cur.execute(sql)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, %s);",
+                (version, description, datetime.now(timezone.utc))
+            )
+        applied_now.append(version)
+        print(f"Migration {version} angewendet: {description}")
+    return applied_now
+
+def timescaledb_available(cur) -> bool:
+    cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb';")
+    return cur.fetchone() is not None
+
+def enable_timescaledb(conn) -> bool:
+    """
+    Wandelt market_data in eine TimescaleDB-Hypertable um und richtet Kompressions- und
+    Aufbewahrungsrichtlinie ein. Idempotent, bestehende Daten werden migriert.
+    Nur market_data eignet sich: die übrigen Tabellen haben Primärschlüssel ohne Zeitspalte.
+    """
+    with transaction(conn) as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS timescaledb;")
+        cur.execute(
+            "SELECT create_hypertable('market_data', 'timestamp', chunk_time_interval => %s::interval, "
+            "if_not_exists => TRUE, migrate_data => TRUE);",
+            (TIMESCALEDB_CHUNK_INTERVAL,)
+        )
+        if TIMESCALEDB_COMPRESS_AFTER:
+            cur.execute(
+                "SELECT compression_enabled FROM timescaledb_information.hypertables WHERE hypertable_name = 'market_data';"
+            )
+            row = cur.fetchone()
+            if not (row and row[0]):
+                cur.execute(
+                    "ALTER TABLE market_data SET (timescaledb.compress, "
+                    "timescaledb.compress_segmentby = 'asset, timeframe', timescaledb.compress_orderby = 'timestamp DESC');"
+                )
+            cur.execute(
+                "SELECT add_compression_policy('market_data', %s::interval, if_not_exists => TRUE);",
+                (TIMESCALEDB_COMPRESS_AFTER,)
+            )
+        if TIMESCALEDB_RETENTION:
+            cur.execute(
+                "SELECT add_retention_policy('market_data', %s::interval, if_not_exists => TRUE);",
+                (TIMESCALEDB_RETENTION,)
+            )
+    return True
+
+def setup_timescaledb(conn, mode: str = TIMESCALEDB_MODE) -> bool:
+    """
+    TIMESCALEDB_MODE: "auto" aktiviert TimescaleDB, wenn die Extension auf dem Server verfügbar ist,
+    "on" verlangt sie (Fehlermeldung, falls nicht verfügbar), "off" überspringt den Schritt.
+    Mit DB_BACKEND = "sqlite" gibt es keine Extensions, der Schritt entfällt.
+    """
+    if mode == "off" or BACKEND != "postgres":
+        return False
+    with transaction(conn) as cur:
+        available = timescaledb_available(cur)
+    if not available:
+        if mode == "on":
+            print("TimescaleDB ist laut TIMESCALEDB_MODE erforderlich, aber auf dem Server nicht installiert.")
+        return False
+    try:
+        enable_timescaledb(conn)
+    except DatabaseError as e:
+        print(f"TimescaleDB konnte nicht aktiviert werden, market_data bleibt eine normale Tabelle: {e}")
+        return False
+    print("TimescaleDB aktiv: market_data ist eine Hypertable mit Kompressions- und Aufbewahrungsrichtlinie.")
+    return True
+
 def setup_database():
     """
-    Verbindet sich mit der PostgreSQL-Datenbank und erstellt die notwendigen Tabellen.
+    Verbindet sich mit der Datenbank (siehe DB_BACKEND), wendet alle ausstehenden Schema-Migrationen an
+    und aktiviert optional TimescaleDB (siehe TIMESCALEDB_MODE).
     """
-    conn = None
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        cur = conn.cursor()
-        cur.execute(SQL_SCHEMA)
-        conn.commit()
-        cur.close()
-        print("Datenbanktabellen erfolgreich erstellt oder aktualisiert.")
-    except psycopg2.Error as e:
+        with connection() as conn:
+            applied = apply_migrations(conn)
+            setup_timescaledb(conn)
+        if applied:
+            print("Datenbanktabellen erfolgreich erstellt oder aktualisiert.")
+        else:
+            print("Datenbankschema ist aktuell.")
+    except DatabaseError as e:
         print(f"Fehler beim Verbinden oder Erstellen der Datenbanktabellen: {e}")
-        print("Bitte stellen Sie sicher, dass Ihre PostgreSQL-Datenbank läuft und die Zugangsdaten in config.py korrekt sind.")
-        print("Beachten Sie, dass 'create_hypertable' (für TimescaleDB) auskommentiert ist. Aktivieren Sie es manuell, falls TimescaleDB verwendet wird.")
-    finally:
-        if conn:
-            conn.close()
+        if BACKEND == "postgres":
+            print("Bitte stellen Sie sicher, dass Ihre PostgreSQL-Datenbank läuft und die Zugangsdaten in config.py korrekt sind.")
+        else:
+            print("Bitte prüfen Sie SQLITE_PATH in config.py.")
 
 if __name__ == "__main__":
     setup_database()
-
-
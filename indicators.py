@@ -0,0 +1,389 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from datetime import datetime, timezone
+
+import numpy as np
+
+from storage import DatabaseError, bulk_upsert, cursor
+from candle_cache import OHLCV_COLUMNS
+from config import (
+    ASSETS_TO_TRACK, TIMEFRAME, RSI_PERIOD, MACD_FAST, MACD_SLOW, MACD_SIGNAL, BOLLINGER_PERIOD, BOLLINGER_STD,
+    ATR_PERIOD, VOLUME_ZSCORE_PERIOD
+)
+
+RSI_STATE_COLUMNS = [
+    "asset", "timeframe", "period", "last_timestamp", "last_close",
+    "avg_gain", "avg_loss", "samples", "updated_at"
+]
+
+@dataclass
+class RSIState:
+    """
+    Zustand eines inkrementellen RSI nach Wilder. update() verarbeitet eine neue Kerze in O(1).
+    Die ersten 'period' Kursänderungen werden einfach gemittelt (Seed), danach wird geglättet.
+    """
+    asset: str
+    timeframe: str
+    period: int = RSI_PERIOD
+    last_timestamp: datetime = None
+    last_close: float = None
+    avg_gain: float = 0.0
+    avg_loss: float = 0.0
+    samples: int = 0
+
+    def update(self, timestamp: datetime, close: float):
+        if self.last_close is not None:
+            delta = close - self.last_close
+            gain = max(delta, 0.0)
+            loss = max(-delta, 0.0)
+            self.samples += 1
+            if self.samples <= self.period:
+                self.avg_gain += (gain - self.avg_gain) / self.samples
+                self.avg_loss += (loss - self.avg_loss) / self.samples
+            else:
+                self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+                self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        self.last_timestamp = timestamp
+        self.last_close = close
+
+    @property
+    def rsi(self):
+        """
+        Aktueller RSI oder None, solange noch keine Kursänderung verarbeitet wurde.
+        """
+        if self.samples == 0:
+            return None
+        return _rsi_from_averages(self.avg_gain, self.avg_loss)
+
+    def as_row(self) -> tuple:
+        return (
+            self.asset, self.timeframe, self.period, self.last_timestamp, self.last_close,
+            self.avg_gain, self.avg_loss, self.samples, datetime.now(timezone.utc)
+        )
+
+def _rsi_from_averages(avg_gain, avg_loss):
+    """
+    RSI aus durchschnittlichem Gewinn und Verlust. Ohne jede Bewegung gilt 50 (neutral).
+    Funktioniert für Skalare und NumPy-Arrays.
+    """
+    avg_gain = np.asarray(avg_gain, dtype=float)
+    avg_loss = np.asarray(avg_loss, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    rsi = np.where(avg_loss == 0, np.where(avg_gain > 0, 100.0, 50.0), rsi)
+    return float(rsi) if rsi.ndim == 0 else rsi
+
+def wilder_rsi(closes, period: int = RSI_PERIOD) -> tuple:
+    """
+    Batch-Berechnung des Wilder-RSI über eine komplette Kursreihe, unabhängig vom inkrementellen Pfad
+    formuliert (kumulativer Mittelwert als Seed, danach pandas-EWM mit alpha=1/period).
+    Gibt (RSI-Reihe, letzter avg_gain, letzter avg_loss) zurück; die RSI-Reihe hat len(closes) - 1 Werte.
+    """
+    deltas = np.diff(np.asarray(closes, dtype=float))
+    if len(deltas) == 0:
+        return np.array([]), 0.0, 0.0
+    gains = np.clip(deltas, 0, None)
+    losses = np.clip(-deltas, 0, None)
+
+    seed_length = min(period, len(deltas))
+    counts = np.arange(1, seed_length + 1)
+    seed_gain = np.cumsum(gains[:seed_length]) / counts
+    seed_loss = np.cumsum(losses[:seed_length]) / counts
+
+    if len(deltas) > period:
+        import pandas as pd # nur für die Neuberechnung, der Signal-Pfad kommt ohne pandas aus
+        smoothed_gain = pd.Series(np.concatenate(([seed_gain[-1]], gains[period:]))).ewm(alpha=1 / period, adjust=False).mean().to_numpy()[1:]
+        smoothed_loss = pd.Series(np.concatenate(([seed_loss[-1]], losses[period:]))).ewm(alpha=1 / period, adjust=False).mean().to_numpy()[1:]
+        avg_gain = np.concatenate((seed_gain, smoothed_gain))
+        avg_loss = np.concatenate((seed_loss, smoothed_loss))
+    else:
+        avg_gain, avg_loss = seed_gain, seed_loss
+
+    return _rsi_from_averages(avg_gain, avg_loss), float(avg_gain[-1]), float(avg_loss[-1])
+
+# --- Vektorisierte Indikatoren über (Assets x Zeit)-Matrizen ---
+
+INDICATOR_NAMES = [
+    "rsi", "ema_fast", "ema_slow", "macd", "macd_signal", "macd_hist", "bb_mid", "bb_upper", "bb_lower",
+    "bb_percent", "atr", "atr_pct", "volume_z", "close_change"
+]
+# Gewichtsmatrizen für ema(): je Fensterbreite und alpha eine (RSI, MACD, Signal, ATR)
+EMA_WEIGHTS_CACHE_SIZE = 64
+
+def candle_matrix(candles: dict, assets: list) -> dict:
+    """
+    Stapelt die Kerzen mehrerer Assets ({asset: (Zeitstempel in ms, OHLCV-Array)}, z.B. aus
+    candle_cache.recent_candles) zu je einer (Assets x Zeit)-Matrix pro OHLCV-Spalte, rechtsbündig an der
+    jüngsten Kerze. Kürzere Reihen werden links mit ihrer ersten Kerze aufgefüllt (für EMAs neutral),
+    'length' enthält die tatsächliche Anzahl Kerzen pro Asset.
+    """
+    width = max((len(candles[asset][0]) for asset in assets), default=0)
+    matrix = np.full((len(OHLCV_COLUMNS), len(assets), width), np.nan)
+    length = np.zeros(len(assets), dtype=int)
+    for row, asset in enumerate(assets):
+        values = candles[asset][1]
+        count = values.shape[1]
+        length[row] = count
+        if count:
+            matrix[:, row, width - count:] = values
+            matrix[:, row, :width - count] = values[:, :1]
+    return dict(zip(OHLCV_COLUMNS, matrix), length=length)
+
+@lru_cache(maxsize=EMA_WEIGHTS_CACHE_SIZE)
+def _ema_weights(count: int, alpha: float) -> np.ndarray:
+    """
+    Transponierte (Zeit x Zeit)-Gewichtsmatrix für ema(), einmal pro (Fensterbreite, alpha) berechnet.
+    Schreibgeschützt, da sie zwischen allen Aufrufen geteilt wird.
+    """
+    lags = np.arange(count)[:, None] - np.arange(count)[None, :]
+    weights = np.where(lags >= 0, alpha * (1 - alpha) ** np.maximum(lags, 0), 0.0)
+    if count:
+        weights[:, 0] = (1 - alpha) ** np.arange(count) # Startwert
+    weights = np.ascontiguousarray(weights.T)
+    weights.flags.writeable = False
+    return weights
+
+def ema(values, alpha: float) -> np.ndarray:
+    """
+    Exponentieller gleitender Durchschnitt entlang der Zeitachse (letzte Achse) für alle Zeilen auf einmal,
+    wie pandas ewm(alpha=alpha, adjust=False), beginnend beim ersten Wert. Berechnet als ein Matrixprodukt
+    mit einer (Zeit x Zeit)-Gewichtsmatrix statt einer Schleife über die Zeit; gedacht für Fenster von
+    einigen hundert Kerzen wie SCORING_CANDLE_WINDOW.
+    """
+    values = np.asarray(values, dtype=float)
+    return values @ _ema_weights(values.shape[-1], float(alpha))
+
+def _rolling(values: np.ndarray, period: int, func) -> np.ndarray:
+    """
+    func (z.B. np.mean) über gleitende Fenster der letzten period Werte; die ersten period - 1 Spalten sind NaN.
+    """
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] >= period:
+        windows = np.lib.stride_tricks.sliding_window_view(values, period, axis=-1)
+        result[..., period - 1:] = func(windows, axis=-1)
+    return result
+
+def compute_indicators(matrix: dict, rsi_period: int = RSI_PERIOD, macd_fast: int = MACD_FAST, macd_slow: int = MACD_SLOW,
+                       macd_signal: int = MACD_SIGNAL, bollinger_period: int = BOLLINGER_PERIOD,
+                       bollinger_std: float = BOLLINGER_STD, atr_period: int = ATR_PERIOD,
+                       volume_period: int = VOLUME_ZSCORE_PERIOD, names=None) -> dict:
+    """
+    Berechnet alle Indikatoren für alle Assets in einem Durchlauf über die Matrizen aus candle_matrix().
+    Liefert {Name: (Assets x Zeit)-Array}: rsi, ema_fast, ema_slow, macd, macd_signal, macd_hist, bb_mid,
+    bb_upper, bb_lower, bb_percent, atr, atr_pct, volume_z und close_change. Werte, für die ein Asset
+    noch zu wenige Kerzen hat, sind NaN. Mit names werden nur diese Indikatoren berechnet und geliefert.
+    Der RSI folgt Wilder (alpha = 1/period), beginnt aber am Anfang des Fensters statt der gesamten
+    Historie; bei SCORING_CANDLE_WINDOW = 100 ist der Unterschied vernachlässigbar.
+    """
+    wanted = set(INDICATOR_NAMES if names is None else names)
+    unknown = wanted - set(INDICATOR_NAMES)
+    if unknown:
+        raise ValueError(f"Unbekannte Indikatoren: {sorted(unknown)}")
+    close, high, low, volume = matrix["close"], matrix["high"], matrix["low"], matrix["volume"]
+    length = matrix["length"]
+    width = close.shape[-1]
+    previous_close = np.concatenate((close[:, :1], close[:, :-1]), axis=1)
+    close_change = close - previous_close
+
+    # Position jeder Spalte in der eigenen Reihe des Assets (negativ im aufgefüllten Bereich)
+    position = np.arange(width)[None, :] - (width - length)[:, None]
+
+    def require(values, candles):
+        return np.where(position >= candles - 1, values, np.nan)
+
+    indicators = {}
+    if "rsi" in wanted:
+        gain = ema(np.clip(close_change, 0, None), 1 / rsi_period)
+        loss = ema(np.clip(-close_change, 0, None), 1 / rsi_period)
+        indicators["rsi"] = require(_rsi_from_averages(gain, loss), rsi_period + 1)
+
+    if wanted & {"ema_fast", "ema_slow", "macd", "macd_signal", "macd_hist"}:
+        ema_fast = ema(close, 2 / (macd_fast + 1))
+        ema_slow = ema(close, 2 / (macd_slow + 1))
+        macd = ema_fast - ema_slow
+        macd_signal_line = ema(macd, 2 / (macd_signal + 1))
+        indicators.update({
+            "ema_fast": require(ema_fast, macd_fast),
+            "ema_slow": require(ema_slow, macd_slow),
+            "macd": require(macd, macd_slow),
+            "macd_signal": require(macd_signal_line, macd_slow + macd_signal - 1),
+            "macd_hist": require(macd - macd_signal_line, macd_slow + macd_signal - 1),
+        })
+
+    if wanted & {"bb_mid", "bb_upper", "bb_lower", "bb_percent"}:
+        bb_mid = _rolling(close, bollinger_period, np.mean)
+        bb_width = bollinger_std * _rolling(close, bollinger_period, np.std)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bb_percent = np.where(bb_width > 0, (close - (bb_mid - bb_width)) / (2 * bb_width), 0.5)
+        indicators.update({
+            "bb_mid": require(bb_mid, bollinger_period),
+            "bb_upper": require(bb_mid + bb_width, bollinger_period),
+            "bb_lower": require(bb_mid - bb_width, bollinger_period),
+            "bb_percent": require(bb_percent, bollinger_period),
+        })
+
+    if wanted & {"atr", "atr_pct"}:
+        true_range = np.maximum.reduce([high - low, np.abs(high - previous_close), np.abs(low - previous_close)])
+        atr = ema(true_range, 1 / atr_period)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            atr_pct = atr / close * 100
+        indicators.update({"atr": require(atr, atr_period + 1), "atr_pct": require(atr_pct, atr_period + 1)})
+
+    if "volume_z" in wanted:
+        volume_mean = _rolling(volume, volume_period, np.mean)
+        volume_std = _rolling(volume, volume_period, np.std)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            volume_z = np.where(volume_std > 0, (volume - volume_mean) / volume_std, 0.0)
+        indicators["volume_z"] = require(volume_z, volume_period)
+
+    if "close_change" in wanted:
+        indicators["close_change"] = require(close_change, 2)
+
+    return {name: indicators[name] for name in INDICATOR_NAMES if name in wanted}
+
+def latest_indicators(candles: dict, assets: list, **params) -> dict:
+    """
+    Jüngster Wert jedes Indikators pro Asset als {Name: Array über assets} (NaN bei zu wenigen Kerzen).
+    """
+    if not assets:
+        return {}
+    matrix = candle_matrix(candles, assets)
+    indicators = compute_indicators(matrix, **params)
+    if matrix["close"].shape[-1] == 0:
+        return {name: np.full(len(assets), np.nan) for name in indicators}
+    return {name: values[:, -1] for name, values in indicators.items()}
+
+def load_rsi_state(cur, asset: str, timeframe: str, period: int = RSI_PERIOD) -> RSIState:
+    """
+    Lädt den gespeicherten RSI-Zustand oder liefert einen leeren Zustand.
+    """
+    cur.execute(
+        """
+        SELECT last_timestamp, last_close, avg_gain, avg_loss, samples FROM rsi_state
+        WHERE asset = %s AND timeframe = %s AND period = %s;
+        """,
+        (asset, timeframe, period)
+    )
+    row = cur.fetchone()
+    if not row:
+        return RSIState(asset, timeframe, period)
+    return RSIState(asset, timeframe, period, row[0], row[1], row[2], row[3], row[4])
+
+def load_rsi_states(cur, assets: list, timeframe: str, period: int = RSI_PERIOD) -> dict:
+    """
+    Lädt die gespeicherten RSI-Zustände mehrerer Assets in einer Abfrage.
+    Assets ohne gespeicherten Zustand fehlen im Ergebnis.
+    """
+    cur.execute(
+        """
+        SELECT asset, last_timestamp, last_close, avg_gain, avg_loss, samples FROM rsi_state
+        WHERE asset = ANY(%s) AND timeframe = %s AND period = %s;
+        """,
+        (list(assets), timeframe, period)
+    )
+    return {
+        row[0]: RSIState(row[0], timeframe, period, row[1], row[2], row[3], row[4], row[5])
+        for row in cur.fetchall()
+    }
+
+def save_rsi_states(cur, states: list) -> int:
+    """
+    Schreibt RSI-Zustände per Upsert zurück.
+    """
+    return bulk_upsert(
+        cur, "rsi_state", RSI_STATE_COLUMNS, [state.as_row() for state in states],
+        conflict_columns=["asset", "timeframe", "period"],
+        update_columns=["last_timestamp", "last_close", "avg_gain", "avg_loss", "samples", "updated_at"]
+    )
+
+def update_rsi_state(cur, asset: str, timeframe: str = TIMEFRAME, period: int = RSI_PERIOD) -> RSIState:
+    """
+    Führt den RSI-Zustand mit allen Kerzen nach dem letzten verarbeiteten Zeitstempel fort
+    und speichert ihn. Im eingeschwungenen Zustand ist das eine Kerze pro Zyklus;
+    nur beim allerersten Aufruf wird die gesamte Historie einmal durchlaufen.
+    """
+    state = load_rsi_state(cur, asset, timeframe, period)
+    if state.last_timestamp is None:
+        cur.execute(
+            """
+            SELECT timestamp, close FROM market_data
+            WHERE asset = %s AND timeframe = %s
+            ORDER BY timestamp ASC;
+            """,
+            (asset, timeframe)
+        )
+    else:
+        cur.execute(
+            """
+            SELECT timestamp, close FROM market_data
+            WHERE asset = %s AND timeframe = %s AND timestamp > %s
+            ORDER BY timestamp ASC;
+            """,
+            (asset, timeframe, state.last_timestamp)
+        )
+    new_candles = cur.fetchall()
+    for timestamp, close in new_candles:
+        state.update(timestamp, close)
+    if new_candles:
+        save_rsi_states(cur, [state])
+    return state
+
+def rebuild_rsi_state(cur, asset: str, timeframe: str = TIMEFRAME, period: int = RSI_PERIOD) -> RSIState:
+    """
+    Verwirft den gespeicherten Zustand und berechnet ihn aus der kompletten Historie neu,
+    z.B. nachdem per Backfill ältere Kerzen vor dem bisherigen Startpunkt ergänzt wurden.
+    """
+    cur.execute(
+        "DELETE FROM rsi_state WHERE asset = %s AND timeframe = %s AND period = %s;",
+        (asset, timeframe, period)
+    )
+    return update_rsi_state(cur, asset, timeframe, period)
+
+def verify_rsi_states(assets: list = None, timeframe: str = TIMEFRAME, period: int = RSI_PERIOD, tolerance: float = 1e-6) -> dict:
+    """
+    Prüfungsmodus: vergleicht den gespeicherten inkrementellen RSI mit einer vollständigen
+    Batch-Neuberechnung über alle gespeicherten Kerzen. Liefert pro Asset
+    {'incremental', 'batch', 'ok'}; Abweichungen deuten auf nachträglich eingefügte ältere Kerzen hin
+    (Abhilfe: rebuild_rsi_state).
+    """
+    assets = assets or ASSETS_TO_TRACK
+    results = {}
+    try:
+        with cursor() as cur:
+            for asset in assets:
+                state = load_rsi_state(cur, asset, timeframe, period)
+                if state.last_timestamp is None:
+                    results[asset] = {"incremental": None, "batch": None, "ok": False}
+                    print(f"RSI-Prüfung {asset} ({timeframe}): kein gespeicherter Zustand vorhanden.")
+                    continue
+                cur.execute(
+                    """
+                    SELECT timestamp, close FROM market_data
+                    WHERE asset = %s AND timeframe = %s AND timestamp <= %s
+                    ORDER BY timestamp ASC;
+                    """,
+                    (asset, timeframe, state.last_timestamp)
+                )
+                closes = [row[1] for row in cur.fetchall()]
+                batch_series, batch_gain, batch_loss = wilder_rsi(closes, period)
+                batch_rsi = float(batch_series[-1]) if len(batch_series) else None
+                incremental_rsi = state.rsi
+
+                if incremental_rsi is None or batch_rsi is None:
+                    ok = incremental_rsi is None and batch_rsi is None
+                else:
+                    ok = bool(
+                        abs(incremental_rsi - batch_rsi) <= tolerance
+                        and abs(state.avg_gain - batch_gain) <= tolerance * max(1.0, abs(batch_gain))
+                        and abs(state.avg_loss - batch_loss) <= tolerance * max(1.0, abs(batch_loss))
+                    )
+                results[asset] = {"incremental": incremental_rsi, "batch": batch_rsi, "ok": ok}
+                status = "OK" if ok else "ABWEICHUNG"
+                print(f"RSI-Prüfung {asset} ({timeframe}): inkrementell={incremental_rsi}, batch={batch_rsi} -> {status}")
+    except DatabaseError as e:
+        print(f"Datenbankfehler bei der RSI-Prüfung: {e}")
+    return results
+
+if __name__ == "__main__":
+    # Prüft die gespeicherten RSI-Zustände gegen eine vollständige Neuberechnung
+    verify_rsi_states()
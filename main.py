@@ -1,33 +1,196 @@
-from collectors import collect_market_data, collect_sentiment_data, collect_onchain_data
-from signal_engine import generate_signals
-from analysis import analyze_signals
-from db_setup import setup_database
+import argparse
+import sys
 
-def main():
+from config import METRICS_JSON_PATH, METRICS_HTTP_PORT, SHARD_COUNT
+
+# Die Stufen importieren ihre Module erst beim Aufruf: ein einzelner Stufen-Job (z.B. per Cron)
+# lädt so nur, was er braucht (collect onchain z.B. weder ccxt noch pandas).
+
+def _market_collector():
+    if SHARD_COUNT > 1:
+        from sharding import collect_market_sharded
+        return collect_market_sharded
+    from collectors import collect_market_data
+    return collect_market_data
+
+def _generate_signals(assets: list) -> int:
+    if SHARD_COUNT > 1:
+        from sharding import generate_signals_sharded
+        return generate_signals_sharded(assets)
+    from signal_engine import generate_signals
+    return generate_signals(assets)
+
+def _warm_cache(assets: list):
+    if SHARD_COUNT > 1:
+        from sharding import warm_sharded
+        warm_sharded(assets)
+    else:
+        import candle_cache
+        candle_cache.warm(assets)
+
+def run_cycle():
     """
-    Orchestriert den gesamten Daten- und Signalgenerierungsprozess.
+    Ein Durchlauf: Datensammlung, Signalgenerierung und Signalanalyse für das Asset-Universum (siehe universe.py).
+    Mit SHARD_COUNT > 1 laufen Marktdaten-Sammlung und Signalgenerierung in den Worker-Prozessen der Shards,
+    Sentiment, On-Chain-Daten und Analyse (über alle Assets) im Koordinator; die Ergebnisse der Shards werden summiert.
+    Die Dauer jeder Stufe wird in metrics erfasst, mit METRICS_JSON_PATH werden die Kennzahlen
+    des Zyklus zusätzlich als JSON geschrieben.
     """
+    import metrics
+    from collectors import collect_all
+    from analysis import analyze_signals
+    from universe import get_universe
+
+    assets = get_universe()
+    with metrics.cycle(METRICS_JSON_PATH):
+        print(f"Starte Datensammlung für {len(assets)} Assets{f' in {SHARD_COUNT} Shards' if SHARD_COUNT > 1 else ''}...")
+        with metrics.timer("stage_seconds", stage="collect"):
+            collect_all(assets, market_collector=_market_collector())
+        print("Datensammlung abgeschlossen.")
+
+        print("Starte Signalgenerierung...")
+        with metrics.timer("stage_seconds", stage="signals"):
+            generated_signal_count = _generate_signals(assets)
+        print(f"Signalgenerierung abgeschlossen. {generated_signal_count} neue Signale generiert.")
+
+        print("Starte Signalanalyse...")
+        with metrics.timer("stage_seconds", stage="analysis"):
+            analyze_signals()
+        print("Signalanalyse abgeschlossen.")
+
+    print("Zyklus abgeschlossen.")
+
+def _setup():
+    from db_setup import setup_database
     print("Starte den Setup der Datenbanktabellen...")
     setup_database()
     print("Datenbank-Setup abgeschlossen.")
 
-    print("Starte Datensammlung...")
-    collect_market_data()
-    collect_sentiment_data()
-    collect_onchain_data()
-    print("Datensammlung abgeschlossen.")
+def cmd_setup(args):
+    _setup()
 
-    print("Starte Signalgenerierung...")
-    generated_signal_count = generate_signals()
-    print(f"Signalgenerierung abgeschlossen. {generated_signal_count} neue Signale generiert.")
+def cmd_collect(args):
+    if args.source == "market":
+        from universe import get_universe
+        print(f"{_market_collector()(get_universe())} neue Kerzen gespeichert.")
+    elif args.source == "sentiment":
+        from collectors import collect_sentiment_data
+        collect_sentiment_data()
+    elif args.source == "onchain":
+        from collectors import collect_onchain_data
+        print(f"{collect_onchain_data()} neue On-Chain-Transaktionen gespeichert.")
+    else:
+        from collectors import collect_all
+        from universe import get_universe
+        collect_all(get_universe(), market_collector=_market_collector())
 
-    print("Starte Signalanalyse...")
+def cmd_signals(args):
+    from universe import get_universe
+    print(f"Signalgenerierung abgeschlossen. {_generate_signals(get_universe())} neue Signale generiert.")
+
+def cmd_analyze(args):
+    from analysis import analyze_signals
     analyze_signals()
-    print("Signalanalyse abgeschlossen.")
 
-    print("Zyklus abgeschlossen.")
+def cmd_cycle(args):
+    from universe import get_universe
+    _setup()
+    _warm_cache(get_universe())
+    run_cycle()
 
-if __name__ == "__main__":
-    main()
+def cmd_daemon(args):
+    import metrics
+    from scheduler import CandleCloseScheduler
+    from universe import get_universe
+    _setup()
+    _warm_cache(get_universe())
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    scheduler = CandleCloseScheduler(run_cycle)
+    scheduler.install_signal_handlers()
+    scheduler.run()
+
+def cmd_stream(args):
+    from streaming import run_stream
+    run_stream()
+
+def cmd_archive(args):
+    from archive import archive_all, rebuild_archive
+    if args.rebuild:
+        rebuild_archive()
+    else:
+        archive_all()
+
+def cmd_universe(args):
+    from universe import get_universe
+    universe = get_universe(refresh=args.refresh)
+    print(f"{len(universe)} Assets: {', '.join(universe)}")
+
+def _run(args):
+    try:
+        args.handler(args)
+    finally:
+        # Nur aufräumen, was der Befehl tatsächlich geladen hat
+        if "sharding" in sys.modules:
+            sys.modules["sharding"].close_workers()
+        if "storage" in sys.modules:
+            sys.modules["storage"].close_pool()
+
+def build_parser() -> argparse.ArgumentParser:
+    # --profile gilt vor und nach dem Befehl (z.B. "main.py cycle --profile" oder "main.py --profile=zyklus.prof cycle");
+    # ohne Default (SUPPRESS), damit der Unterbefehl einen vorher angegebenen Wert nicht überschreibt
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--profile", nargs="?", const="", default=argparse.SUPPRESS, metavar="DATEI",
+                        help="Mit cProfile laufen, die teuersten Funktionen ausgeben und die Rohdaten optional in DATEI speichern")
+
+    parser = argparse.ArgumentParser(description="SignalEngine: Daten sammeln, Signale generieren und analysieren.", parents=[common])
+    # Aufrufe ohne Unterbefehl wie bisher: ein Zyklus bzw. mit --daemon dauerhaft
+    parser.add_argument("--daemon", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--metrics-port", type=int, help=argparse.SUPPRESS)
+    parser.set_defaults(handler=None, metrics_port=METRICS_HTTP_PORT)
+    commands = parser.add_subparsers(dest="command", metavar="BEFEHL")
 
+    def add_command(name: str, handler, help: str):
+        command = commands.add_parser(name, help=help, parents=[common])
+        command.set_defaults(handler=handler)
+        return command
 
+    add_command("setup", cmd_setup, "Tabellen anlegen und Migrationen ausführen")
+    add_command("collect", cmd_collect, "Daten einer Quelle sammeln").add_argument(
+        "source", choices=["market", "sentiment", "onchain", "all"]
+    )
+    add_command("signals", cmd_signals, "Signale für das Asset-Universum generieren")
+    add_command("analyze", cmd_analyze, "Signal-Outcomes fortschreiben und Performance ausgeben")
+    add_command("cycle", cmd_cycle, "Setup und ein vollständiger Zyklus (Standard ohne Befehl)")
+    add_command("daemon", cmd_daemon, "Dauerhaft laufen und nach jedem Kerzenschluss einen Zyklus starten").add_argument(
+        "--metrics-port", type=int, default=argparse.SUPPRESS, help="/metrics (Prometheus-Text) auf diesem Port bereitstellen"
+    )
+    add_command("stream", cmd_stream, "Kerzen aus Live-Trades bilden (siehe streaming.py)")
+    add_command("archive", cmd_archive, "Abgeschlossene Monate ins Spaltenarchiv schreiben").add_argument(
+        "--rebuild", action="store_true", help="Archiv vollständig neu aufbauen"
+    )
+    add_command("universe", cmd_universe, "Asset-Universum ausgeben").add_argument(
+        "--refresh", action="store_true", help="Universum neu ermitteln statt den Cache zu verwenden"
+    )
+    return parser
+
+def main(argv=None):
+    """
+    Einstiegspunkt mit Unterbefehlen für die einzelnen Stufen (setup, collect market|sentiment|onchain|all,
+    signals, analyze) sowie cycle, daemon, stream, archive und universe. Ohne Befehl läuft ein einzelner Zyklus,
+    mit --daemon dauerhaft. Mit --profile läuft der Befehl unter cProfile, um einen langsamen Zyklus
+    einer Funktion zuordnen zu können.
+    """
+    args = build_parser().parse_args(argv)
+    if args.handler is None:
+        args.handler = cmd_daemon if args.daemon else cmd_cycle
+
+    if getattr(args, "profile", None) is None:
+        _run(args)
+    else:
+        import metrics
+        with metrics.profiled(args.profile or None):
+            _run(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import io
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Prozessweite Kennzahlen: Zähler (nur steigend) und Summaries (Anzahl + Summe, z.B. Sekunden).
+# Schlüssel ist (Name, sortierte Labels); alle Zugriffe laufen über einen Lock, da die Collectors parallel arbeiten.
+METRIC_PREFIX = "signalengine_"
+
+_lock = threading.Lock()
+_counters = {}
+_summaries = {}
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    """
+    Erhöht einen Zähler, z.B. inc("errors_total", source="onchain").
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, value: float, **labels):
+    """
+    Erfasst einen Messwert (meist eine Dauer in Sekunden) in einer Summary.
+    """
+    key = _key(name, labels)
+    with _lock:
+        count, total = _summaries.get(key, (0, 0.0))
+        _summaries[key] = (count + 1, total + value)
+
+@contextmanager
+def timer(name: str, **labels):
+    """
+    Misst die Dauer des with-Blocks in Sekunden, auch wenn er mit einer Exception endet.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+def timed(name: str, **labels):
+    """
+    Decorator-Variante von timer().
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _format_key(key: tuple) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+def _parse_key(formatted: str) -> tuple:
+    """
+    Umkehrung von _format_key, z.B. für Kennzahlen aus einem Worker-Prozess.
+    """
+    if not formatted.endswith("}"):
+        return formatted, ()
+    name, labels = formatted[:-1].split("{", 1)
+    return name, tuple(
+        (label, value.strip('"')) for label, value in (part.split("=", 1) for part in labels.split(","))
+    )
+
+def snapshot() -> dict:
+    """
+    Aktueller Stand aller Kennzahlen als JSON-fähiges dict.
+    """
+    with _lock:
+        return {
+            "counters": {_format_key(key): value for key, value in _counters.items()},
+            "summaries": {_format_key(key): {"count": count, "sum": total} for key, (count, total) in _summaries.items()},
+        }
+
+def diff(before: dict, after: dict) -> dict:
+    """
+    Veränderung zwischen zwei Snapshots, z.B. die Kennzahlen eines einzelnen Zyklus.
+    """
+    counters = {
+        key: value - before["counters"].get(key, 0)
+        for key, value in after["counters"].items()
+        if value != before["counters"].get(key, 0)
+    }
+    summaries = {}
+    for key, value in after["summaries"].items():
+        previous = before["summaries"].get(key, {"count": 0, "sum": 0.0})
+        if value["count"] != previous["count"]:
+            summaries[key] = {"count": value["count"] - previous["count"], "sum": value["sum"] - previous["sum"]}
+    return {"counters": counters, "summaries": summaries}
+
+def cache_hit_rates(data: dict) -> dict:
+    """
+    Trefferquote pro Cache-Ebene aus den Zählern cache_lookups_total{cache=..., result=hit|miss}.
+    """
+    lookups = {}
+    for key, value in data["counters"].items():
+        name, labels = _parse_key(key)
+        if name == "cache_lookups_total":
+            labels = dict(labels)
+            hits, total = lookups.get(labels["cache"], (0, 0))
+            lookups[labels["cache"]] = (hits + (value if labels["result"] == "hit" else 0), total + value)
+    return {cache: hits / total for cache, (hits, total) in lookups.items() if total}
+
+def merge(data: dict):
+    """
+    Addiert Kennzahlen im Format von snapshot()/diff() auf die eigenen, z.B. die eines Shards (siehe sharding.py).
+    """
+    with _lock:
+        for formatted, value in data["counters"].items():
+            key = _parse_key(formatted)
+            _counters[key] = _counters.get(key, 0) + value
+        for formatted, value in data["summaries"].items():
+            key = _parse_key(formatted)
+            count, total = _summaries.get(key, (0, 0.0))
+            _summaries[key] = (count + value["count"], total + value["sum"])
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _summaries.clear()
+
+def render_prometheus() -> str:
+    """
+    Alle Kennzahlen im Prometheus-Textformat; Summaries als <name>_count und <name>_sum.
+    """
+    with _lock:
+        counters = sorted(_counters.items())
+        summaries = sorted(_summaries.items())
+    lines = []
+    for (name, labels), value in counters:
+        lines.append(f"{METRIC_PREFIX}{_format_key((name, labels))} {value}")
+    for (name, labels), (count, total) in summaries:
+        lines.append(f"{METRIC_PREFIX}{_format_key((name + '_count', labels))} {count}")
+        lines.append(f"{METRIC_PREFIX}{_format_key((name + '_sum', labels))} {total}")
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def cycle(json_path: str = None):
+    """
+    Umschließt einen Zyklus: misst die Gesamtdauer und schreibt die Kennzahlen dieses Zyklus
+    (Differenz zum Stand davor, plus Cache-Trefferquoten) als JSON nach json_path.
+    """
+    before = snapshot()
+    try:
+        with timer("cycle_seconds"):
+            yield
+    finally:
+        if json_path:
+            data = diff(before, snapshot())
+            data["cache_hit_rates"] = cache_hit_rates(data)
+            data["finished_at"] = time.time()
+            with open(json_path, "w") as handle:
+                json.dump(data, handle, indent=2)
+
+def start_http_server(port: int, host: str = "0.0.0.0"):
+    """
+    Stellt /metrics im Prometheus-Textformat in einem Hintergrund-Thread bereit.
+    http.server wird erst hier geladen, da nur der Daemon-Modus den Endpunkt braucht.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Metriken unter http://{host}:{port}/metrics verfügbar.")
+    return server
+
+@contextmanager
+def profiled(path: str = None, top: int = 25):
+    """
+    Opt-in cProfile um einen Block: gibt die teuersten Funktionen (kumulierte Zeit) aus und
+    speichert die Rohdaten optional nach path (auswertbar mit pstats oder snakeviz).
+    """
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(top)
+        print(output.getvalue())
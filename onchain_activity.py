@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+
+from storage import bulk_upsert
+from timeframes import floor_datetime
+from config import WALLETS_TO_MONITOR
+
+ACTIVITY_BUCKET = "1h"
+ACTIVITY_COLUMNS = ["wallet_address", "bucket", "inflow_count", "inflow_eth"]
+
+SQL_ACTIVITY_TABLE = """
+-- Stündlich aggregierte Zuflüsse (Käufe) pro überwachter Wallet, beim Sammeln fortgeschrieben
+CREATE TABLE IF NOT EXISTS onchain_wallet_activity_hourly (
+    wallet_address  TEXT              NOT NULL, -- kleingeschrieben
+    bucket          TIMESTAMPTZ       NOT NULL, -- Beginn der Stunde (UTC)
+    inflow_count    BIGINT            NOT NULL,
+    inflow_eth      NUMERIC           NOT NULL,
+    PRIMARY KEY (wallet_address, bucket)
+);
+"""
+
+def monitored_wallets(*extra) -> set:
+    """
+    Kleingeschriebene Adressen der überwachten Wallets (Platzhalter ausgenommen).
+    Etherscan liefert Adressen kleingeschrieben, config.py enthält sie oft in Checksum-Schreibweise.
+    """
+    return {wallet.lower() for wallet in (*WALLETS_TO_MONITOR, *extra) if wallet != "0x..."}
+
+def _accumulate_inflows(buckets: dict, transactions, wallets: set):
+    for to_address, timestamp_utc, value_eth in transactions:
+        wallet = (to_address or "").lower()
+        if wallet not in wallets or not value_eth or value_eth <= 0:
+            continue
+        key = (wallet, floor_datetime(timestamp_utc, ACTIVITY_BUCKET))
+        count, volume = buckets.get(key, (0, 0))
+        buckets[key] = (count + 1, volume + value_eth)
+
+def inflow_buckets(transactions, wallets: set) -> list:
+    """
+    Fasst Transaktionen (to_address, timestamp_utc, value_eth) zu Zeilen pro Wallet und Stunde zusammen.
+    Als Kauf zählt wie bisher jede Transaktion mit Wert > 0 an eine überwachte Wallet.
+    """
+    buckets = {}
+    _accumulate_inflows(buckets, transactions, wallets)
+    return [(wallet, bucket, count, volume) for (wallet, bucket), (count, volume) in buckets.items()]
+
+def _write_buckets(cur, rows: list) -> int:
+    return bulk_upsert(
+        cur, "onchain_wallet_activity_hourly", ACTIVITY_COLUMNS, rows,
+        conflict_columns=["wallet_address", "bucket"],
+        increment_columns=["inflow_count", "inflow_eth"]
+    )
+
+def record_wallet_inflows(cur, transactions, wallets: set) -> int:
+    """
+    Schreibt die Zuflüsse neu gespeicherter Transaktionen in das Stunden-Aggregat (Zähler werden addiert).
+    Muss in derselben Transaktion wie der Insert laufen und nur die tatsächlich neu geschriebenen
+    Zeilen erhalten, damit keine Transaktion doppelt gezählt wird.
+    """
+    return _write_buckets(cur, inflow_buckets(transactions, wallets))
+
+def rebuild_wallet_activity(cur, batch_size: int = 10000) -> int:
+    """
+    Berechnet das Stunden-Aggregat komplett aus 'onchain_transactions' neu (Migration, Reparatur).
+    Überwacht sind wie in der früheren Abfrage alle Wallets, für die Transaktionen gespeichert sind.
+    """
+    cur.execute("SELECT DISTINCT wallet_monitored FROM onchain_transactions;")
+    wallets = {row[0].lower() for row in cur.fetchall() if row[0]}
+    cur.execute("DELETE FROM onchain_wallet_activity_hourly;")
+    cur.execute("SELECT to_address, timestamp_utc, value_eth FROM onchain_transactions WHERE value_eth > 0;")
+    buckets = {}
+    while True:
+        transactions = cur.fetchmany(batch_size)
+        if not transactions:
+            break
+        _accumulate_inflows(buckets, transactions, wallets)
+    return _write_buckets(cur, [(wallet, bucket, count, volume) for (wallet, bucket), (count, volume) in buckets.items()])
+
+def load_wallet_activity(cur, hours: int = 24, now: datetime = None) -> tuple:
+    """
+    Summe der Zuflüsse aller überwachten Wallets über die Stunden-Buckets der letzten 'hours' Stunden
+    (inklusive der angebrochenen ersten und aktuellen Stunde). Gibt (Anzahl, Volumen in ETH) zurück.
+    """
+    now = now or datetime.now(timezone.utc)
+    since = floor_datetime(now - timedelta(hours=hours), ACTIVITY_BUCKET)
+    cur.execute(
+        """
+        SELECT COALESCE(SUM(inflow_count), 0), COALESCE(SUM(inflow_eth), 0)
+        FROM onchain_wallet_activity_hourly
+        WHERE bucket >= %s;
+        """,
+        (since,)
+    )
+    count, volume = cur.fetchone()
+    return int(count), float(volume)
@@ -0,0 +1,28 @@
+import numpy as np
+
+def resample_ohlcv(timestamps_ms: np.ndarray, opens, highs, lows, closes, volumes, target_ms: int, horizon_ms: int) -> tuple:
+    """
+    Fasst chronologisch sortierte Kerzen zu Kerzen des Ziel-Timeframes zusammen (NumPy reduceat
+    über die Bucket-Grenzen). Nur Buckets, die bis horizon_ms (Ende der letzten Basiskerze)
+    abgeschlossen sind, werden geliefert.
+    Gibt (Bucket-Start in ms, open, high, low, close, volume) als Arrays zurück.
+    """
+    timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+    if len(timestamps_ms) == 0:
+        empty = np.array([], dtype=float)
+        return np.array([], dtype=np.int64), empty, empty, empty, empty, empty
+
+    buckets = timestamps_ms - timestamps_ms % target_ms
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(buckets)])) - 1
+
+    bucket_start = buckets[starts]
+    complete = bucket_start + target_ms <= horizon_ms
+    return (
+        bucket_start[complete],
+        np.asarray(opens, dtype=float)[starts][complete],
+        np.maximum.reduceat(np.asarray(highs, dtype=float), starts)[complete],
+        np.minimum.reduceat(np.asarray(lows, dtype=float), starts)[complete],
+        np.asarray(closes, dtype=float)[ends][complete],
+        np.add.reduceat(np.asarray(volumes, dtype=float), starts)[complete],
+    )
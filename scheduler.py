@@ -0,0 +1,95 @@
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+
+from timeframes import timeframe_to_ms, ms_to_datetime, datetime_to_ms
+from config import TIMEFRAME, SCHEDULER_CLOSE_DELAY_SECONDS
+
+def next_candle_close(now: datetime, timeframe: str = TIMEFRAME, delay_seconds: float = SCHEDULER_CLOSE_DELAY_SECONDS) -> datetime:
+    """
+    Nächster Zeitpunkt "Kerzenschluss + delay_seconds" strikt nach now.
+    Kerzen sind wie bei den Börsen an Vielfachen des Timeframes ab Epoch (UTC) ausgerichtet.
+    """
+    step_ms = timeframe_to_ms(timeframe)
+    delay_ms = int(delay_seconds * 1000)
+    now_ms = datetime_to_ms(now)
+    return ms_to_datetime((now_ms - delay_ms) // step_ms * step_ms + step_ms + delay_ms)
+
+class CandleCloseScheduler:
+    """
+    Führt einen Zyklus (z.B. Sammeln -> Signale -> Analyse) direkt nach jedem Kerzenschluss aus.
+    Läuft ein Zyklus noch, wird ein weiterer Start übersprungen statt parallel ausgeführt.
+    stop() (auch per SIGTERM/SIGINT) beendet die Schleife nach dem laufenden Zyklus.
+    """
+
+    def __init__(self, cycle, timeframe: str = TIMEFRAME, delay_seconds: float = SCHEDULER_CLOSE_DELAY_SECONDS):
+        self.cycle = cycle
+        self.timeframe = timeframe
+        self.delay_seconds = delay_seconds
+        self.stop_event = threading.Event()
+        self._running = threading.Lock()
+
+    def stop(self, signum=None, frame=None):
+        if signum is not None:
+            print(f"Signal {signal.Signals(signum).name} empfangen, beende nach dem laufenden Zyklus...")
+        self.stop_event.set()
+
+    def install_signal_handlers(self):
+        """
+        Muss im Hauptthread aufgerufen werden.
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run_cycle(self, scheduled: datetime = None) -> bool:
+        """
+        Führt einen Zyklus aus, sofern gerade keiner läuft. Gibt False zurück, wenn übersprungen wurde.
+        Fehler im Zyklus werden protokolliert und beenden den Daemon nicht.
+        """
+        if not self._running.acquire(blocking=False):
+            print("Vorheriger Zyklus läuft noch, dieser Start wird übersprungen.")
+            return False
+        started = time.monotonic()
+        try:
+            self.cycle()
+        except Exception as e:
+            print(f"Fehler im Zyklus: {e}")
+        finally:
+            self._running.release()
+
+        duration = time.monotonic() - started
+        print(f"Zyklus nach {duration:.1f}s abgeschlossen.")
+        if scheduled is not None:
+            missed = (datetime_to_ms(datetime.now(timezone.utc)) - datetime_to_ms(scheduled)) // timeframe_to_ms(self.timeframe)
+            if missed > 0:
+                print(f"Warnung: Zyklus dauerte länger als ein Timeframe, {missed} Kerzenschlüsse übersprungen.")
+        return True
+
+    def _sleep_until(self, wake: datetime) -> bool:
+        """
+        Wartet bis wake; gibt False zurück, wenn vorher stop() aufgerufen wurde.
+        Event.wait kann minimal zu früh zurückkehren, daher wird bis zum Zeitpunkt nachgewartet.
+        """
+        while True:
+            remaining = (wake - datetime.now(timezone.utc)).total_seconds()
+            if remaining <= 0:
+                return not self.stop_event.is_set()
+            if self.stop_event.wait(timeout=remaining):
+                return False
+
+    def run(self, run_immediately: bool = True):
+        """
+        Blockierende Hauptschleife. Mit run_immediately wird beim Start sofort ein Zyklus ausgeführt,
+        um seit dem letzten Lauf Verpasstes nachzuholen.
+        """
+        print(f"Daemon gestartet: Zyklus bei jedem {self.timeframe}-Kerzenschluss + {self.delay_seconds}s.")
+        if run_immediately and not self.stop_event.is_set():
+            self.run_cycle()
+        while not self.stop_event.is_set():
+            wake = next_candle_close(datetime.now(timezone.utc), self.timeframe, self.delay_seconds)
+            print(f"Nächster Zyklus um {wake.isoformat()}.")
+            if not self._sleep_until(wake):
+                break
+            self.run_cycle(wake)
+        print("Daemon beendet.")
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+
+import metrics
+from storage import DatabaseError, bulk_insert, cursor
+from config import OPENAI_API_KEY, SENTIMENT_SCORER, SENTIMENT_MODEL, SENTIMENT_BATCH_SIZE, SENTIMENT_LRU_SIZE, COLLECTION_MAX_WORKERS
+
+def headline_hash(headline: str) -> str:
+    """
+    Inhaltsschlüssel einer Headline. Leerzeichen und Groß-/Kleinschreibung werden normalisiert,
+    damit dieselbe Meldung aus verschiedenen Quellen nur einmal bewertet wird.
+    """
+    normalized = " ".join(headline.split()).casefold()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+class LRUCache:
+    """
+    Kleiner threadsicherer LRU-Cache vor der Datenbank-Tabelle 'sentiment_cache'.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+class OpenAISentimentScorer:
+    """
+    Bewertet mehrere Headlines pro Chat-Completion und erwartet eine JSON-Antwort mit einem Score pro Headline.
+    """
+    name = "openai"
+
+    def __init__(self, model: str = SENTIMENT_MODEL, api_key: str = OPENAI_API_KEY):
+        self.model = model
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
+    def score_batch(self, headlines: list) -> list:
+        numbered = "\n".join(f"{i + 1}. {headline}" for i, headline in enumerate(headlines))
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are a sentiment analysis bot. Analyze the sentiment of each given headline and score it between -1 (very negative) and 1 (very positive). Respond with a JSON object of the form {\"scores\": [<float>, ...]} containing exactly one score per headline, in the given order."},
+                {"role": "user", "content": f"Analyze the sentiment of these headlines:\n{numbered}"}
+            ],
+            temperature=0.0,
+            response_format={"type": "json_object"}
+        )
+        scores = json.loads(response.choices[0].message.content)["scores"]
+        if len(scores) != len(headlines):
+            raise ValueError(f"OpenAI lieferte {len(scores)} Scores für {len(headlines)} Headlines.")
+        return [float(score) for score in scores]
+
+class LexiconSentimentScorer:
+    """
+    Lokales Lexikon-Modell ohne Netzwerkzugriff, z.B. für Offline-Läufe.
+    Score = (positive - negative Treffer) / Anzahl Treffer.
+    """
+    name = "lexicon"
+
+    POSITIVE = {
+        "allzeithoch", "kaufwelle", "erfolgreich", "positive", "positiv", "interesse", "steigt", "rallye",
+        "gewinn", "gewinne", "zulassung", "durchbruch", "wachstum", "bullish", "high", "surge", "rally",
+        "gain", "gains", "approval", "upgrade", "record", "adoption", "inflows",
+    }
+    NEGATIVE = {
+        "korrigiert", "korrektur", "belastet", "unsicherheit", "regulierungsunsicherheit", "verlust", "verluste",
+        "fällt", "absturz", "hack", "betrug", "verbot", "klage", "bearish", "crash", "drop", "loss", "losses",
+        "ban", "lawsuit", "outflows", "selloff", "liquidation",
+    }
+
+    def score_batch(self, headlines: list) -> list:
+        scores = []
+        for headline in headlines:
+            words = re.findall(r"\w+", headline.casefold())
+            positive = sum(word in self.POSITIVE for word in words)
+            negative = sum(word in self.NEGATIVE for word in words)
+            hits = positive + negative
+            scores.append((positive - negative) / hits if hits else 0.0)
+        return scores
+
+class StaticSentimentScorer:
+    """
+    Stub-Scorer für Tests: liefert für jede Headline denselben Score.
+    """
+    name = "static"
+
+    def __init__(self, score: float = 0.0):
+        self.score = score
+
+    def score_batch(self, headlines: list) -> list:
+        return [self.score for _ in headlines]
+
+SCORERS = {
+    "openai": OpenAISentimentScorer,
+    "lexicon": LexiconSentimentScorer,
+    "static": StaticSentimentScorer,
+}
+
+_scorer = None
+_lru = LRUCache(SENTIMENT_LRU_SIZE)
+
+def get_scorer():
+    """
+    Liefert den in SENTIMENT_SCORER konfigurierten Scorer (oder den per set_scorer gesetzten).
+    """
+    global _scorer
+    if _scorer is None:
+        _scorer = SCORERS[SENTIMENT_SCORER]()
+    return _scorer
+
+def set_scorer(scorer):
+    """
+    Ersetzt den Scorer, z.B. durch einen StaticSentimentScorer in Tests.
+    Jeder Scorer braucht ein Attribut 'name' und eine Methode score_batch(headlines) -> list[float].
+    """
+    global _scorer
+    _scorer = scorer
+
+def _load_cached_scores(scorer_name: str, hashes: list) -> dict:
+    """
+    Liest bereits bewertete Headlines aus 'sentiment_cache' (eine Abfrage für alle Hashes).
+    """
+    with cursor() as cur:
+        cur.execute(
+            """
+            SELECT content_hash, sentiment_score FROM sentiment_cache
+            WHERE scorer = %s AND content_hash = ANY(%s);
+            """,
+            (scorer_name, hashes)
+        )
+        return {content_hash: float(score) for content_hash, score in cur.fetchall()}
+
+def _score_in_batches(scorer, headlines: list) -> list:
+    """
+    Bewertet die Headlines in Batches von SENTIMENT_BATCH_SIZE, mehrere Batches parallel.
+    Schlägt ein Batch fehl, sind dessen Scores None.
+    """
+    batches = [headlines[i:i + SENTIMENT_BATCH_SIZE] for i in range(0, len(headlines), SENTIMENT_BATCH_SIZE)]
+
+    def score(batch):
+        try:
+            with metrics.timer("external_api_seconds", api=scorer.name):
+                values = scorer.score_batch(batch)
+            return [max(-1.0, min(1.0, round(value, 2))) for value in values]
+        except Exception as e:
+            metrics.inc("errors_total", source="sentiment")
+            print(f"Fehler beim Bewerten eines Sentiment-Batches ({len(batch)} Headlines): {e}")
+            return [None] * len(batch)
+
+    with ThreadPoolExecutor(max_workers=min(COLLECTION_MAX_WORKERS, len(batches))) as executor:
+        return [value for batch_scores in executor.map(score, batches) for value in batch_scores]
+
+def score_headlines(headlines: list, scorer=None) -> list:
+    """
+    Liefert Sentiment-Scores für die Headlines in Eingabereihenfolge (None, falls nicht bewertbar).
+    Reihenfolge der Quellen: In-Process-LRU, dann 'sentiment_cache' in Postgres, erst dann der Scorer.
+    Neu bewertete Headlines werden in beiden Caches abgelegt, identische Headlines also nie zweimal bewertet.
+    """
+    scorer = scorer or get_scorer()
+    hashes = [headline_hash(headline) for headline in headlines]
+    scores = {}
+
+    for content_hash in hashes:
+        cached = _lru.get((scorer.name, content_hash))
+        if cached is not None:
+            scores[content_hash] = cached
+
+    missing = [content_hash for content_hash in dict.fromkeys(hashes) if content_hash not in scores]
+    metrics.inc("cache_lookups_total", len(hashes) - len(missing), cache="sentiment_lru", result="hit")
+    metrics.inc("cache_lookups_total", len(missing), cache="sentiment_lru", result="miss")
+    if missing:
+        try:
+            db_scores = _load_cached_scores(scorer.name, missing)
+            metrics.inc("cache_lookups_total", len(db_scores), cache="sentiment_db", result="hit")
+            metrics.inc("cache_lookups_total", len(missing) - len(db_scores), cache="sentiment_db", result="miss")
+            for content_hash, score in db_scores.items():
+                scores[content_hash] = score
+                _lru.put((scorer.name, content_hash), score)
+        except DatabaseError as e:
+            metrics.inc("errors_total", source="sentiment")
+            print(f"Datenbankfehler beim Lesen des Sentiment-Caches: {e}")
+
+    # Jede fehlende Headline genau einmal bewerten
+    to_score = {}
+    for content_hash, headline in zip(hashes, headlines):
+        if content_hash not in scores and content_hash not in to_score:
+            to_score[content_hash] = headline
+
+    if to_score:
+        new_scores = _score_in_batches(scorer, list(to_score.values()))
+        now = datetime.now(timezone.utc)
+        rows = []
+        for (content_hash, headline), score in zip(to_score.items(), new_scores):
+            if score is None:
+                continue
+            scores[content_hash] = score
+            _lru.put((scorer.name, content_hash), score)
+            rows.append((content_hash, scorer.name, headline, score, now))
+        try:
+            with cursor() as cur:
+                bulk_insert(
+                    cur, "sentiment_cache",
+                    ["content_hash", "scorer", "headline", "sentiment_score", "created_at"],
+                    rows,
+                    conflict_columns=["content_hash", "scorer"]
+                )
+        except DatabaseError as e:
+            metrics.inc("errors_total", source="sentiment")
+            print(f"Datenbankfehler beim Schreiben des Sentiment-Caches: {e}")
+        print(f"Sentiment: {len(headlines) - len(to_score)} Headlines aus dem Cache, {len(rows)} neu bewertet.")
+
+    return [scores.get(content_hash) for content_hash in hashes]
@@ -0,0 +1,132 @@
+import atexit
+import multiprocessing
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+import candle_cache
+from collectors import collect_market_data
+from signal_engine import generate_signals
+from storage import close_pool
+from config import ASSETS_TO_TRACK, SHARD_COUNT, DB_BACKEND, SQLITE_PATH
+
+# Ein Worker-Prozess pro Shard, der über Zyklen hinweg bestehen bleibt: Kerzen-Cache, ccxt-Clients und
+# Connection-Pool eines Workers gehören damit immer zu denselben Assets. Die Worker werden per "spawn"
+# gestartet und übernehmen so weder Verbindungen noch Threads oder Locks des Koordinators.
+_workers = {}
+_workers_lock = threading.Lock()
+
+def shard_for(asset: str, shard_count: int = SHARD_COUNT) -> int:
+    """
+    Shard eines Assets. Hängt nur vom Symbol ab, damit ein Asset auch bei geändertem Universum im selben Shard bleibt.
+    """
+    return zlib.crc32(asset.encode()) % shard_count
+
+def shard_assets(assets: list, shard_count: int = SHARD_COUNT) -> list:
+    """
+    Teilt die Assets auf shard_count Listen auf (Reihenfolge innerhalb eines Shards bleibt erhalten).
+    """
+    shards = [[] for _ in range(shard_count)]
+    for asset in dict.fromkeys(assets):
+        shards[shard_for(asset, shard_count)].append(asset)
+    return shards
+
+def _init_worker():
+    atexit.register(close_pool)
+
+def _get_worker(shard: int) -> ProcessPoolExecutor:
+    with _workers_lock:
+        worker = _workers.get(shard)
+        if worker is None:
+            worker = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+            )
+            _workers[shard] = worker
+        return worker
+
+def _discard_worker(shard: int):
+    with _workers_lock:
+        worker = _workers.pop(shard, None)
+    if worker is not None:
+        worker.shutdown(wait=False, cancel_futures=True)
+
+def _run_task(task, shard: int, assets: list) -> dict:
+    """
+    Läuft im Worker-Prozess: führt task(assets) aus und liefert das Ergebnis samt Dauer und
+    den dabei angefallenen Kennzahlen des Workers.
+    """
+    before = metrics.snapshot()
+    started = time.perf_counter()
+    result = task(assets)
+    return {
+        "shard": shard,
+        "assets": len(assets),
+        "result": result,
+        "seconds": time.perf_counter() - started,
+        "metrics": metrics.diff(before, metrics.snapshot()),
+    }
+
+def run_sharded(task, assets: list, shard_count: int = SHARD_COUNT) -> list:
+    """
+    Führt task(assets des Shards) in allen Shards gleichzeitig aus, jeweils im Worker-Prozess des Shards.
+    task muss eine Funktion auf Modulebene sein (sie wird per pickle übergeben). Die Kennzahlen der Worker
+    werden in die des Koordinators übernommen. Liefert pro erfolgreichem Shard ein dict mit shard, assets,
+    result und seconds; ein fehlgeschlagener Shard wird gezählt und übersprungen, ein abgestürzter Worker
+    beim nächsten Aufruf neu gestartet.
+    """
+    if DB_BACKEND == "sqlite" and SQLITE_PATH == ":memory:":
+        # Jeder Worker hätte seine eigene, leere Datenbank
+        raise RuntimeError("Sharding benötigt eine gemeinsame Datenbank, SQLITE_PATH = ':memory:' geht nur mit SHARD_COUNT = 1.")
+    futures = {
+        shard: _get_worker(shard).submit(_run_task, task, shard, shard_assets_)
+        for shard, shard_assets_ in enumerate(shard_assets(assets, shard_count))
+        if shard_assets_
+    }
+    results = []
+    for shard, future in futures.items():
+        try:
+            outcome = future.result()
+        except BrokenProcessPool as e:
+            metrics.inc("errors_total", source="shard")
+            print(f"Worker von Shard {shard} abgestürzt, wird neu gestartet: {e}")
+            _discard_worker(shard)
+            continue
+        except Exception as e:
+            metrics.inc("errors_total", source="shard")
+            print(f"Fehler in Shard {shard} ({task.__name__}): {e}")
+            continue
+        metrics.merge(outcome.pop("metrics"))
+        print(f"Shard {shard}: {task.__name__} für {outcome['assets']} Assets in {outcome['seconds']:.2f}s, Ergebnis: {outcome['result']}")
+        results.append(outcome)
+    return results
+
+def collect_market_sharded(assets: list = None) -> int:
+    """
+    collect_market_data in allen Shards; liefert die Summe der neu gespeicherten Kerzen.
+    """
+    return sum(outcome["result"] for outcome in run_sharded(collect_market_data, assets or ASSETS_TO_TRACK))
+
+def generate_signals_sharded(assets: list = None) -> int:
+    """
+    generate_signals in allen Shards; liefert die Summe der neu generierten Signale.
+    """
+    return sum(outcome["result"] for outcome in run_sharded(generate_signals, assets or ASSETS_TO_TRACK))
+
+def warm_sharded(assets: list = None):
+    """
+    Startet die Worker und lädt ihre Kerzen-Caches, damit der erste Zyklus nicht darauf wartet.
+    """
+    run_sharded(candle_cache.warm, assets or ASSETS_TO_TRACK)
+
+def close_workers():
+    """
+    Beendet alle Worker-Prozesse; jeder schließt dabei seinen Connection-Pool.
+    """
+    with _workers_lock:
+        workers = list(_workers.values())
+        _workers.clear()
+    for worker in workers:
+        worker.shutdown(wait=True)
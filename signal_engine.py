@@ -1,203 +1,310 @@
-import psycopg2
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
 
-from config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, ASSETS_TO_TRACK, TIMEFRAME
+import metrics
+from storage import DatabaseError, bulk_insert, connection
+from candle_cache import CLOSE, recent_candles
+from timeframes import ms_to_datetime
+from indicators import load_rsi_states, save_rsi_states, update_rsi_state, latest_indicators
+from onchain_activity import load_wallet_activity
+from config import (
+    ASSETS_TO_TRACK, TIMEFRAME, SIGNAL_TIMEFRAMES, SCORING_CANDLE_WINDOW, RSI_OVERSOLD, RSI_OVERBOUGHT,
+    CONFIDENCE_WEIGHTS, INDICATOR_WEIGHTS, SIGNAL_THRESHOLD, TAKE_PROFIT_PCT, STOP_LOSS_PCT,
+    ONCHAIN_MAX_CONFIDENCE, ONCHAIN_FULL_CONFIDENCE_ETH
+)
 
-def get_db_connection():
+def tech_confidence_from_rsi(rsi, oversold: float = RSI_OVERSOLD, overbought: float = RSI_OVERBOUGHT):
     """
-    Stellt eine Verbindung zur PostgreSQL-Datenbank her.
+    Konvertiert den RSI in eine technische Konfidenz zwischen -1 und 1.
+    RSI 50 -> 0, RSI 20 -> ca. 0.47 (starker Kauf), RSI 80 -> ca. -0.47 (starker Verkauf).
+    Funktioniert für Skalare und NumPy-Arrays (Backtest).
     """
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
+    rsi_values = np.asarray(rsi, dtype=float)
+    confidence = np.select(
+        [rsi_values < oversold, rsi_values > overbought],
+        [
+            (oversold - rsi_values) / oversold * 0.8 + 0.2, # Oversold, strong buy signal; 0.2 is base for strong signal
+            (overbought - rsi_values) / (100 - overbought) * 0.8 - 0.2 # Overbought, strong sell signal
+        ],
+        default=(50 - rsi_values) / 50.0 * 0.5 # Neutral range, smaller impact
     )
+    return float(confidence) if confidence.ndim == 0 else confidence
 
-def calculate_rsi(prices: pd.Series, period: int = 14) -> float:
+# Indikatoren aus latest_indicators(), die jede Konfidenz außer dem RSI benötigt
+CONFIDENCE_INPUTS = {
+    "macd": ["macd_hist", "atr"],
+    "bollinger": ["bb_percent"],
+    "volume": ["volume_z", "close_change"],
+}
+
+def indicator_confidences(latest: dict, rsi, names=None) -> dict:
     """
-    Berechnet den Relative Strength Index (RSI).
+    Richtungs-Konfidenz (-1 bis 1, positiv = Kauf) je Indikator und Asset aus latest_indicators().
+    rsi kommt aus den inkrementellen RSI-Zuständen (gesamte Historie), die übrigen aus dem Kerzenfenster.
+    ATR hat keine Richtung und dient als Maßstab für das MACD-Histogramm. NaN = zu wenige Kerzen.
+    Mit names nur diese Konfidenzen; latest braucht dann nur deren CONFIDENCE_INPUTS.
     """
-    delta = prices.diff()
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
+    wanted = set(["rsi", *CONFIDENCE_INPUTS] if names is None else names)
+    confidences = {}
+    if "rsi" in wanted:
+        confidences["rsi"] = np.atleast_1d(tech_confidence_from_rsi(np.asarray(rsi, dtype=float)))
+    if "macd" in wanted:
+        # Momentum: Histogramm über/unter der Signallinie
+        with np.errstate(divide="ignore", invalid="ignore"):
+            confidences["macd"] = np.tanh(np.where(latest["atr"] > 0, latest["macd_hist"] / latest["atr"], np.nan))
+    if "bollinger" in wanted:
+        confidences["bollinger"] = np.clip(1 - 2 * latest["bb_percent"], -1.0, 1.0) # am unteren Band 1, am oberen -1
+    if "volume" in wanted:
+        # ungewöhnliches Volumen in Kursrichtung
+        confidences["volume"] = np.tanh(latest["volume_z"] / 2) * np.sign(latest["close_change"])
+    return confidences
 
-    avg_gain = gain.rolling(window=period, min_periods=1).mean()
-    avg_loss = loss.rolling(window=period, min_periods=1).mean()
+def technical_confidence(confidences: dict, weights: dict = INDICATOR_WEIGHTS) -> np.ndarray:
+    """
+    Gewichtetes Mittel der Indikator-Konfidenzen pro Asset. Indikatoren ohne Wert zählen für dieses
+    Asset nicht mit; ohne jeden Wert ist die technische Konfidenz 0.
+    Mit den Standardgewichten (nur RSI) entspricht das tech_confidence_from_rsi.
+    """
+    unknown = set(weights) - set(confidences)
+    if unknown:
+        raise ValueError(f"Unbekannte Indikatoren in INDICATOR_WEIGHTS: {sorted(unknown)}")
+    size = len(next(iter(confidences.values())))
+    total = np.zeros(size)
+    weight_sum = np.zeros(size)
+    for name, weight in weights.items():
+        if not weight:
+            continue
+        valid = np.isfinite(confidences[name])
+        total += np.where(valid, confidences[name] * weight, 0.0)
+        weight_sum += np.where(valid, weight, 0.0)
+    return np.divide(total, weight_sum, out=np.zeros(size), where=weight_sum > 0)
 
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi.iloc[-1] if not rsi.empty else 50.0 # Return last RSI, default to 50 if no data
+def onchain_confidence_from_activity(buy_count, inflow_eth=None, full_confidence_eth: float = ONCHAIN_FULL_CONFIDENCE_ETH):
+    """
+    On-Chain-Konfidenz aus Anzahl und Volumen der Käufe überwachter Wallets im 24h-Fenster.
+    Die Konfidenz wächst logarithmisch mit dem Volumen und erreicht ONCHAIN_MAX_CONFIDENCE bei
+    full_confidence_eth. Ohne Volumen (oder full_confidence_eth=None) gilt die feste Stufe bei mindestens einem Kauf.
+    Funktioniert für Skalare und NumPy-Arrays (Backtest).
+    """
+    active = np.asarray(buy_count) > 0
+    if inflow_eth is None or not full_confidence_eth:
+        confidence = np.where(active, ONCHAIN_MAX_CONFIDENCE, 0.0)
+    else:
+        volume = np.maximum(np.asarray(inflow_eth, dtype=float), 0.0)
+        scale = np.minimum(np.log1p(volume) / np.log1p(full_confidence_eth), 1.0)
+        confidence = np.where(active, ONCHAIN_MAX_CONFIDENCE * scale, 0.0)
+    return float(confidence) if confidence.ndim == 0 else confidence
 
-def calculate_confidence_scores(asset: str) -> dict:
+def combine_confidence(confidence_tech, confidence_sentiment, confidence_onchain, weights: dict = CONFIDENCE_WEIGHTS):
     """
-    Berechnet technische, Sentiment- und On-Chain-Konfidenz-Scores für ein gegebenes Asset.
+    Gewichtete Gesamtkonfidenz, auf zwei Nachkommastellen gerundet.
+    Funktioniert für Skalare und NumPy-Arrays (Backtest).
+    """
+    confidence_total = np.round(
+        (np.asarray(confidence_tech) * weights["tech"]) +
+        (np.asarray(confidence_sentiment) * weights["sentiment"]) +
+        (np.asarray(confidence_onchain) * weights["onchain"]),
+        2
+    )
+    return float(confidence_total) if confidence_total.ndim == 0 else confidence_total
+
+def _close_series(candles: dict) -> dict:
+    """
+    Wandelt Kerzen aus dem Kerzen-Cache ({asset: (Zeitstempel in ms, OHLCV-Array)}) in pro Asset
+    chronologisch sortierte Listen von (timestamp, close) für die RSI-Zustände um.
+    """
+    closes = {}
+    for asset, (timestamps_ms, values) in candles.items():
+        closes[asset] = [
+            (ms_to_datetime(int(timestamp_ms)), float(close))
+            for timestamp_ms, close in zip(timestamps_ms, values[CLOSE])
+        ]
+    return closes
+
+def _advance_rsi_states(cur, assets: list, recent_candles: dict, timeframe: str = TIMEFRAME) -> dict:
+    """
+    Führt die RSI-Zustände aller Assets mit den neuen Kerzen aus dem Abfragefenster fort und
+    speichert sie gesammelt. Nur wenn ein Zustand fehlt oder die Lücke größer als das Fenster ist,
+    wird für dieses Asset die Historie nachgeladen (update_rsi_state).
+    """
+    states = load_rsi_states(cur, assets, timeframe)
+    changed = []
+    for asset in assets:
+        candles = recent_candles[asset]
+        state = states.get(asset)
+        if not candles:
+            continue
+        if state is None or state.last_timestamp is None or candles[0][0] > state.last_timestamp:
+            states[asset] = update_rsi_state(cur, asset, timeframe)
+            continue
+        new_candles = [(timestamp, close) for timestamp, close in candles if timestamp > state.last_timestamp]
+        for timestamp, close in new_candles:
+            state.update(timestamp, close)
+        if new_candles:
+            changed.append(state)
+    save_rsi_states(cur, changed)
+    return states
+
+def calculate_confidence_scores_batch(assets: list, conn=None, timeframe: str = TIMEFRAME) -> dict:
+    """
+    Berechnet technische, Sentiment- und On-Chain-Konfidenz-Scores für alle Assets auf einmal.
+    Die technische Konfidenz bezieht sich auf die Kerzen des angegebenen Timeframes.
+    Die Anzahl der Abfragen ist unabhängig von der Anzahl der Assets: die Kerzen kommen aus dem Kerzen-Cache,
+    ein Query für die RSI-Zustände und je ein Aggregat für Sentiment und On-Chain, die für alle Assets gelten.
+    Die technische Konfidenz kombiniert die Indikatoren nach INDICATOR_WEIGHTS (siehe technical_confidence).
+    Liefert {asset: {confidence_tech, confidence_sentiment, confidence_onchain, triggering_factors, latest_close}}.
+    Fehler werden nur bei eigener Verbindung abgefangen (Scores bleiben dann 0); mit übergebener conn gehen sie
+    an den Aufrufer, da dessen Transaktion nach einem fehlgeschlagenen Statement nicht weiterverwendet werden kann.
     """
-    conn = None
-    confidence_tech = 0.0
-    confidence_sentiment = 0.0
-    confidence_onchain = 0.0
-    triggering_factors = {}
+    assets = list(assets)
+    owns_connection = conn is None
+    results = {
+        asset: {
+            "confidence_tech": 0.0,
+            "confidence_sentiment": 0.0,
+            "confidence_onchain": 0.0,
+            "triggering_factors": {},
+            "latest_close": None
+        }
+        for asset in assets
+    }
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # 1. Technische Konfidenz (RSI)
-        cur.execute(
-            """
-            SELECT close FROM market_data
-            WHERE asset = %s AND timeframe = %s
-            ORDER BY timestamp DESC
-            LIMIT 100; -- Genug Daten für RSI-Berechnung
-            """,
-            (asset, TIMEFRAME)
-        )
-        market_data = cur.fetchall()
-        if market_data:
-            prices = pd.Series([d[0] for d in reversed(market_data)]) # Need to reverse for chronological order
-            rsi = calculate_rsi(prices)
-            # Konvertiere RSI auf eine Skala von 0 bis 1
-            # RSI 50 -> 0
-            # RSI 20 -> 0.6 (starker Kauf)
-            # RSI 80 -> -0.6 (starker Verkauf)
-            confidence_tech = (50 - rsi) / 50.0 # Scale from -1 to 1, then adjust
-            if rsi < 30: # Oversold, strong buy signal
-                confidence_tech = (30 - rsi) / 30.0 * 0.8 + 0.2 # Scale 0-1, 0.2 is base for strong signal
-            elif rsi > 70: # Overbought, strong sell signal
-                confidence_tech = (70 - rsi) / 30.0 * 0.8 - 0.2 # Scale -1-0, -0.2 is base for strong signal
-            else:
-                confidence_tech = (50 - rsi) / 50.0 * 0.5 # Neutral range, smaller impact
-            triggering_factors['rsi'] = rsi
-
-        # 2. Sentiment Konfidenz (Durchschnitt der letzten 3 Stunden)
-        three_hours_ago = datetime.utcnow() - timedelta(hours=3)
-        cur.execute(
-            """
-            SELECT sentiment_score FROM sentiment_data
-            WHERE timestamp_utc >= %s
-            ORDER BY timestamp_utc DESC;
-            """,
-            (three_hours_ago,)
-        )
-        sentiment_data = cur.fetchall()
-        if sentiment_data:
-            sentiment_scores = [s[0] for s in sentiment_data]
-            confidence_sentiment = float(np.mean(sentiment_scores)) # Already between -1 and 1
-            triggering_factors['sentiment_avg_3h'] = confidence_sentiment
-
-        # 3. On-Chain Konfidenz (Käufe von überwachten Wallets in den letzten 24 Stunden)
-        twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
-        cur.execute(
-            """
-            SELECT COUNT(*) FROM onchain_transactions
-            WHERE timestamp_utc >= %s AND to_address IN (
-                SELECT wallet_monitored FROM onchain_transactions WHERE wallet_monitored IS NOT NULL GROUP BY wallet_monitored
-            ) AND value_eth > 0; -- Annahme: Kauf bedeutet Wert > 0
-            """,
-            (twenty_four_hours_ago,)
-        )
-        onchain_count = cur.fetchone()[0]
-        if onchain_count > 0:
-            confidence_onchain = 0.8
-            triggering_factors['onchain_activity'] = 'significant_buy_activity'
-        else:
-            confidence_onchain = 0.0
-            triggering_factors['onchain_activity'] = 'no_significant_buy_activity'
-
-    except psycopg2.Error as e:
-        print(f"Datenbankfehler beim Berechnen der Konfidenz-Scores für {asset}: {e}")
+        with connection(conn) as conn, conn.cursor() as cur:
+            # 1. Technische Konfidenz: RSI aus dem inkrementell fortgeführten Wilder-Zustand, die übrigen
+            #    Indikatoren in einem Durchlauf über die (Assets x Zeit)-Matrix des Kerzenfensters
+            candles = recent_candles(cur, assets, timeframe, SCORING_CANDLE_WINDOW)
+            closes = _close_series(candles)
+            states = _advance_rsi_states(cur, assets, closes, timeframe)
+            rsi = [states[asset].rsi if asset in states and states[asset].rsi is not None else np.nan for asset in assets]
+            latest = latest_indicators(candles, assets)
+            confidences = indicator_confidences(latest, rsi)
+            confidence_tech = technical_confidence(confidences)
+            for index, asset in enumerate(assets):
+                if closes[asset]:
+                    results[asset]["latest_close"] = closes[asset][-1][1]
+                results[asset]["confidence_tech"] = float(confidence_tech[index])
+                if np.isfinite(rsi[index]):
+                    results[asset]["triggering_factors"]['rsi'] = rsi[index]
+                for name, weight in INDICATOR_WEIGHTS.items():
+                    if weight and name != "rsi" and np.isfinite(confidences[name][index]):
+                        results[asset]["triggering_factors"][name] = float(confidences[name][index])
+
+            # 2. Sentiment Konfidenz (Durchschnitt der letzten 3 Stunden, gilt für alle Assets)
+            three_hours_ago = datetime.utcnow() - timedelta(hours=3)
+            cur.execute(
+                """
+                SELECT AVG(sentiment_score), COUNT(*) FROM sentiment_data
+                WHERE timestamp_utc >= %s;
+                """,
+                (three_hours_ago,)
+            )
+            sentiment_avg, sentiment_count = cur.fetchone()
+            if sentiment_count:
+                confidence_sentiment = float(sentiment_avg) # Already between -1 and 1
+                for asset in assets:
+                    results[asset]["confidence_sentiment"] = confidence_sentiment
+                    results[asset]["triggering_factors"]['sentiment_avg_3h'] = confidence_sentiment
+
+            # 3. On-Chain Konfidenz (Käufe überwachter Wallets in den letzten 24 Stunden aus dem
+            #    Stunden-Aggregat, ca. 24 Zeilen pro Wallet; gilt für alle Assets)
+            onchain_count, onchain_volume = load_wallet_activity(cur, hours=24)
+            confidence_onchain = onchain_confidence_from_activity(onchain_count, onchain_volume)
+            onchain_activity = 'significant_buy_activity' if onchain_count > 0 else 'no_significant_buy_activity'
+            for asset in assets:
+                results[asset]["confidence_onchain"] = confidence_onchain
+                results[asset]["triggering_factors"]['onchain_activity'] = onchain_activity
+                results[asset]["triggering_factors"]['onchain_inflows_24h'] = onchain_count
+                results[asset]["triggering_factors"]['onchain_inflow_eth_24h'] = onchain_volume
+
+    except DatabaseError as e:
+        if not owns_connection:
+            raise
+        metrics.inc("errors_total", source="signals")
+        print(f"Datenbankfehler beim Berechnen der Konfidenz-Scores: {e}")
     except Exception as e:
-        print(f"Fehler beim Berechnen der Konfidenz-Scores für {asset}: {e}")
-    finally:
-        if conn:
-            conn.close()
-
-    return {
-        "confidence_tech": round(confidence_tech, 2),
-        "confidence_sentiment": round(confidence_sentiment, 2),
-        "confidence_onchain": round(confidence_onchain, 2),
-        "triggering_factors": triggering_factors
-    }
+        if not owns_connection:
+            raise
+        metrics.inc("errors_total", source="signals")
+        print(f"Fehler beim Berechnen der Konfidenz-Scores: {e}")
+
+    for scores in results.values():
+        for key in ("confidence_tech", "confidence_sentiment", "confidence_onchain"):
+            scores[key] = round(scores[key], 2)
+    return results
+
+def calculate_confidence_scores(asset: str, conn=None, timeframe: str = TIMEFRAME) -> dict:
+    """
+    Berechnet technische, Sentiment- und On-Chain-Konfidenz-Scores für ein gegebenes Asset.
+    Eine bereits offene Verbindung (z.B. aus generate_signals) kann übergeben werden.
+    """
+    return calculate_confidence_scores_batch([asset], conn, timeframe)[asset]
 
-def generate_signals():
+def generate_signals(assets: list = None, timeframes: list = None):
     """
     Generiert Handelssignale basierend auf den Konfidenz-Scores und speichert sie.
+    Ohne assets werden alle ASSETS_TO_TRACK bewertet, im Streaming-Modus nur die Assets mit gerade geschlossener Kerze.
+    Jedes Asset wird in allen SIGNAL_TIMEFRAMES (oder den angegebenen timeframes) bewertet, die Kerzen
+    dafür stammen aus der lokalen Ableitung (siehe collectors.resample_market_asset).
     """
-    conn = None
+    assets = list(assets or ASSETS_TO_TRACK)
+    timeframes = list(timeframes or SIGNAL_TIMEFRAMES)
     generated_signal_count = 0
+    signal_rows = []
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        for asset in ASSETS_TO_TRACK:
-            print(f"Generiere Signale für {asset}...")
-            scores = calculate_confidence_scores(asset)
-            confidence_tech = scores["confidence_tech"]
-            confidence_sentiment = scores["confidence_sentiment"]
-            confidence_onchain = scores["confidence_onchain"]
-            triggering_factors = scores["triggering_factors"]
-
-            # Algorithmus für Gesamtsignal
-            confidence_total = (
-                (confidence_tech * 0.4) +
-                (confidence_sentiment * 0.3) +
-                (confidence_onchain * 0.3)
+        with connection() as conn, conn.cursor() as cur:
+            for timeframe in timeframes:
+                all_scores = calculate_confidence_scores_batch(assets, conn, timeframe)
+                for asset in assets:
+                    print(f"Generiere Signale für {asset} ({timeframe})...")
+                    scores = all_scores[asset]
+                    confidence_tech = scores["confidence_tech"]
+                    confidence_sentiment = scores["confidence_sentiment"]
+                    confidence_onchain = scores["confidence_onchain"]
+                    triggering_factors = scores["triggering_factors"]
+
+                    # Algorithmus für Gesamtsignal
+                    confidence_total = combine_confidence(confidence_tech, confidence_sentiment, confidence_onchain)
+
+                    # Signal-Generierung
+                    if confidence_total > SIGNAL_THRESHOLD:
+                        signal_type = 'BUY'
+                        # Der aktuelle Preis für den Entry Price kommt aus dem Kerzenfenster der Score-Berechnung
+                        entry_price = scores["latest_close"]
+                        if entry_price is not None:
+                            take_profit_target = entry_price * (1 + TAKE_PROFIT_PCT)
+                            stop_loss_target = entry_price * (1 - STOP_LOSS_PCT)
+
+                            signal_rows.append((
+                                datetime.utcnow(), asset, timeframe, signal_type, entry_price, confidence_total,
+                                confidence_tech, confidence_sentiment, confidence_onchain,
+                                json.dumps(triggering_factors), take_profit_target, stop_loss_target
+                            ))
+                            print(f"BUY-Signal für {asset} ({timeframe}) generiert! Gesamtkondifenz: {confidence_total}")
+                        else:
+                            print(f"Keine aktuellen Marktdaten für {asset} ({timeframe}) gefunden, kann kein Signal generieren.")
+                    else:
+                        print(f"Kein BUY-Signal für {asset} ({timeframe}) generiert. Gesamtkondifenz: {confidence_total}")
+
+            # Alle Signale des Zyklus in einem Roundtrip schreiben
+            result = bulk_insert(
+                cur, "generated_signals",
+                [
+                    "timestamp_utc", "asset", "timeframe", "signal_type", "entry_price", "confidence_total",
+                    "confidence_tech", "confidence_sentiment", "confidence_onchain",
+                    "triggering_factors", "take_profit_target", "stop_loss_target"
+                ],
+                signal_rows
             )
-            confidence_total = round(confidence_total, 2)
-
-            # Signal-Generierung
-            if confidence_total > 0.75:
-                signal_type = 'BUY'
-                # Hole den aktuellen Preis für den Entry Price
-                cur.execute(
-                    """
-                    SELECT close FROM market_data
-                    WHERE asset = %s AND timeframe = %s
-                    ORDER BY timestamp DESC
-                    LIMIT 1;
-                    """,
-                    (asset, TIMEFRAME)
-                )
-                latest_price_row = cur.fetchone()
-                if latest_price_row:
-                    entry_price = latest_price_row[0]
-                    take_profit_target = entry_price * 1.05
-                    stop_loss_target = entry_price * 0.975
-
-                    cur.execute(
-                        """
-                        INSERT INTO generated_signals (
-                            timestamp_utc, asset, signal_type, entry_price, confidence_total,
-                            confidence_tech, confidence_sentiment, confidence_onchain,
-                            triggering_factors, take_profit_target, stop_loss_target
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-                        """,
-                        (
-                            datetime.utcnow(), asset, signal_type, entry_price, confidence_total,
-                            confidence_tech, confidence_sentiment, confidence_onchain,
-                            json.dumps(triggering_factors), take_profit_target, stop_loss_target
-                        )
-                    )
-                    conn.commit()
-                    generated_signal_count += 1
-                    print(f"BUY-Signal für {asset} generiert! Gesamtkondifenz: {confidence_total}")
-                else:
-                    print(f"Keine aktuellen Marktdaten für {asset} gefunden, kann kein Signal generieren.")
-            else:
-                print(f"Kein BUY-Signal für {asset} generiert. Gesamtkondifenz: {confidence_total}")
-
-    except psycopg2.Error as e:
+            generated_signal_count = result.inserted
+
+    except DatabaseError as e:
+        metrics.inc("errors_total", source="signals")
         print(f"Datenbankfehler beim Generieren der Signale: {e}")
     except Exception as e:
+        metrics.inc("errors_total", source="signals")
         print(f"Fehler beim Generieren der Signale: {e}")
-    finally:
-        if conn:
-            conn.close()
     return generated_signal_count
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta, timezone
+
+from storage import bulk_upsert
+from timeframes import floor_datetime
+from config import TIMEFRAME, PERFORMANCE_PERIOD
+
+OUTCOME_TABLE_COLUMNS = [
+    "signal_id", "asset", "timeframe", "signal_time", "entry_price", "take_profit_target", "stop_loss_target",
+    "status", "evaluated_until", "exit_time", "exit_price", "pnl", "updated_at",
+]
+PERFORMANCE_COLUMNS = ["asset", "timeframe", "period", "closed_trades", "winning_trades", "total_profit", "total_loss"]
+
+# pandas wird erst in den Funktionen geladen, damit db_setup (Migration 5) ohne pandas auskommt
+SQL_OUTCOME_TABLES = """
+-- Bewertungsstand pro Signal; nur 'no_data'- und 'open'-Signale werden in späteren Zyklen fortgeschrieben
+CREATE TABLE IF NOT EXISTS signal_outcomes (
+    signal_id           BIGINT            PRIMARY KEY,
+    asset               TEXT              NOT NULL,
+    timeframe           TEXT              NOT NULL,
+    signal_time         TIMESTAMPTZ       NOT NULL,
+    entry_price         DOUBLE PRECISION  NOT NULL,
+    take_profit_target  DOUBLE PRECISION,
+    stop_loss_target    DOUBLE PRECISION,
+    status              TEXT              NOT NULL, -- 'no_data', 'open', 'tp', 'sl'
+    evaluated_until     TIMESTAMPTZ, -- letzte bereits bewertete Kerze
+    exit_time           TIMESTAMPTZ, -- bei 'open' die letzte Kerze (Bewertung zum Schlusskurs)
+    exit_price          DOUBLE PRECISION,
+    pnl                 DOUBLE PRECISION,
+    updated_at          TIMESTAMPTZ       NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_signal_outcomes_pending ON signal_outcomes (status) WHERE status IN ('no_data', 'open');
+CREATE INDEX IF NOT EXISTS idx_signal_outcomes_signal_time ON signal_outcomes (signal_time);
+
+-- Kennzahlen abgeschlossener Signale pro Asset, Timeframe und Periode (nach Exit-Zeit), beim Abschluss fortgeschrieben
+CREATE TABLE IF NOT EXISTS signal_performance (
+    asset               TEXT              NOT NULL,
+    timeframe           TEXT              NOT NULL,
+    period              TIMESTAMPTZ       NOT NULL,
+    closed_trades       BIGINT            NOT NULL,
+    winning_trades      BIGINT            NOT NULL,
+    total_profit        DOUBLE PRECISION  NOT NULL,
+    total_loss          DOUBLE PRECISION  NOT NULL,
+    PRIMARY KEY (asset, timeframe, period)
+);
+"""
+
+def register_new_signals(cur, lookback: timedelta = timedelta(days=1)) -> int:
+    """
+    Übernimmt neue Signale aus 'generated_signals' als 'no_data' in 'signal_outcomes'.
+    Gesucht wird nur ab dem jüngsten bereits übernommenen Signal abzüglich lookback, damit
+    auch Signale parallel laufender Prozesse mit etwas älterem Zeitstempel erfasst werden.
+    """
+    cur.execute("SELECT MAX(signal_time) FROM signal_outcomes;")
+    latest = cur.fetchone()[0]
+    since = latest - lookback if latest else datetime(1970, 1, 1, tzinfo=timezone.utc)
+    cur.execute(
+        """
+        INSERT INTO signal_outcomes (signal_id, asset, timeframe, signal_time, entry_price, take_profit_target,
+                                     stop_loss_target, status, updated_at)
+        SELECT g.signal_id, g.asset, COALESCE(g.timeframe, %s), g.timestamp_utc, g.entry_price, g.take_profit_target,
+               g.stop_loss_target, 'no_data', %s
+        FROM generated_signals g
+        WHERE g.timestamp_utc >= %s
+          AND NOT EXISTS (SELECT 1 FROM signal_outcomes o WHERE o.signal_id = g.signal_id);
+        """,
+        (TIMEFRAME, datetime.now(timezone.utc), since)
+    )
+    return cur.rowcount
+
+def load_pending_outcomes(cur) -> "pd.DataFrame":
+    """
+    Alle noch nicht abgeschlossenen Signale: ohne Kerze nach dem Signal ('no_data') oder weder TP noch SL erreicht ('open').
+    """
+    import pandas as pd
+    cur.execute(
+        f"""
+        SELECT {', '.join(OUTCOME_TABLE_COLUMNS)} FROM signal_outcomes
+        WHERE status IN ('no_data', 'open')
+        ORDER BY signal_time ASC;
+        """
+    )
+    return pd.DataFrame(cur.fetchall(), columns=OUTCOME_TABLE_COLUMNS)
+
+def save_outcomes(cur, updated: "pd.DataFrame") -> int:
+    """
+    Schreibt fortgeschriebene Signale und addiert neu abgeschlossene ('tp'/'sl') in 'signal_performance'.
+    Muss in einer Transaktion laufen, damit kein Abschluss doppelt oder gar nicht gezählt wird.
+    """
+    import pandas as pd
+    if updated.empty:
+        return 0
+    now = datetime.now(timezone.utc)
+    rows = [
+        tuple(None if pd.isna(value) else value for value in row) + (now,)
+        for row in updated[OUTCOME_TABLE_COLUMNS[:-1]].itertuples(index=False, name=None)
+    ]
+    bulk_upsert(
+        cur, "signal_outcomes", OUTCOME_TABLE_COLUMNS, rows, conflict_columns=["signal_id"],
+        update_columns=["status", "evaluated_until", "exit_time", "exit_price", "pnl", "updated_at"]
+    )
+
+    closed = updated[updated["status"].isin(["tp", "sl"])]
+    aggregates = {}
+    for asset, timeframe, exit_time, pnl in closed[["asset", "timeframe", "exit_time", "pnl"]].itertuples(index=False, name=None):
+        key = (asset, timeframe, floor_datetime(pd.Timestamp(exit_time).to_pydatetime(), PERFORMANCE_PERIOD))
+        trades, wins, profit, loss = aggregates.get(key, (0, 0, 0.0, 0.0))
+        aggregates[key] = (trades + 1, wins + int(pnl > 0), profit + max(pnl, 0.0), loss + max(-pnl, 0.0))
+    bulk_upsert(
+        cur, "signal_performance", PERFORMANCE_COLUMNS,
+        [key + values for key, values in aggregates.items()],
+        conflict_columns=["asset", "timeframe", "period"],
+        increment_columns=["closed_trades", "winning_trades", "total_profit", "total_loss"]
+    )
+    return len(rows)
+
+def load_performance(cur, group_by: list = ("asset",), since: datetime = None) -> "pd.DataFrame":
+    """
+    Kennzahlen der abgeschlossenen Signale aus 'signal_performance', gruppiert z.B. nach ["asset"],
+    ["period"] oder ["asset", "timeframe"]. Liest nur die Aggregat-Zeilen, nicht die einzelnen Signale.
+    """
+    import pandas as pd
+    group_by = list(group_by)
+    where = "WHERE period >= %s" if since else ""
+    cur.execute(
+        f"""
+        SELECT {''.join(column + ', ' for column in group_by)}SUM(closed_trades), SUM(winning_trades),
+               SUM(total_profit), SUM(total_loss)
+        FROM signal_performance
+        {where}
+        {'GROUP BY ' + ', '.join(group_by) if group_by else ''}
+        {'ORDER BY ' + ', '.join(group_by) if group_by else ''};
+        """,
+        (since,) if since else None
+    )
+    performance = pd.DataFrame(
+        cur.fetchall(), columns=group_by + ["closed_trades", "winning_trades", "total_profit", "total_loss"]
+    )
+    # SUM() über BIGINT liefert NUMERIC (Decimal); leere Aggregate (ohne GROUP BY) liefern NULL
+    performance = performance.dropna(subset=["closed_trades"])
+    performance = performance.astype({
+        "closed_trades": int, "winning_trades": int, "total_profit": float, "total_loss": float
+    })
+    trades = performance["closed_trades"]
+    performance["win_rate"] = (performance["winning_trades"] / trades.where(trades > 0) * 100).fillna(0.0)
+    performance["profit_factor"] = [
+        profit / loss if loss > 0 else float("inf")
+        for profit, loss in zip(performance["total_profit"], performance["total_loss"])
+    ]
+    return performance
@@ -0,0 +1,123 @@
+from collections import namedtuple
+from contextlib import contextmanager
+
+import metrics
+from config import DB_BACKEND
+
+# Backend nach DB_BACKEND: "postgres" (storage_postgres.py, Server aus DB_HOST/DB_NAME) oder "sqlite"
+# (storage_sqlite.py, eingebettet in SQLITE_PATH, ":memory:" für Läufe ganz im Speicher). Beide bieten
+# getconn/putconn/close_pool und execute_values; die Module schreiben ihre Abfragen im psycopg2-Format
+# und fangen DatabaseError, damit sie unverändert auf beiden Backends laufen.
+if DB_BACKEND == "postgres":
+    import storage_postgres as _backend
+elif DB_BACKEND == "sqlite":
+    import storage_sqlite as _backend
+else:
+    raise ValueError(f"Unbekanntes DB_BACKEND: {DB_BACKEND!r} (erwartet 'postgres' oder 'sqlite')")
+
+BACKEND = _backend.NAME
+DatabaseError = _backend.Error
+
+# Ergebnis eines Bulk-Inserts: wie viele Zeilen neu geschrieben und wie viele
+# per ON CONFLICT übersprungen wurden; 'returned' enthält bei bulk_insert(returning=...)
+# die angeforderten Spalten der tatsächlich neu geschriebenen Zeilen.
+InsertResult = namedtuple("InsertResult", ["inserted", "skipped", "returned"], defaults=((),))
+
+def close_pool():
+    """
+    Schließt alle Verbindungen des Backends (z.B. beim Beenden des Prozesses).
+    """
+    _backend.close_pool()
+
+@contextmanager
+def connection(conn=None):
+    """
+    Leiht eine Verbindung aus dem Pool. Der with-Block ist eine Transaktion:
+    commit bei Erfolg, rollback bei einer Exception.
+    Wird eine bestehende Verbindung übergeben, wird diese unverändert weitergereicht
+    und der Aufrufer bleibt für Commit und Rückgabe zuständig.
+    """
+    if conn is not None:
+        yield conn
+        return
+
+    conn = _backend.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        _backend.putconn(conn)
+
+@contextmanager
+def transaction(conn):
+    """
+    Eigener Transaktionsbereich auf einer bestehenden Verbindung, z.B. ein Commit pro Asset.
+    Liefert einen Cursor, der am Ende des Blocks geschlossen wird.
+    """
+    cur = conn.cursor()
+    try:
+        yield cur
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+@contextmanager
+def cursor():
+    """
+    Kurzform für eine einzelne Transaktion auf einer gepoolten Verbindung.
+    """
+    with connection() as conn:
+        with transaction(conn) as cur:
+            yield cur
+
+def bulk_insert(cur, table: str, columns: list, rows: list, conflict_columns: list = None, page_size: int = 1000, returning: list = None) -> InsertResult:
+    """
+    Schreibt viele Zeilen mit mehrzeiligen INSERTs (execute_values des Backends) statt einem Roundtrip pro Zeile.
+    Bereits vorhandene Zeilen werden per ON CONFLICT DO NOTHING übersprungen.
+    Mit returning (Spaltenliste) werden diese Spalten der neu geschriebenen Zeilen zurückgegeben.
+    """
+    rows = list(rows)
+    if not rows:
+        return InsertResult(0, 0)
+
+    if conflict_columns:
+        conflict_clause = f"ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING"
+    else:
+        conflict_clause = "ON CONFLICT DO NOTHING"
+
+    returning_clause = ", ".join(returning) if returning else "1"
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s {conflict_clause} RETURNING {returning_clause}"
+    inserted_rows = _backend.execute_values(cur, query, rows, page_size)
+    inserted = len(inserted_rows)
+    metrics.inc("db_rows_inserted_total", inserted, table=table)
+    return InsertResult(inserted, len(rows) - inserted, inserted_rows if returning else ())
+
+def bulk_upsert(cur, table: str, columns: list, rows: list, conflict_columns: list, update_columns: list = (), page_size: int = 1000, increment_columns: list = ()) -> int:
+    """
+    Wie bulk_insert, überschreibt bei Konflikten aber die update_columns mit den neuen Werten.
+    increment_columns werden bei Konflikten stattdessen aufaddiert (z.B. Zähler in Aggregat-Tabellen).
+    Gibt die Anzahl geschriebener Zeilen zurück. Jede Konfliktzeile darf nur einmal in rows vorkommen.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+
+    assignments = ", ".join(
+        [f"{column} = EXCLUDED.{column}" for column in update_columns] +
+        [f"{column} = {table}.{column} + EXCLUDED.{column}" for column in increment_columns]
+    )
+    query = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s "
+        f"ON CONFLICT ({', '.join(conflict_columns)}) DO UPDATE SET {assignments} RETURNING 1"
+    )
+    written = len(_backend.execute_values(cur, query, rows, page_size))
+    metrics.inc("db_rows_upserted_total", written, table=table)
+    return written
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values as _execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+import metrics
+from config import DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_POOL_MIN_CONNECTIONS, DB_POOL_MAX_CONNECTIONS
+
+# PostgreSQL-Backend von storage.py (DB_BACKEND = "postgres")
+NAME = "postgres"
+Error = psycopg2.Error
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool wirft bei Erschöpfung einen PoolError, statt zu warten.
+# Der Semaphor lässt parallele Threads blockieren, bis eine Verbindung frei wird.
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_CONNECTIONS)
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """
+    Cursor, der Anzahl und Dauer der Queries (nach Befehl: SELECT, INSERT, ...) sowie die
+    gelesenen Zeilen in metrics erfasst. Wird für alle Verbindungen des Pools verwendet.
+    """
+
+    def execute(self, query, vars=None):
+        statement = query.decode() if isinstance(query, bytes) else str(query)
+        command = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        except psycopg2.Error:
+            metrics.inc("db_query_errors_total", command=command)
+            raise
+        finally:
+            metrics.observe("db_query_seconds", time.perf_counter() - started, command=command)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            metrics.inc("db_rows_fetched_total")
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(size) if size is not None else super().fetchmany()
+        metrics.inc("db_rows_fetched_total", len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        metrics.inc("db_rows_fetched_total", len(rows))
+        return rows
+
+def get_pool() -> ThreadedConnectionPool:
+    """
+    Liefert den prozessweiten Connection-Pool und legt ihn beim ersten Aufruf an.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(
+                DB_POOL_MIN_CONNECTIONS,
+                DB_POOL_MAX_CONNECTIONS,
+                host=DB_HOST,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                cursor_factory=InstrumentedCursor
+            )
+        return _pool
+
+def getconn():
+    """
+    Leiht eine Verbindung aus dem Pool; wartet, solange alle DB_POOL_MAX_CONNECTIONS vergeben sind.
+    """
+    pool = get_pool()
+    _pool_slots.acquire()
+    try:
+        return pool.getconn()
+    except Exception:
+        _pool_slots.release()
+        raise
+
+def putconn(conn):
+    """
+    Gibt eine Verbindung an den Pool zurück; geschlossene (abgebrochene) Verbindungen werden verworfen.
+    """
+    try:
+        get_pool().putconn(conn, close=bool(conn.closed))
+    finally:
+        _pool_slots.release()
+
+def close_pool():
+    """
+    Schließt alle Verbindungen des Pools (z.B. beim Beenden des Prozesses).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+def execute_values(cur, query: str, rows: list, page_size: int) -> list:
+    """
+    Führt query ("... VALUES %s ...") mit mehrzeiligen VALUES-Listen aus und liefert die RETURNING-Zeilen aller Seiten.
+    """
+    # fetch=True sammelt die RETURNING-Zeilen aller Seiten, rowcount gilt nur für die letzte Seite
+    return _execute_values(cur, query, rows, page_size=page_size, fetch=True)
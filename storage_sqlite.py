@@ -0,0 +1,256 @@
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import metrics
+from config import SQLITE_PATH, DB_POOL_MAX_CONNECTIONS
+
+# Eingebettetes Backend von storage.py (DB_BACKEND = "sqlite"): dieselben Tabellen und Abfragen wie mit
+# PostgreSQL, ohne Server. Die Abfragen der Module (psycopg2-Format) werden hier übersetzt:
+# %s → ?, "= ANY(%s)" mit einer Liste → "IN (?, ...)", BIGSERIAL → INTEGER PRIMARY KEY (Rowid).
+# Zeitstempel werden als UTC-Text fester Breite gespeichert (Vergleiche und MAX() funktionieren
+# lexikographisch) und beim Lesen wieder zu datetime mit Zeitzone.
+NAME = "sqlite"
+Error = sqlite3.Error
+
+MEMORY_PATH = ":memory:"
+BUSY_TIMEOUT_SECONDS = 30 # Wartezeit auf die Schreibsperre einer anderen Verbindung
+# Höchstzahl gebundener Parameter pro Anweisung (SQLite ab 3.32)
+MAX_VARIABLES = 32766
+TIMESTAMP_LENGTH = len("2024-01-01 00:00:00.000000+00:00")
+
+_PLACEHOLDER = re.compile(r"=\s*ANY\(%s\)|%s|%%")
+_SERIAL = re.compile(r"\bBIGSERIAL(\s+PRIMARY\s+KEY)", re.IGNORECASE)
+
+_lock = threading.Lock()
+_idle = []
+_slots = threading.BoundedSemaphore(DB_POOL_MAX_CONNECTIONS)
+# Eine Datenbank im Speicher gehört zu genau einer Verbindung: alle Threads teilen sich diese nacheinander,
+# verschachtelte Aufrufe im selben Thread erhalten dieselbe Verbindung (und dieselbe Transaktion)
+_memory = None
+_memory_lock = threading.RLock()
+
+def _adapt(value):
+    if isinstance(value, datetime): # auch pandas.Timestamp; ohne Zeitzone gilt UTC
+        value = value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+        return value.isoformat(sep=" ", timespec="microseconds")
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _convert(value):
+    if value.__class__ is str and len(value) == TIMESTAMP_LENGTH and value[10] == " " and value.endswith("+00:00"):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+def _convert_row(row):
+    return tuple(_convert(value) for value in row)
+
+def translate(query: str, vars=None) -> tuple:
+    """
+    Übersetzt eine Abfrage mit psycopg2-Platzhaltern in (SQL, Parameter) für sqlite3.
+    """
+    if vars is None:
+        return query, ()
+    values = iter(vars)
+    params = []
+
+    def replace(match):
+        token = match.group()
+        if token == "%%":
+            return "%"
+        value = next(values)
+        if token == "%s":
+            params.append(_adapt(value))
+            return "?"
+        items = list(value)
+        params.extend(_adapt(item) for item in items)
+        return f"IN ({', '.join('?' * len(items))})"
+
+    return _PLACEHOLDER.sub(replace, query), params
+
+def split_script(script: str) -> list:
+    """
+    Zerlegt ein Skript aus mehreren Anweisungen (z.B. SQL_SCHEMA) in einzelne Anweisungen;
+    sqlite3 führt pro execute() nur eine aus.
+    """
+    statements = []
+    statement = ""
+    for part in script.split(";"):
+        statement += part + ";"
+        if sqlite3.complete_statement(statement):
+            if statement.strip(" \t\r\n;"):
+                statements.append(_SERIAL.sub(r"INTEGER\1", statement))
+            statement = ""
+    return statements
+
+class SQLiteCursor:
+    """
+    Cursor mit der Schnittstelle, die die Module vom psycopg2-Cursor nutzen (execute, fetch*, description,
+    rowcount, with-Block). Erfasst Queries und gelesene Zeilen wie storage_postgres.InstrumentedCursor.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def _run(self, command: str, statements: list):
+        started = time.perf_counter()
+        try:
+            for sql, params in statements:
+                self._cursor.execute(sql, params)
+        except sqlite3.Error:
+            metrics.inc("db_query_errors_total", command=command)
+            raise
+        finally:
+            metrics.observe("db_query_seconds", time.perf_counter() - started, command=command)
+
+    def execute(self, query, vars=None):
+        statement = str(query)
+        command = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        if vars is None and statement.count(";") > 1:
+            self._run(command, [(sql, ()) for sql in split_script(statement)])
+        else:
+            self._run(command, [translate(_SERIAL.sub(r"INTEGER\1", statement), vars)])
+
+    def execute_prepared(self, sql: str, params: list):
+        """
+        Führt bereits übersetztes SQL (Platzhalter ?) aus, siehe execute_values.
+        """
+        self._run(sql.lstrip().split(None, 1)[0].upper(), [(sql, params)])
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is None:
+            return None
+        metrics.inc("db_rows_fetched_total")
+        return _convert_row(row)
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        metrics.inc("db_rows_fetched_total", len(rows))
+        return [_convert_row(row) for row in rows]
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        metrics.inc("db_rows_fetched_total", len(rows))
+        return [_convert_row(row) for row in rows]
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class SQLiteConnection:
+    """
+    Verbindung mit der von storage.py genutzten Schnittstelle (cursor, commit, rollback, closed).
+    Transaktionen beginnen wie bei sqlite3 üblich implizit mit der ersten schreibenden Anweisung.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.closed = False
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+        self.closed = True
+
+def _connect() -> SQLiteConnection:
+    conn = sqlite3.connect(SQLITE_PATH, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+    if SQLITE_PATH != MEMORY_PATH:
+        # WAL: Leser blockieren Schreiber nicht (parallele Collector-Threads, Shards als eigene Prozesse)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+    return SQLiteConnection(conn)
+
+def getconn():
+    """
+    Leiht eine Verbindung: bei einer Datei eine eigene pro Thread (höchstens DB_POOL_MAX_CONNECTIONS),
+    im Speicher die gemeinsame Verbindung, sobald kein anderer Thread sie nutzt.
+    """
+    global _memory
+    if SQLITE_PATH == MEMORY_PATH:
+        _memory_lock.acquire()
+        with _lock:
+            if _memory is None:
+                _memory = _connect()
+            return _memory
+
+    _slots.acquire()
+    try:
+        with _lock:
+            if _idle:
+                return _idle.pop()
+        return _connect()
+    except Exception:
+        _slots.release()
+        raise
+
+def putconn(conn):
+    if SQLITE_PATH == MEMORY_PATH:
+        _memory_lock.release()
+        return
+    try:
+        if not conn.closed:
+            with _lock:
+                _idle.append(conn)
+    finally:
+        _slots.release()
+
+def close_pool():
+    """
+    Schließt alle freien Verbindungen. Eine Datenbank im Speicher wird dabei verworfen.
+    """
+    global _memory
+    with _lock:
+        for conn in _idle:
+            conn.close()
+        _idle.clear()
+        if _memory is not None:
+            _memory.close()
+            _memory = None
+
+def execute_values(cur, query: str, rows: list, page_size: int) -> list:
+    """
+    Gegenstück zu psycopg2.extras.execute_values: ersetzt das %s nach VALUES seitenweise durch
+    mehrzeilige Parameterlisten und liefert die RETURNING-Zeilen aller Seiten.
+    """
+    columns = len(rows[0])
+    page_size = max(1, min(page_size, MAX_VARIABLES // columns))
+    row_placeholders = f"({', '.join('?' * columns)})"
+    head, tail = query.split("%s", 1)
+    returned = []
+    for start in range(0, len(rows), page_size):
+        page = rows[start:start + page_size]
+        cur.execute_prepared(
+            f"{head}{', '.join([row_placeholders] * len(page))}{tail}",
+            [_adapt(value) for row in page for value in row]
+        )
+        returned.extend(cur.fetchall())
+    return returned
@@ -0,0 +1,353 @@
+import asyncio
+import csv
+import queue
+import signal
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import candle_cache
+from storage import DatabaseError, bulk_insert, cursor
+from collectors import MARKET_DATA_COLUMNS, cache_resampled, collect_market_data, resample_market_asset, sync_market_asset
+from signal_engine import generate_signals
+from timeframes import timeframe_to_ms, ms_to_datetime
+from config import (
+    ASSETS_TO_TRACK, BASE_TIMEFRAME, SIGNAL_TIMEFRAMES, STREAM_FEED, STREAM_REPLAY_FILE,
+    STREAM_CLOSE_GRACE_MS, STREAM_TICK_SECONDS
+)
+
+# Obergrenze wartender Trades; ein schneller Replay-Feed wird so gebremst statt den Speicher zu füllen
+STREAM_QUEUE_SIZE = 100000
+
+# Ein einzelner Trade; timestamp in ms seit Epoch (ccxt-Konvention)
+Trade = namedtuple("Trade", ["asset", "timestamp", "price", "amount"])
+
+class CandleBuilder:
+    """
+    Baut aus Trades OHLCV-Kerzen eines Timeframes. add_trade() und close_due() liefern die dabei
+    geschlossenen Kerzen als (timestamp_ms, asset, open, high, low, close, volume).
+    Intervalle ohne Trades werden wie an den Börsen als flache Kerze mit Volumen 0 ergänzt.
+    Kerzen, die vor start_ms begonnen haben (Start mitten in der Kerze), sind unvollständig und werden verworfen.
+    """
+
+    def __init__(self, timeframe: str = BASE_TIMEFRAME, start_ms: int = None):
+        self.step_ms = timeframe_to_ms(timeframe)
+        self.start_ms = start_ms
+        self.late_trades = 0
+        self._open = {} # asset -> [bucket, open, high, low, close, volume]
+        self._last = {} # asset -> (bucket, close) der zuletzt geschlossenen Kerze
+
+    def _close(self, asset: str) -> list:
+        bucket, open_, high, low, close, volume = self._open.pop(asset)
+        self._last[asset] = (bucket, close)
+        if self.start_ms is not None and bucket < self.start_ms:
+            return []
+        return [(bucket, asset, open_, high, low, close, volume)]
+
+    def _fill_gaps(self, asset: str, until_bucket: int) -> list:
+        """
+        Flache Kerzen für alle Intervalle zwischen der letzten geschlossenen Kerze und until_bucket (exklusive).
+        """
+        if asset not in self._last:
+            return []
+        bucket, close = self._last[asset]
+        filled = []
+        for gap_bucket in range(bucket + self.step_ms, until_bucket, self.step_ms):
+            filled.append((gap_bucket, asset, close, close, close, close, 0.0))
+            self._last[asset] = (gap_bucket, close)
+        return filled
+
+    def add_trade(self, trade: Trade) -> list:
+        bucket = trade.timestamp - trade.timestamp % self.step_ms
+        current = self._open.get(trade.asset)
+        last = self._last.get(trade.asset)
+        if (current is not None and bucket < current[0]) or (last is not None and bucket <= last[0]):
+            # Trade für eine bereits geschlossene Kerze
+            self.late_trades += 1
+            return []
+
+        closed = []
+        if current is not None and bucket > current[0]:
+            closed.extend(self._close(trade.asset))
+            current = None
+        closed.extend(self._fill_gaps(trade.asset, bucket))
+
+        if current is None:
+            self._open[trade.asset] = [bucket, trade.price, trade.price, trade.price, trade.price, trade.amount]
+        else:
+            current[2] = max(current[2], trade.price)
+            current[3] = min(current[3], trade.price)
+            current[4] = trade.price
+            current[5] += trade.amount
+        return closed
+
+    def close_due(self, now_ms: int) -> list:
+        """
+        Schließt alle Kerzen, deren Intervall bis now_ms abgelaufen ist, auch ohne weiteren Trade.
+        """
+        closed = []
+        for asset in list(self._open):
+            if self._open[asset][0] + self.step_ms <= now_ms:
+                closed.extend(self._close(asset))
+        current_bucket = now_ms - now_ms % self.step_ms
+        for asset in list(self._last):
+            if asset not in self._open:
+                closed.extend(self._fill_gaps(asset, current_bucket))
+        return closed
+
+class IterableTradeFeed:
+    """
+    Feed aus einer beliebigen Trade-Folge (Tests, Benchmarks). Ohne realtime gilt die Zeit der Trades
+    als Uhr (Replay); mit speed > 0 wird zusätzlich im Verhältnis zur Originalzeit gewartet.
+    """
+    realtime = False
+
+    def __init__(self, trades, speed: float = None):
+        self.trades = trades
+        self.speed = speed
+
+    def run(self, emit, stop_event: threading.Event):
+        previous = None
+        for trade in self.trades:
+            if stop_event.is_set():
+                return
+            if self.speed and previous is not None and trade.timestamp > previous:
+                time.sleep((trade.timestamp - previous) / 1000 / self.speed)
+            previous = trade.timestamp
+            emit(trade)
+
+class ReplayFileFeed(IterableTradeFeed):
+    """
+    Spielt Trades aus einer CSV-Datei (asset,timestamp,price,amount; timestamp in ms) ab,
+    z.B. aufgezeichnete Börsendaten als Ersatz für den Live-Feed.
+    """
+
+    def __init__(self, path: str = STREAM_REPLAY_FILE, speed: float = None):
+        super().__init__(self._read(path), speed)
+
+    @staticmethod
+    def _read(path: str):
+        with open(path, newline="") as handle:
+            for row in csv.DictReader(handle):
+                yield Trade(row["asset"], int(row["timestamp"]), float(row["price"]), float(row["amount"]))
+
+class CCXTProTradeFeed:
+    """
+    Live-Trades per WebSocket über ccxt.pro (watch_trades), ein Task pro Asset.
+    Verbindungsfehler werden mit kurzer Pause wiederholt.
+    """
+    realtime = True
+
+    def __init__(self, assets: list = None, exchange_id: str = "binance"):
+        self.assets = list(assets or ASSETS_TO_TRACK)
+        self.exchange_id = exchange_id
+
+    def run(self, emit, stop_event: threading.Event):
+        asyncio.run(self._watch_all(emit, stop_event))
+
+    async def _watch_all(self, emit, stop_event):
+        import ccxt.pro as ccxtpro
+        exchange = getattr(ccxtpro, self.exchange_id)()
+        try:
+            await asyncio.gather(*(self._watch(exchange, asset, emit, stop_event) for asset in self.assets))
+        finally:
+            await exchange.close()
+
+    async def _watch(self, exchange, asset, emit, stop_event):
+        while not stop_event.is_set():
+            try:
+                trades = await exchange.watch_trades(asset)
+            except Exception as e:
+                print(f"Fehler im Trade-Stream für {asset}: {e}. Neuer Versuch in 1s.")
+                await asyncio.sleep(1)
+                continue
+            for trade in trades:
+                emit(Trade(asset, trade["timestamp"], float(trade["price"]), float(trade["amount"])))
+
+FEEDS = {
+    "ccxtpro": CCXTProTradeFeed,
+    "replay": ReplayFileFeed,
+}
+
+def store_candles(candles: list, timeframe: str = BASE_TIMEFRAME) -> dict:
+    """
+    Schreibt geschlossene Kerzen in einem Roundtrip nach 'market_data' und hängt sie nach dem Commit an den
+    Kerzen-Cache an. Basiskerzen (BASE_TIMEFRAME) werden wie beim Sammeln per collectors.resample_market_asset
+    in die RESAMPLED_TIMEFRAMES fortgeschrieben, in derselben Transaktion.
+    Liefert {asset: {timeframe: neu geschriebene Kerzen}}, einschließlich timeframe selbst.
+    """
+    rows = [
+        (ms_to_datetime(bucket), asset, timeframe, open_, high, low, close, volume)
+        for bucket, asset, open_, high, low, close, volume in candles
+    ]
+    assets = sorted({candle[1] for candle in candles})
+    with cursor() as cur:
+        result = bulk_insert(
+            cur, "market_data", MARKET_DATA_COLUMNS, rows, conflict_columns=["timestamp", "asset", "timeframe"],
+            returning=["asset"]
+        )
+        written = {asset: {timeframe: 0} for asset in assets}
+        for (asset,) in result.returned:
+            written[asset][timeframe] += 1
+        derived = {}
+        if timeframe == BASE_TIMEFRAME:
+            for asset in assets:
+                resampled, derived[asset] = resample_market_asset(cur, asset)
+                written[asset].update(resampled)
+    for asset in assets:
+        asset_candles = sorted(candle for candle in candles if candle[1] == asset)
+        candle_cache.append_candles(
+            asset, timeframe, [candle[0] for candle in asset_candles],
+            np.array([candle[2:] for candle in asset_candles], dtype=float).T
+        )
+        cache_resampled(asset, derived.get(asset, {}))
+    return written
+
+class StreamingIngestor:
+    """
+    Verarbeitet einen Trade-Feed: Basiskerzen werden im Speicher gebaut, geschlossene Kerzen gesammelt
+    geschrieben und daraus die abgeleiteten Timeframes fortgeschrieben. Sobald dabei eine Kerze eines
+    SIGNAL_TIMEFRAMES schließt, wird für die betroffenen Assets sofort on_close (Standard: generate_signals) aufgerufen.
+    Mit fill_gaps (Standard: Live-Feed mit Basiskerzen) werden vor der ersten gestreamten Kerze eines Assets die
+    fehlenden Basiskerzen seit der letzten gespeicherten per REST nachgeladen (siehe _fill_gaps).
+    Der Feed läuft in einem eigenen Thread und übergibt die Trades über eine Queue.
+    """
+    _END = object()
+
+    def __init__(self, feed, timeframe: str = BASE_TIMEFRAME, on_close=None,
+                 close_grace_ms: int = STREAM_CLOSE_GRACE_MS, tick_seconds: float = STREAM_TICK_SECONDS,
+                 fill_gaps: bool = None):
+        self.feed = feed
+        self.timeframe = timeframe
+        self.fill_gaps = feed.realtime and timeframe == BASE_TIMEFRAME if fill_gaps is None else fill_gaps
+        self.on_close = on_close or (lambda assets: generate_signals(assets=assets))
+        self.close_grace_ms = close_grace_ms
+        self.tick_seconds = tick_seconds
+        # Live beginnt der Stream mitten in einer Kerze, diese ist unvollständig
+        self.builder = CandleBuilder(timeframe, start_ms=int(time.time() * 1000) if feed.realtime else None)
+        self.stop_event = threading.Event()
+        self.latencies_ms = []
+        self._pending = [] # geschlossene Kerzen, deren Schreiben fehlgeschlagen ist
+        self._synced = set() # Assets, deren Basiskerzen bis zur ersten gestreamten Kerze lückenlos sind
+        self._queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self._clock_ms = 0
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def _produce(self):
+        try:
+            self.feed.run(self._queue.put, self.stop_event)
+        except Exception as e:
+            print(f"Fehler im Trade-Feed: {e}")
+        finally:
+            self._queue.put(self._END)
+
+    def _drain(self) -> tuple:
+        """
+        Verarbeitet wartende Trades (höchstens einen Tick lang warten), bis eine Kerze schließt oder
+        die Queue leer ist, und liefert (geschlossene Kerzen, Feed beendet).
+        """
+        closed = []
+        try:
+            item = self._queue.get(timeout=self.tick_seconds)
+            while True:
+                if item is self._END:
+                    return closed, True
+                closed.extend(self.builder.add_trade(item))
+                self._clock_ms = max(self._clock_ms, item.timestamp)
+                if closed:
+                    # Sofort schreiben und bewerten, statt erst den restlichen Rückstand abzuarbeiten
+                    return closed, False
+                item = self._queue.get_nowait()
+        except queue.Empty:
+            return closed, False
+
+    def _fill_gaps(self, candles: list):
+        """
+        Lädt für Assets ohne bisher gestreamte Kerze die Basiskerzen zwischen der letzten gespeicherten und der
+        ersten gestreamten Kerze per REST nach, z.B. die beim Start verworfene angefangene Kerze. Sonst entstünde
+        die 1h-Kerze der Startstunde aus einem Teil ihrer Minuten (falscher Open, zu wenig Volumen) und bliebe wegen
+        ON CONFLICT DO NOTHING dauerhaft falsch. Fehler gehen an den Aufrufer.
+        """
+        first_ms = {}
+        for candle in candles:
+            if candle[1] not in self._synced:
+                first_ms[candle[1]] = min(first_ms.get(candle[1], candle[0]), candle[0])
+        for asset, until_ms in sorted(first_ms.items()):
+            sync_market_asset(asset, until_ms=until_ms)
+            self._synced.add(asset)
+
+    def flush(self, candles: list):
+        """
+        Schreibt die geschlossenen Kerzen und bewertet die betroffenen Assets.
+        Bei einem Datenbankfehler bleiben die Kerzen vorgemerkt und werden beim nächsten flush erneut geschrieben.
+        """
+        candles = self._pending + candles
+        if not candles:
+            return
+        if self.fill_gaps:
+            try:
+                self._fill_gaps(candles)
+            except Exception as e:
+                self._pending = candles
+                print(f"Fehler beim Nachladen fehlender Basiskerzen ({len(candles)} Kerzen vorgemerkt): {e}")
+                return
+        try:
+            written = store_candles(candles, self.timeframe)
+        except DatabaseError as e:
+            self._pending = candles
+            print(f"Datenbankfehler beim Schreiben gestreamter Kerzen ({len(candles)} Kerzen vorgemerkt): {e}")
+            return
+        self._pending = []
+        # Nur bewerten, wenn in einem Signal-Timeframe eine neue Kerze vorliegt (nicht nach jeder Basiskerze)
+        assets = sorted(
+            asset for asset, counts in written.items()
+            if any(counts.get(timeframe) for timeframe in SIGNAL_TIMEFRAMES)
+        )
+        if not assets:
+            return
+        self.on_close(assets)
+        if self.feed.realtime:
+            candle_end_ms = max(candle[0] for candle in candles) + self.builder.step_ms
+            self.latencies_ms.append(time.time() * 1000 - candle_end_ms)
+            print(f"{len(candles)} Kerzen geschlossen, Signale für {assets} nach {self.latencies_ms[-1]:.0f}ms bewertet.")
+
+    def run(self):
+        producer = threading.Thread(target=self._produce, name="trade-feed", daemon=True)
+        producer.start()
+        finished = False
+        while not finished and not self.stop_event.is_set():
+            closed, finished = self._drain()
+            # Uhr: live die Systemzeit abzüglich Karenz, im Replay die Zeit des letzten Trades
+            if self.feed.realtime:
+                closed.extend(self.builder.close_due(int(time.time() * 1000) - self.close_grace_ms))
+            else:
+                closed.extend(self.builder.close_due(self._clock_ms))
+            self.flush(closed)
+        self.stop_event.set()
+        if self._pending:
+            print(f"{len(self._pending)} geschlossene Kerzen konnten nicht geschrieben werden.")
+        if self.builder.late_trades:
+            print(f"{self.builder.late_trades} verspätete Trades für bereits geschlossene Kerzen verworfen.")
+
+def run_stream(feed_name: str = STREAM_FEED):
+    """
+    Startet den Streaming-Modus mit dem konfigurierten Feed und beendet ihn per SIGTERM/SIGINT.
+    Live werden vorher die Basiskerzen aller Assets per REST bis zur Gegenwart nachgeladen.
+    Sentiment- und On-Chain-Daten kommen weiterhin aus den periodischen Collectors (z.B. main.py daemon).
+    """
+    ingestor = StreamingIngestor(FEEDS[feed_name]())
+    signal.signal(signal.SIGTERM, ingestor.stop)
+    signal.signal(signal.SIGINT, ingestor.stop)
+    if ingestor.feed.realtime:
+        collect_market_data()
+    candle_cache.warm()
+    print(f"Streaming-Modus gestartet (Feed: {feed_name}, Basiskerzen: {BASE_TIMEFRAME}, Signale: {SIGNAL_TIMEFRAMES}).")
+    ingestor.run()
+    print("Streaming-Modus beendet.")
+
+if __name__ == "__main__":
+    run_stream()
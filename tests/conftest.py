@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+# Die Tests laufen ohne Server gegen die eingebettete Datenbank im Speicher (siehe storage_sqlite.py);
+# muss vor dem ersten Import von storage gesetzt sein
+config.DB_BACKEND = "sqlite"
+config.SQLITE_PATH = ":memory:"
+
+import pytest
+
+@pytest.fixture
+def database():
+    """
+    Frisches Schema in einer leeren Datenbank im Speicher; wird am Ende des Tests verworfen.
+    """
+    import candle_cache
+    from db_setup import setup_database
+    from storage import close_pool
+    candle_cache.invalidate()
+    setup_database()
+    yield
+    close_pool()
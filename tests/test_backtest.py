@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import backtest
+import config
+import signal_engine
+from collectors import MARKET_DATA_COLUMNS
+from storage import bulk_insert, cursor
+
+# Mehr Kerzen als SCORING_CANDLE_WINDOW für das erste Asset, weniger für das zweite (aufgefülltes Fenster)
+CANDLE_COUNTS = {"BTC/USDT": 150, "ETH/USDT": 40}
+
+def _insert_candles(timeframe):
+    rng = np.random.default_rng(7)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for asset, count in CANDLE_COUNTS.items():
+        closes = 100 + np.cumsum(rng.normal(0, 1.5, count))
+        for index, close in enumerate(closes):
+            spread = abs(rng.normal(0, 1))
+            rows.append((
+                start + timedelta(hours=index), asset, timeframe,
+                float(close - rng.normal(0, 0.5)), float(close + spread), float(close - spread), float(close),
+                float(rng.uniform(10, 100))
+            ))
+    with cursor() as cur:
+        bulk_insert(cur, "market_data", MARKET_DATA_COLUMNS, rows, conflict_columns=["timestamp", "asset", "timeframe"])
+
+def test_backtest_technical_confidence_matches_live_scoring(database, monkeypatch):
+    for name, weight in {"rsi": 0.4, "macd": 0.3, "bollinger": 0.2, "volume": 0.1}.items():
+        monkeypatch.setitem(config.INDICATOR_WEIGHTS, name, weight)
+    _insert_candles(config.TIMEFRAME)
+
+    live = signal_engine.calculate_confidence_scores_batch(list(CANDLE_COUNTS))
+    features = backtest.prepare_features(backtest.load_history(list(CANDLE_COUNTS)))
+
+    for asset in CANDLE_COUNTS:
+        confidence_tech, _ = backtest.candle_confidences(features[asset])
+        assert len(confidence_tech) == CANDLE_COUNTS[asset]
+        assert confidence_tech[-1] == pytest.approx(live[asset]["confidence_tech"])
+        # Die übrigen Indikatoren fließen ein: nicht mehr nur die RSI-Konfidenz
+        rsi_only = round(float(signal_engine.tech_confidence_from_rsi(live[asset]["triggering_factors"]["rsi"])), 2)
+        assert live[asset]["confidence_tech"] != pytest.approx(rsi_only)
+
+def test_indicators_without_weight_are_not_computed(monkeypatch):
+    for name in ["macd", "bollinger", "volume"]:
+        monkeypatch.setitem(config.INDICATOR_WEIGHTS, name, 0.0)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("compute_indicators ohne gewichteten Indikator aufgerufen")
+
+    monkeypatch.setattr(backtest, "compute_indicators", fail)
+    confidences = backtest._window_confidences(np.ones((5, 300)))
+    assert all(np.array_equal(values, np.zeros(300)) for values in confidences.values())
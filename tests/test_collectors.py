@@ -0,0 +1,32 @@
+import threading
+
+import collectors
+from config import COLLECTION_MAX_WORKERS
+
+def test_onchain_jobs_run_while_market_jobs_are_blocked():
+    release = threading.Event()
+    market_started = threading.Semaphore(0)
+
+    def blocked_market_job(asset):
+        market_started.release()
+        release.wait(timeout=10)
+        return 1
+
+    market = threading.Thread(
+        target=collectors._fan_out, args=("market", blocked_market_job, range(COLLECTION_MAX_WORKERS * 2))
+    )
+    market.start()
+    try:
+        # Alle Threads des Markt-Pools sind belegt, weitere Markt-Aufgaben warten in dessen Warteschlange
+        for _ in range(COLLECTION_MAX_WORKERS):
+            assert market_started.acquire(timeout=5)
+        results = []
+        onchain = threading.Thread(target=lambda: results.extend(collectors._fan_out("onchain", lambda wallet: wallet, ["a", "b"])))
+        onchain.start()
+        onchain.join(timeout=5)
+        assert not onchain.is_alive()
+        assert results == ["a", "b"]
+        assert market.is_alive()
+    finally:
+        release.set()
+        market.join(timeout=10)
@@ -0,0 +1,21 @@
+import pytest
+
+import signal_engine
+from storage import DatabaseError, connection
+
+ASSETS = ["BTC/USDT", "ETH/USDT"]
+
+def _break_sentiment_table():
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("DROP TABLE sentiment_data;")
+
+def test_batch_scores_swallow_errors_on_own_connection(database):
+    _break_sentiment_table()
+    scores = signal_engine.calculate_confidence_scores_batch(ASSETS)
+    assert all(scores[asset]["confidence_sentiment"] == 0.0 for asset in ASSETS)
+
+def test_batch_scores_raise_on_callers_connection(database):
+    _break_sentiment_table()
+    with pytest.raises(DatabaseError):
+        with connection() as conn:
+            signal_engine.calculate_confidence_scores_batch(ASSETS, conn)
@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+
+import candle_cache
+import streaming
+from storage import DatabaseError, cursor
+from streaming import IterableTradeFeed, StreamingIngestor, Trade
+from timeframes import datetime_to_ms
+
+START_MS = datetime_to_ms(datetime(2024, 1, 1, tzinfo=timezone.utc))
+MINUTE_MS = 60 * 1000
+
+def _trades(minutes: int) -> list:
+    return [Trade("BTC/USDT", START_MS + minute * MINUTE_MS + 1000, 100.0 + minute, 1.0) for minute in range(minutes)]
+
+def _candle_counts() -> dict:
+    with cursor() as cur:
+        cur.execute("SELECT timeframe, COUNT(*) FROM market_data WHERE asset = %s GROUP BY timeframe;", ("BTC/USDT",))
+        return dict(cur.fetchall())
+
+def test_streaming_writes_base_candles_and_advances_derived_timeframes(database):
+    scored = []
+    # 121 Minuten: die letzte Basiskerze schließt erst mit dem Ende des Feeds nicht mehr, 2 volle Stunden
+    StreamingIngestor(IterableTradeFeed(_trades(121)), on_close=scored.append, tick_seconds=0.01).run()
+
+    counts = _candle_counts()
+    assert counts["1m"] == 120
+    assert counts["5m"] == 24
+    assert counts["1h"] == 2
+    # Bewertet wird nur beim Schluss einer Kerze der SIGNAL_TIMEFRAMES (1h), nicht nach jeder Minute
+    assert scored == [["BTC/USDT"], ["BTC/USDT"]]
+
+    with cursor() as cur:
+        cur.execute(
+            "SELECT open, high, low, close, volume FROM market_data WHERE asset = %s AND timeframe = '1h' ORDER BY timestamp;",
+            ("BTC/USDT",)
+        )
+        assert cur.fetchall()[0] == (100.0, 159.0, 100.0, 159.0, 60.0)
+
+def test_failed_flush_keeps_candles_and_leaves_cache_clean(database, monkeypatch):
+    candles = [(START_MS + minute * MINUTE_MS, "BTC/USDT", 100.0, 101.0, 99.0, 100.0, 1.0) for minute in range(60)]
+    candle_cache.warm(["BTC/USDT"], ["1h"])
+    resample = streaming.resample_market_asset
+
+    def resample_then_fail(cur, asset):
+        resample(cur, asset)
+        raise DatabaseError("simulierter Fehler nach dem Ableiten")
+
+    monkeypatch.setattr(streaming, "resample_market_asset", resample_then_fail)
+    scored = []
+    ingestor = StreamingIngestor(IterableTradeFeed([]), on_close=scored.append)
+    ingestor.flush(candles)
+
+    assert _candle_counts() == {}
+    assert scored == []
+    # Die zurückgerollte 1h-Kerze darf nicht im Cache stehen
+    with cursor() as cur:
+        assert len(candle_cache.recent_candles(cur, ["BTC/USDT"], "1h", 10)["BTC/USDT"][0]) == 0
+
+    monkeypatch.setattr(streaming, "resample_market_asset", resample)
+    ingestor.flush([])
+    counts = _candle_counts()
+    assert counts["1m"] == 60
+    assert counts["1h"] == 1
+    assert scored == [["BTC/USDT"]]
+
+def test_gap_before_first_streamed_candle_is_filled_before_resampling(database, monkeypatch):
+    calls = []
+
+    def sync(asset, until_ms=None):
+        calls.append((asset, until_ms, _candle_counts().get("1m", 0)))
+        if len(calls) == 1:
+            raise ConnectionError("simulierter REST-Fehler")
+
+    monkeypatch.setattr(streaming, "sync_market_asset", sync)
+    scored = []
+    StreamingIngestor(IterableTradeFeed(_trades(121)), on_close=scored.append, tick_seconds=0.01, fill_gaps=True).run()
+
+    # Vor dem Schreiben der ersten gestreamten Kerze, nach dem Fehler erneut, danach nicht mehr
+    assert calls == [("BTC/USDT", START_MS, 0), ("BTC/USDT", START_MS, 0)]
+    assert _candle_counts()["1m"] == 120
+    assert scored == [["BTC/USDT"], ["BTC/USDT"]]
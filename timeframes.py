@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+# Einheiten der ccxt-Timeframe-Notation ('1m', '4h', '1d', ...) in Sekunden
+_UNIT_SECONDS = {
+    's': 1,
+    'm': 60,
+    'h': 60 * 60,
+    'd': 24 * 60 * 60,
+    'w': 7 * 24 * 60 * 60,
+}
+
+def timeframe_to_seconds(timeframe: str) -> int:
+    """
+    Rechnet einen Timeframe wie '1h' oder '15m' in Sekunden um.
+    """
+    amount, unit = timeframe[:-1], timeframe[-1]
+    if unit not in _UNIT_SECONDS or not amount.isdigit():
+        raise ValueError(f"Unbekannter Timeframe: {timeframe}")
+    return int(amount) * _UNIT_SECONDS[unit]
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """
+    Rechnet einen Timeframe in Millisekunden um (Einheit der ccxt-Zeitstempel).
+    """
+    return timeframe_to_seconds(timeframe) * 1000
+
+def ms_to_datetime(timestamp_ms: int) -> datetime:
+    """
+    Wandelt einen ccxt-Zeitstempel (ms seit Epoch) in ein UTC-datetime um.
+    """
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+
+def datetime_to_ms(value: datetime) -> int:
+    """
+    Wandelt ein datetime in ms seit Epoch um. Naive Werte werden als UTC interpretiert.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+def floor_datetime(value: datetime, timeframe: str) -> datetime:
+    """
+    Rundet ein datetime auf den Beginn seines Timeframe-Intervalls ab (Intervalle ab Epoch, UTC),
+    z.B. 14:37 mit '1h' auf 14:00.
+    """
+    timestamp_ms = datetime_to_ms(value)
+    return ms_to_datetime(timestamp_ms - timestamp_ms % timeframe_to_ms(timeframe))
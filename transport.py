@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from config import (
+    HTTP_TIMEOUT_SECONDS, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE_SECONDS, HTTP_BACKOFF_MAX_SECONDS, HTTP_RATE_LIMITS,
+    COLLECTION_MAX_WORKERS
+)
+
+# Gemeinsamer Transport für alle externen Abrufe eines Prozesses: eine requests.Session mit Keep-Alive
+# (auch von den ccxt-Clients genutzt), ein Token-Bucket pro Host, Backoff mit Jitter bei 429/5xx
+# und Zusammenlegen gleichzeitiger identischer Anfragen.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class RetryableResponse(Exception):
+    """
+    Antwort mit vorübergehendem Fehler (5xx); wird wiederholt, nach der letzten Wiederholung zurückgegeben.
+    """
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code} von {response.url}")
+        self.response = response
+        self.retry_after = _retry_after(response)
+
+class RateLimited(RetryableResponse):
+    """
+    Antwort, mit der der Host eine Drosselung meldet (429 oder z.B. ein Etherscan-Fehlertext).
+    """
+
+class TokenBucket:
+    """
+    Thread-sicherer Token-Bucket: im Mittel rate Anfragen pro Sekunde, kurzzeitig bis zu capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """
+        Nimmt ein Token und wartet, falls keines verfügbar ist. Gibt die Wartezeit in Sekunden zurück.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """
+        Leert den Bucket für seconds, damit nach einer Drosselung alle Threads warten statt weiter anzufragen.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+_session = None
+_buckets = {}
+_lock = threading.Lock()
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """
+    Prozessweite Session; der Verbindungspool reicht für alle parallelen Abrufe der Collectors.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max(len(HTTP_RATE_LIMITS), 1), pool_maxsize=COLLECTION_MAX_WORKERS)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def get_bucket(host: str):
+    """
+    Token-Bucket eines Hosts laut HTTP_RATE_LIMITS oder None für Hosts ohne Limit.
+    """
+    if host not in HTTP_RATE_LIMITS:
+        return None
+    with _lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(*HTTP_RATE_LIMITS[host])
+            _buckets[host] = bucket
+        return bucket
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After") if response.headers else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError: # HTTP-Datum statt Sekunden: normaler Backoff
+        return None
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """
+    Wartezeit vor Wiederholung attempt (ab 0): Retry-After des Hosts, sonst zufällig zwischen 0 und
+    HTTP_BACKOFF_BASE_SECONDS * 2^attempt ("full jitter"), damit parallele Threads nicht gleichzeitig wiederholen.
+    """
+    if retry_after is not None:
+        return min(retry_after, HTTP_BACKOFF_MAX_SECONDS)
+    return random.uniform(0, min(HTTP_BACKOFF_MAX_SECONDS, HTTP_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def call(host: str, func, *args, retry_exceptions: tuple = (), rate_limit_exceptions: tuple = (), **kwargs):
+    """
+    Führt func(*args, **kwargs) über den Token-Bucket von host aus, z.B. einen ccxt-Aufruf.
+    Bei retry_exceptions wird bis zu HTTP_MAX_RETRIES-mal mit Backoff wiederholt; bei
+    rate_limit_exceptions wartet zusätzlich der ganze Host (siehe TokenBucket.pause).
+    """
+    bucket = get_bucket(host)
+    attempt = 0
+    while True:
+        if bucket is not None:
+            waited = bucket.acquire()
+            if waited:
+                metrics.observe("rate_limit_wait_seconds", waited, host=host)
+        try:
+            return func(*args, **kwargs)
+        except retry_exceptions as e:
+            if attempt >= HTTP_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, getattr(e, "retry_after", None))
+            if bucket is not None and isinstance(e, rate_limit_exceptions):
+                bucket.pause(delay)
+            metrics.inc("http_retries_total", host=host)
+            time.sleep(delay)
+            attempt += 1
+
+def coalesce(key, func, *args, **kwargs):
+    """
+    Legt gleichzeitige Aufrufe mit demselben key zusammen: nur der erste führt func aus,
+    die übrigen warten auf dessen Ergebnis (oder Exception).
+    """
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _in_flight[key] = future
+    if not is_leader:
+        metrics.inc("http_coalesced_total")
+        return future.result()
+    try:
+        result = func(*args, **kwargs)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+
+def get(url: str, params: dict = None, timeout=HTTP_TIMEOUT_SECONDS, retry_on=None) -> requests.Response:
+    """
+    GET über die gemeinsame Session mit Timeout, Rate-Limit des Hosts und Wiederholung bei 429/5xx
+    und Verbindungsfehlern. retry_on(response) kann weitere Antworten als Drosselung kennzeichnen.
+    Nach der letzten Wiederholung wird die fehlerhafte Antwort zurückgegeben (raise_for_status beim Aufrufer).
+    """
+    host = urlsplit(url).hostname
+
+    def request():
+        response = get_session().get(url, params=params, timeout=timeout)
+        metrics.inc("http_requests_total", host=host, status=response.status_code)
+        if response.status_code == 429 or (retry_on is not None and retry_on(response)):
+            raise RateLimited(response)
+        if response.status_code in RETRY_STATUS_CODES:
+            raise RetryableResponse(response)
+        return response
+
+    def request_with_retries():
+        try:
+            return call(
+                host, request,
+                retry_exceptions=(RetryableResponse, requests.ConnectionError, requests.Timeout),
+                rate_limit_exceptions=(RateLimited,)
+            )
+        except RetryableResponse as e:
+            return e.response
+
+    key = ("GET", url, tuple(sorted((params or {}).items())))
+    return coalesce(key, request_with_retries)
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+
+import metrics
+from config import (
+    ASSETS_TO_TRACK, UNIVERSE_MODE, UNIVERSE_QUOTE, UNIVERSE_MIN_QUOTE_VOLUME, UNIVERSE_MAX_SPREAD_PCT,
+    UNIVERSE_MAX_ASSETS, UNIVERSE_EXCLUDED_BASES, UNIVERSE_CACHE_FILE, UNIVERSE_CACHE_TTL_HOURS
+)
+
+def _filters() -> dict:
+    """
+    Filterparameter des Universums; ändern sie sich, ist ein gecachtes Universum veraltet.
+    """
+    return {
+        "quote": UNIVERSE_QUOTE,
+        "min_quote_volume": UNIVERSE_MIN_QUOTE_VOLUME,
+        "max_spread_pct": UNIVERSE_MAX_SPREAD_PCT,
+        "max_assets": UNIVERSE_MAX_ASSETS,
+        "excluded_bases": sorted(UNIVERSE_EXCLUDED_BASES),
+    }
+
+def _spread_pct(ticker: dict):
+    bid, ask = ticker.get("bid"), ticker.get("ask")
+    if not bid or not ask:
+        return None
+    return (ask - bid) / ((ask + bid) / 2) * 100
+
+def discover_universe(exchange) -> list:
+    """
+    Ermittelt alle aktiven Spot-Märkte mit UNIVERSE_QUOTE als Quote-Währung, die die Volumen- und
+    Spread-Filter erfüllen, sortiert nach 24h-Volumen (absteigend) und begrenzt auf UNIVERSE_MAX_ASSETS.
+    Benötigt zwei Abrufe: load_markets() und ein fetch_tickers() für alle Märkte.
+    """
+    from collectors import exchange_call
+    with metrics.timer("external_api_seconds", api="exchange"):
+        markets = exchange_call(exchange.load_markets)
+    candidates = {
+        symbol for symbol, market in markets.items()
+        if market.get("spot")
+        and market.get("active") is not False
+        and market.get("quote") == UNIVERSE_QUOTE
+        and market.get("base") not in UNIVERSE_EXCLUDED_BASES
+    }
+    with metrics.timer("external_api_seconds", api="exchange"):
+        tickers = exchange_call(exchange.fetch_tickers)
+
+    volumes = {}
+    for symbol, ticker in tickers.items():
+        if symbol not in candidates:
+            continue
+        quote_volume = ticker.get("quoteVolume") or 0.0
+        if quote_volume < UNIVERSE_MIN_QUOTE_VOLUME:
+            continue
+        spread = _spread_pct(ticker)
+        if UNIVERSE_MAX_SPREAD_PCT is not None and spread is not None and spread > UNIVERSE_MAX_SPREAD_PCT:
+            continue
+        volumes[symbol] = quote_volume
+    return sorted(volumes, key=volumes.get, reverse=True)[:UNIVERSE_MAX_ASSETS]
+
+def load_cached_universe(path: str = UNIVERSE_CACHE_FILE):
+    """
+    Liefert das zuletzt gespeicherte Universum als dict (discovered_at, filters, assets) oder None.
+    """
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _save_universe(assets: list, path: str):
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as handle:
+        json.dump({"discovered_at": time.time(), "filters": _filters(), "assets": assets}, handle, indent=2)
+    os.replace(temporary_path, path)
+
+def get_universe(refresh: bool = False, exchange=None, path: str = UNIVERSE_CACHE_FILE) -> list:
+    """
+    Liefert die zu verfolgenden Assets. Mit UNIVERSE_MODE = "static" sind das ASSETS_TO_TRACK, mit "discover"
+    das Ergebnis von discover_universe(), ergänzt um ASSETS_TO_TRACK. Das ermittelte Universum wird in
+    UNIVERSE_CACHE_FILE gespeichert und höchstens alle UNIVERSE_CACHE_TTL_HOURS neu ermittelt. Schlägt die
+    Ermittlung fehl, wird ein veraltetes Universum aus dem Cache oder ASSETS_TO_TRACK verwendet.
+    """
+    if UNIVERSE_MODE == "static":
+        return list(ASSETS_TO_TRACK)
+
+    cached = load_cached_universe(path)
+    is_fresh = (
+        cached is not None
+        and cached.get("filters") == _filters()
+        and time.time() - cached.get("discovered_at", 0) < UNIVERSE_CACHE_TTL_HOURS * 3600
+    )
+    if is_fresh and not refresh:
+        return list(dict.fromkeys(ASSETS_TO_TRACK + cached["assets"]))
+
+    # Erst hier geladen: im Modus "static" und mit frischem Cache brauchen die Stufen weder ccxt noch die Collectors
+    import ccxt
+    from collectors import get_exchange
+    try:
+        assets = discover_universe(exchange or get_exchange())
+        _save_universe(assets, path)
+        print(f"Asset-Universum ermittelt: {len(assets)} Märkte mit Quote {UNIVERSE_QUOTE}.")
+    except (ccxt.BaseError, OSError) as e:
+        metrics.inc("errors_total", source="universe")
+        assets = cached["assets"] if cached else []
+        print(f"Fehler beim Ermitteln des Asset-Universums, verwende {'den Cache' if cached else 'ASSETS_TO_TRACK'}: {e}")
+    return list(dict.fromkeys(ASSETS_TO_TRACK + assets))
+
+if __name__ == "__main__":
+    universe = get_universe(refresh=True)
+    print(f"{len(universe)} Assets: {', '.join(universe)}")